@@ -1,21 +1,39 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, HTTPBasic, HTTPBasicCredentials
-from app.auth.jwt_handler import create_access_token, verify_token
+from app.auth.jwt_handler import (
+    create_access_token, decode_token, build_user_claims, SELF_CONTAINED_TOKENS, ACCESS_TOKEN_EXPIRE_MINUTES
+)
 from app.database import db_connect
-from app.utils.password_utils import pwd_context
+from app.utils.password_utils import verify_password, HashingBusyError
+from app.utils.cache import TTLCache
+from app.auth.revocation import create_revocation_store, token_key, version_key
 from mysql.connector import Error
+import os
+import time
 
 # Initialize HTTP Basic Auth and OAuth2 schemes
 security = HTTPBasic()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-# In-memory blacklist for token management
-blacklist = set()
+# Revoked tokens, kept only until they expire (shared between workers with REVOCATION_BACKEND=sqlite)
+revocations = create_revocation_store(SELF_CONTAINED_TOKENS)
+
+# Principal cache: user id -> {id, username, usertype, token_version}, saves the users lookup on every request.
+# Entries are dropped by update_user; the TTL bounds staleness across worker processes.
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+)
+
+# Run on every login and principal cache miss, so they are prepared once per connection
+LOGIN_QUERY = db_connect.read("SELECT id, password, username, usertype, token_version FROM users WHERE username = %s")
+REHASH_QUERY = db_connect.write("UPDATE users SET password = %s WHERE id = %s")
+USER_BY_ID_QUERY = db_connect.read("SELECT id, username, usertype, token_version FROM users WHERE id = %s")
 
 router = APIRouter()
 
 @router.post("/login")
-def login(credentials: HTTPBasicCredentials = Depends(security)):
+async def login(credentials: HTTPBasicCredentials = Depends(security)):
     """
     Login using HTTP Basic Authentication. 
     Requires 'username' and 'password' in the 'Authorization' header.
@@ -26,27 +44,39 @@ def login(credentials: HTTPBasicCredentials = Depends(security)):
         password = credentials.password
 
         # Fetch user details from the database
-        query = "SELECT id, password FROM users WHERE username = %s"
-        query_result = db_connect.execute_query(query, (username,))
+        query_result = await db_connect.execute_statement(LOGIN_QUERY, (username,))
         data = query_result["data"]
 
-        # Verify user existence and password match
-        if not data or not pwd_context.verify(password, data[0][1]):
+        # Verify user existence and password match on the hashing pool
+        valid, new_hash = await verify_password(password, data[0][1]) if data else (False, None)
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid credentials",
                 headers={"WWW-Authenticate": "Basic"},
             )
 
+        # Transparently upgrade hashes made with outdated settings (e.g. an older bcrypt cost)
+        if new_hash:
+            await db_connect.execute_statement(REHASH_QUERY, (new_hash, data[0][0]))
+
         # Create access token for the user
-        user_id = data[0][0]
-        token = create_access_token(data={"sub": str(user_id)})
+        user_id, _, username, usertype, token_version = data[0]
+        if SELF_CONTAINED_TOKENS:
+            claims = build_user_claims(user_id, username, usertype, token_version)
+        else:
+            claims = {"sub": str(user_id)}
+        token = create_access_token(data=claims)
 
         return {
             "message": "Login successful!",
             "Token": f"Bearer {token}"
         }
 
+    except HTTPException as http_err:
+        raise http_err
+    except HashingBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -54,42 +84,83 @@ def login(credentials: HTTPBasicCredentials = Depends(security)):
         )
 
 @router.post("/logout")
-def logout(token: str = Depends(oauth2_scheme)):
+async def logout(token: str = Depends(oauth2_scheme)):
     """
-    Invalidate the JWT token by adding it to the blacklist.
+    Invalidate the JWT token by revoking its id until it expires.
     """
-    blacklist.add(token)
+    claims = verify_or_401(token)
+    await revocations.revoke(token_key(claims, token), claims["exp"])
     return {"message": "Successfully logged out"}
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+def verify_or_401(token: str):
+    """Return the verified claims of a token, or reject the request."""
+    try:
+        return decode_token(token)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
     Retrieve the current user from the token. 
-    Verify that the token is valid and not blacklisted.
+    Verify that the token is valid and not revoked.
     """
-    if token in blacklist:
+    # Verify the token (signature checks are cached per token)
+    claims = verify_or_401(token)
+
+    self_contained = "ver" in claims
+    if await revocations.is_revoked(token_key(claims, token)) or (
+        self_contained and await revocations.is_revoked(version_key(claims["sub"], claims["ver"]))
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has been invalidated. Please log in again."
         )
 
-    # Verify the token and extract user_id
-    user_id = verify_token(token)
+    if self_contained:
+        # Self-contained token: the principal comes from the claims without touching the users table;
+        # role changes revoke the old token version instead
+        return {
+            "id": int(claims["sub"]),
+            "username": claims["username"],
+            "usertype": claims["usertype"],
+            "token_version": claims["ver"],
+        }
+
+    return await load_user(claims["sub"])
+
+async def load_user(user_id):
+    """Return the principal for a user id, from the cache when possible."""
+    user = user_cache.get(str(user_id))
+    if user is not None:
+        return user
 
     try:
         # Fetch user details from the database using user_id
-        query = "SELECT id, username, usertype FROM users WHERE id = %s"
-        query_result = db_connect.execute_query(query, (user_id,))
+        query_result = await db_connect.execute_statement(USER_BY_ID_QUERY, (user_id,))
         data = query_result["data"]
 
         if not data:
             raise HTTPException(status_code=404, detail="User not found")
 
         # Extract and return user details as a dictionary
-        user = data[0]
-        return {"id": user[0], "username": user[1], "usertype": user[2]}
+        row = data[0]
+        user = {"id": row[0], "username": row[1], "usertype": row[2], "token_version": row[3]}
+        user_cache.set(str(user_id), user)
+        return user
 
     except Error as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
         )
+
+def invalidate_cached_user(user_id):
+    """Drop a cached principal after its identity fields change."""
+    user_cache.invalidate(str(user_id))
+
+async def revoke_token_version(user_id, token_version):
+    """
+    Reject every self-contained token issued to a user at `token_version`, after the version was bumped.
+    Kept for the longest token lifetime, by which time all of those tokens have expired.
+    """
+    await revocations.revoke(version_key(user_id, token_version), time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60)
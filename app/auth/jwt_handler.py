@@ -1,7 +1,10 @@
 import os
+import time
+import uuid
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from dotenv import load_dotenv
+from app.utils.cache import TTLCache
 
 # Load environment variables from .env file
 load_dotenv()
@@ -9,6 +12,16 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 240
 
+# Opt-in token format carrying username, usertype and the user's token version,
+# so the auth dependency can build the current user from the claims
+SELF_CONTAINED_TOKENS = os.getenv("JWT_SELF_CONTAINED", "false").lower() in ("1", "true", "yes")
+
+# Already-verified tokens: token -> claims, each entry expires with its token
+token_cache = TTLCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+    ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+
 # Create a JWT token
 def create_access_token(data: dict, expires_delta: timedelta = None):
     if not SECRET_KEY:
@@ -16,15 +29,29 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
     to_encode.update({"exp": expire})
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-# Verify the token and extract the user ID
-def verify_token(token: str):
+# Claims for a self-contained token
+def build_user_claims(user_id: int, username: str, usertype: str, token_version: int):
+    return {"sub": str(user_id), "username": username, "usertype": usertype, "ver": token_version}
+
+# Verify the token and return its claims, skipping the signature check for tokens verified before
+def decode_token(token: str):
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise ValueError("Invalid token")
-        return user_id
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError as e:
         raise ValueError(f"Invalid token: {str(e)}")
+    if claims.get("sub") is None:
+        raise ValueError("Invalid token")
+    remaining = claims["exp"] - time.time()
+    if remaining > 0:
+        token_cache.set(token, claims, ttl=remaining)
+    return claims
+
+# Verify the token and extract the user ID
+def verify_token(token: str):
+    return decode_token(token)["sub"]
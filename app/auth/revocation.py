@@ -0,0 +1,145 @@
+from abc import ABC, abstractmethod
+import asyncio
+import hashlib
+import heapq
+import os
+import sqlite3
+import threading
+import time
+
+
+def token_key(claims: dict, token: str) -> str:
+    """Revocation key for a token: its jti, or a digest for tokens issued without one."""
+    return claims.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+
+def version_key(user_id, token_version) -> str:
+    """Revocation key shared by every self-contained token a user was issued at one token version."""
+    return f"user:{user_id}:ver:{token_version}"
+
+
+class RevocationStore(ABC):
+    """Records revoked token ids until the tokens would have expired anyway."""
+
+    @abstractmethod
+    async def revoke(self, jti: str, expires_at: float):
+        ...
+
+    @abstractmethod
+    async def is_revoked(self, jti: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def stats(self) -> dict:
+        ...
+
+
+class MemoryRevocationStore(RevocationStore):
+    """
+    Per-process store. A min-heap ordered by expiry lets every call drop the
+    entries whose tokens have expired, so memory stays proportional to the
+    number of live revoked tokens.
+    """
+
+    def __init__(self):
+        self._expires = {}  # jti -> expires_at
+        self._heap = []  # (expires_at, jti)
+
+    async def revoke(self, jti: str, expires_at: float):
+        self._purge()
+        if expires_at <= time.time():
+            return
+        self._expires[jti] = expires_at
+        heapq.heappush(self._heap, (expires_at, jti))
+
+    async def is_revoked(self, jti: str) -> bool:
+        self._purge()
+        return jti in self._expires
+
+    async def stats(self) -> dict:
+        return {"backend": "memory", "revoked": len(self._expires)}
+
+    def _purge(self):
+        now = time.time()
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, jti = heapq.heappop(self._heap)
+            if self._expires.get(jti) == expires_at:
+                del self._expires[jti]
+
+
+class SQLiteRevocationStore(RevocationStore):
+    """
+    Store in a local SQLite file, shared by every worker process on the host.
+    Expired rows are deleted at most once per `purge_interval` seconds. Each call runs on a
+    worker thread, so disk waits and the busy timeout never block the event loop.
+    """
+
+    def __init__(self, path: str, purge_interval: float = 60.0):
+        self.path = path
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS revoked_tokens (jti TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at ON revoked_tokens (expires_at)"
+        )
+
+    async def revoke(self, jti: str, expires_at: float):
+        await asyncio.to_thread(self._revoke, jti, expires_at)
+
+    async def is_revoked(self, jti: str) -> bool:
+        return await asyncio.to_thread(self._is_revoked, jti)
+
+    async def stats(self) -> dict:
+        return await asyncio.to_thread(self._stats)
+
+    def _revoke(self, jti: str, expires_at: float):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO revoked_tokens (jti, expires_at) VALUES (?, ?)", (jti, expires_at)
+            )
+            self._purge()
+
+    def _is_revoked(self, jti: str) -> bool:
+        with self._lock:
+            self._purge()
+            row = self._connection.execute(
+                "SELECT 1 FROM revoked_tokens WHERE jti = ? AND expires_at > ?", (jti, time.time())
+            ).fetchone()
+        return row is not None
+
+    def _stats(self) -> dict:
+        with self._lock:
+            (count,) = self._connection.execute("SELECT COUNT(*) FROM revoked_tokens").fetchone()
+        return {"backend": "sqlite", "path": self.path, "revoked": count}
+
+    def _purge(self):
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        self._connection.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (now,))
+
+
+def create_revocation_store(self_contained_tokens: bool = False) -> RevocationStore:
+    """
+    Build the store selected by REVOCATION_BACKEND ('memory' or 'sqlite').
+    Self-contained tokens are revoked on role changes, which must reach every worker: with them the
+    default is 'sqlite', and 'memory' is refused when WEB_CONCURRENCY configures more than one worker.
+    """
+    backend = os.getenv("REVOCATION_BACKEND", "sqlite" if self_contained_tokens else "memory").lower()
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if backend == "memory" and self_contained_tokens and workers > 1:
+        raise ValueError(
+            f"JWT_SELF_CONTAINED with {workers} workers needs REVOCATION_BACKEND=sqlite; "
+            "the memory backend would revoke role changes in one worker only"
+        )
+    if backend == "sqlite":
+        return SQLiteRevocationStore(os.getenv("REVOCATION_DB_PATH", "revoked_tokens.sqlite3"))
+    if backend != "memory":
+        raise ValueError(f"Unknown REVOCATION_BACKEND: '{backend}'")
+    return MemoryRevocationStore()
@@ -1,45 +1,104 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from app.database import db_connect
 from app.auth.auth_routes import get_current_user
+from app.books.bulk_import import iter_records, validate_record, ImportReport
+from app.books.facets import facet_delta, publish_facet_delta
+from app.books.suggest import suggest_index
+from app.books.catalog_cache import catalog_cache, read_books, BOOK_FIELDS
+from app.utils.export import export_response, keyset_chunks, ExportBusyError, EXPORT_FORMATS
+from app.utils.conditional import version_etag, is_not_modified, not_modified, set_validators, CATALOG_CACHE_CONTROL
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.responses import FastJSONResponse, format_rows, RESULT_FORMATS
+from app.search.schema_registry import select_fields
+from typing import Dict, Optional
+from collections import Counter
 from app.schemas.schemas import Book, BookUpdateRequest
-from mysql.connector import Error
+from mysql.connector import Error, errors
 from datetime import datetime
+import os
 import uuid
-from typing import Dict
 
 router = APIRouter()
 
+# Rows written per transaction by the bulk import
+IMPORT_BATCH_SIZE = int(os.getenv("BOOK_IMPORT_BATCH_SIZE", "1000"))
+
+UPSERT_BOOK_QUERY = """
+    INSERT INTO books (barcode, name, author, price, quantity, added_by) 
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        name = VALUES(name), author = VALUES(author),
+        price = VALUES(price), quantity = VALUES(quantity)
+"""
+LOCK_BOOK_QUERY = "SELECT added_by, name, author, price, quantity FROM books WHERE barcode = %s FOR UPDATE"
+EXPORT_SELECT = f"SELECT {', '.join(BOOK_FIELDS)} FROM books"
+
 # Utility function to raise HTTP exceptions
 def raise_db_error(e: Exception, message: str = "Database error"):
     raise HTTPException(status_code=500, detail=f"{message}: {str(e)}")
 
 @router.get("/view_books")
-def view_books():
+async def view_books(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of books per page."),
+    cursor: str = Query(None, description="Opaque cursor taken from the previous page's 'next_cursor'."),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. 'barcode,name,price'. Defaults to all."),
+    result_format: str = Query("records", alias="format", regex=RESULT_FORMATS,
+                               description="'records' (one object per book) or 'columnar' (column names once, row arrays).")
+):
     """
-    Retrieve all books from the database.
+    Retrieve books one page at a time in barcode order, served from the catalog cache.
+    Responses carry an ETag and Last-Modified from the catalog version; a matching
+    If-None-Match or If-Modified-Since gets an empty 304.
     """
     try:
-        query_result = db_connect.execute_query("SELECT * FROM books;")
-        books = query_result["data"]
-
-        books_data = [
-            {
-                "barcode": row[0],
-                "name": row[1],
-                "author": row[2],
-                "price": row[3],
-                "quantity": row[4],
-                "added_by": row[5]
-            }
-            for row in books
-        ]
-        return {"message": "Books retrieved successfully", "books_data": books_data}
+        columns = select_fields("books", fields)
+        await catalog_cache.sync()
+        etag = version_etag("books", catalog_cache.version)
+        last_modified = catalog_cache.updated_at
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(etag, last_modified, CATALOG_CACHE_CONTROL)
+
+        books, next_cursor = await catalog_cache.page(cursor, limit)
+        if columns != BOOK_FIELDS:
+            positions = [BOOK_FIELDS.index(column) for column in columns]
+            books = [tuple(row[i] for i in positions) for row in books]
+        response = FastJSONResponse({
+            "message": "Books retrieved successfully",
+            "books_data": format_rows(columns, books, result_format),
+            "next_cursor": next_cursor
+        })
+        set_validators(response, etag, last_modified, CATALOG_CACHE_CONTROL)
+        return response
 
     except Error as e:
         raise_db_error(e)
 
+@router.get("/export")
+async def export_books(
+    file_format: str = Query("ndjson", alias="format", regex=EXPORT_FORMATS, description="'ndjson' or 'csv'.")
+):
+    """
+    Stream the whole catalog as NDJSON or CSV, reading it in barcode order one chunk at a time.
+    """
+    stream = keyset_chunks(EXPORT_SELECT, [], [], ["barcode"])
+    try:
+        return export_response(stream, file_format, "books")
+    except ExportBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+@router.get("/suggest")
+async def suggest_books(
+    q: str = Query(..., min_length=1, max_length=100, description="What the user has typed so far."),
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of suggestions.")
+):
+    """
+    As-you-type suggestions for book titles and authors, served from memory and ranked by stock.
+    """
+    return {"suggestions": suggest_index.suggest(q, limit)}
+
 @router.post("/add_books")
-def add_books(book_details: Book, current_user: dict = Depends(get_current_user)):
+async def add_books(book_details: Book, current_user: dict = Depends(get_current_user)):
     """
     Add a new book to the database. Only authenticated users can add books.
     """
@@ -48,16 +107,21 @@ def add_books(book_details: Book, current_user: dict = Depends(get_current_user)
         VALUES (%s, %s, %s, %s, %s, %s)
     """
     try:
-        db_connect.execute_query(query, (
-            book_details.barcode, book_details.name, book_details.author,
-            book_details.price, book_details.quantity, current_user["username"]
-        ))
+        async with db_connect.transaction() as tx:
+            await tx.execute(query, (
+                book_details.barcode, book_details.name, book_details.author,
+                book_details.price, book_details.quantity, current_user["username"]
+            ))
+            [book] = (await read_books(tx, [book_details.barcode])).values()
+        await publish_facet_delta(facet_delta(new=book[2:5]))
+        await catalog_cache.publish(added=[book])
+        suggest_index.upsert(book[0], book[1], book[2], book[4])
         return {"message": f"'{book_details.name}' added by {current_user['username']}"}
     except Exception as e:
         raise_db_error(e)
 
 @router.put("/modify_or_delete_book")
-def modify_or_delete_book(
+async def modify_or_delete_book(
     book_update: BookUpdateRequest, 
     delete: bool = False, 
     user: dict = Depends(get_current_user)
@@ -66,52 +130,191 @@ def modify_or_delete_book(
     Modify or delete a book. Only the creator or admin can modify/delete it.
     """
     try:
-        # Verify if the book exists and fetch the added_by field
-        query_result = db_connect.execute_query(
-            "SELECT barcode, added_by FROM books WHERE barcode = %s", (book_update.barcode,)
-        )
-        book = query_result["data"]
+        async with db_connect.transaction() as tx:
+            # Verify if the book exists and lock it for the change
+            query_result = await tx.execute(LOCK_BOOK_QUERY, (book_update.barcode,))
+            book = query_result["data"]
 
-        if not book:
-            raise HTTPException(status_code=404, detail="Book not found.")
+            if not book:
+                raise HTTPException(status_code=404, detail="Book not found.")
 
-        _, added_by = book[0]
+            added_by, name, author, price, quantity = book[0]
 
-        # Check authorization (either creator or admin)
-        if user["username"] != added_by and user["usertype"] != "admin":
-            raise HTTPException(
-                status_code=403, detail="Unauthorized to modify or delete this book."
-            )
+            # Check authorization (either creator or admin)
+            if user["username"] != added_by and user["usertype"] != "admin":
+                raise HTTPException(
+                    status_code=403, detail="Unauthorized to modify or delete this book."
+                )
+
+            # Handle deletion
+            if delete:
+                await tx.execute(
+                    "DELETE FROM books WHERE barcode = %s", (book_update.barcode,)
+                )
+                delta = facet_delta(old=(author, price, quantity))
+            else:
+                # Handle update
+                update_fields, params = [], []
+                if book_update.quantity is not None:
+                    update_fields.append("quantity = %s")
+                    params.append(book_update.quantity)
+                if book_update.price is not None:
+                    update_fields.append("price = %s")
+                    params.append(book_update.price)
+                if book_update.name is not None:
+                    update_fields.append("name = %s")
+                    params.append(book_update.name)
+
+                if not update_fields:
+                    raise HTTPException(
+                        status_code=400, detail="No valid fields to update."
+                    )
 
-        # Handle deletion
+                params.append(book_update.barcode)
+                await tx.execute(
+                    f"UPDATE books SET {', '.join(update_fields)} WHERE barcode = %s", tuple(params)
+                )
+                [updated] = (await read_books(tx, [book_update.barcode])).values()
+                delta = facet_delta(old=(author, price, quantity), new=updated[2:5])
+
+        await publish_facet_delta(delta)
         if delete:
-            db_connect.execute_query(
-                "DELETE FROM books WHERE barcode = %s", (book_update.barcode,)
-            )
+            await catalog_cache.publish(deleted=[book_update.barcode])
+            suggest_index.remove(book_update.barcode)
             return {"message": f"Book with barcode {book_update.barcode} deleted successfully."}
 
-        # Handle update
-        update_fields, params = [], []
-        if book_update.quantity is not None:
-            update_fields.append("quantity = %s")
-            params.append(book_update.quantity)
-        if book_update.price is not None:
-            update_fields.append("price = %s")
-            params.append(book_update.price)
-        if book_update.name is not None:
-            update_fields.append("name = %s")
-            params.append(book_update.name)
-
-        if not update_fields:
-            raise HTTPException(
-                status_code=400, detail="No valid fields to update."
-            )
-
-        params.append(book_update.barcode)
-        db_connect.execute_query(
-            f"UPDATE books SET {', '.join(update_fields)} WHERE barcode = %s", tuple(params)
-        )
+        await catalog_cache.publish(rows=[updated])
+        suggest_index.upsert(updated[0], updated[1], updated[2], updated[4])
         return {"message": f"Book with barcode {book_update.barcode} updated successfully."}
 
+    except HTTPException as http_err:
+        raise http_err
     except Exception as e:
-        raise_db_error(e)
\ No newline at end of file
+        raise_db_error(e)
+
+@router.post("/import")
+async def import_books(
+    request: Request,
+    file_format: str = Query(None, alias="format", regex="^(csv|ndjson)$",
+                             description="Body format; defaults from the Content-Type header."),
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=10000, description="Rows written per transaction."),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Bulk import books from a CSV (with a header row) or NDJSON request body.
+    - The body is streamed and validated row by row, so memory does not grow with the file.
+    - Rows are upserted on barcode in batches; existing books can only be updated by their creator or an admin.
+    - Returns a per-row error report for rows that were rejected.
+    """
+    if file_format is None:
+        content_type = request.headers.get("content-type", "")
+        file_format = "ndjson" if "json" in content_type else "csv"
+
+    report = ImportReport()
+    facets = facet_delta()  # Counter changes of the committed batches, applied once at the end
+    batch = []
+    try:
+        async for line_number, record in iter_records(request, file_format):
+            if isinstance(record, str):
+                report.add_error(line_number, record)
+                continue
+
+            book, error = validate_record(record)
+            if error:
+                report.add_error(line_number, error, record.get("barcode"))
+                continue
+
+            batch.append((line_number, book))
+            if len(batch) >= batch_size:
+                await write_import_batch(batch, current_user, report, facets)
+                batch = []
+
+        if batch:
+            await write_import_batch(batch, current_user, report, facets)
+    finally:
+        await publish_facet_delta(facets)
+
+    return {"message": "Book import completed", **report.as_dict()}
+
+async def write_import_batch(batch, current_user: dict, report: ImportReport, facets: Counter):
+    """
+    Upsert one batch of validated rows in a single transaction.
+    Once it commits, its facet counter changes are added to `facets` for the caller to apply.
+    """
+    username = current_user["username"]
+    foreign = set()
+    reported = set()  # Line numbers of this batch already in the report
+    try:
+        async with db_connect.transaction() as tx:
+            # Lock the rows this batch will overwrite and read what they hold now
+            placeholders = ", ".join(["%s"] * len(batch))
+            result = await tx.execute(
+                f"SELECT barcode, added_by, author, price, quantity FROM books WHERE barcode IN ({placeholders}) FOR UPDATE",
+                tuple(book.barcode for _, book in batch)
+            )
+            current = {row[0]: row[2:] for row in result["data"]}
+
+            # Existing books added by someone else are rejected unless the importer is an admin
+            if current_user["usertype"] != "admin":
+                foreign = {row[0] for row in result["data"] if row[1] != username}
+
+            entries = []
+            for line_number, book in batch:
+                if book.barcode in foreign:
+                    report.add_error(line_number, "Unauthorized to modify this book.", book.barcode)
+                    reported.add(line_number)
+                    continue
+                entries.append((line_number, (book.barcode, book.name, book.author, book.price, book.quantity, username)))
+
+            written = await upsert_import_rows(tx, entries, report, reported)
+
+            # Stored rows carry the rounded price and, for existing books, the original added_by
+            stored = await read_books(tx, [row[0] for _, row in written])
+            delta = facet_delta()
+            for barcode, row in stored.items():
+                delta.update(facet_delta(current.get(barcode), row[2:5]))
+
+        facets.update(delta)
+        report.imported += len(written)
+        if stored:
+            await catalog_cache.publish(
+                rows=[row for barcode, row in stored.items() if barcode in current],
+                added=[row for barcode, row in stored.items() if barcode not in current],
+            )
+        suggest_index.upsert_many((barcode, name, author, quantity) for barcode, name, author, _, quantity, _ in stored.values())
+
+    except Error as e:
+        # The batch rolled back; rows already reported keep their own error
+        for line_number, book in batch:
+            if line_number not in reported:
+                report.add_error(line_number, f"Database error: {str(e)}", book.barcode)
+
+async def upsert_import_rows(tx, entries, report: ImportReport, reported: set):
+    """
+    Upsert (line_number, row) entries with one batched statement. When MySQL rejects the batch,
+    each row is retried under its own savepoint so only the offending rows are reported; their
+    line numbers are added to `reported`. Returns the entries that were written.
+    """
+    if not entries:
+        return []
+    try:
+        async with tx.savepoint("import_batch"):
+            await tx.executemany(UPSERT_BOOK_QUERY, [row for _, row in entries])
+        return entries
+    except (errors.InterfaceError, errors.OperationalError):
+        raise
+    except Error:
+        pass
+
+    written = []
+    for line_number, row in entries:
+        try:
+            async with tx.savepoint("import_row"):
+                await tx.execute(UPSERT_BOOK_QUERY, row)
+            written.append((line_number, row))
+        except (errors.InterfaceError, errors.OperationalError):
+            raise
+        except Error as e:
+            report.add_error(line_number, f"Database error: {str(e)}", row[0])
+            reported.add(line_number)
+    return written
@@ -0,0 +1,165 @@
+from fastapi import Request
+from pydantic import ValidationError
+from app.schemas.schemas import Book
+from collections import deque
+import csv
+import json
+import os
+
+MAX_REPORTED_ERRORS = 1000  # Errors beyond this are counted but not listed, keeping the report bounded
+MAX_LINE_BYTES = int(os.getenv("BOOK_IMPORT_MAX_LINE_BYTES", "65536"))  # Longer lines and CSV records are rejected
+
+
+def _decode(line: bytes) -> str:
+    return line.decode("utf-8", errors="replace").rstrip("\r")
+
+
+async def iter_lines(request: Request):
+    """
+    Yield decoded lines from the request body as it arrives, without buffering the whole upload.
+    A line longer than MAX_LINE_BYTES is yielded as None and its bytes are dropped as they arrive.
+    """
+    buffer = b""
+    skipping = False  # Inside a line already reported as too long
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if skipping:
+                skipping = False
+                continue
+            yield None if len(line) > MAX_LINE_BYTES else _decode(line)
+        if len(buffer) > MAX_LINE_BYTES:
+            if not skipping:
+                yield None
+                skipping = True
+            buffer = b""
+    if buffer and not skipping:
+        yield None if len(buffer) > MAX_LINE_BYTES else _decode(buffer)
+
+
+class _PendingLines:
+    """Line iterator for one csv.reader, refilled as the upload arrives."""
+
+    def __init__(self):
+        self.lines = deque()
+        self.size = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.lines:
+            raise StopIteration
+        line = self.lines.popleft()
+        self.size -= len(line)
+        return line
+
+    def append(self, line: str):
+        self.lines.append(line)
+        self.size += len(line)
+
+    def clear(self) -> int:
+        dropped = len(self.lines)
+        self.lines.clear()
+        self.size = 0
+        return dropped
+
+
+async def iter_records(request: Request, file_format: str):
+    """Yield (line_number, record dict or error message) for a CSV or NDJSON body."""
+    too_long = f"Line is longer than {MAX_LINE_BYTES} bytes"
+    if file_format == "ndjson":
+        line_number = 0
+        async for line in iter_lines(request):
+            line_number += 1
+            if line is None:
+                yield line_number, too_long
+                continue
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, "Each line must be a JSON object"
+                continue
+            yield line_number, record
+        return
+
+    # One reader over every line, so quoted fields may span lines. It is only advanced once the
+    # pending lines hold an even number of quotes, i.e. a complete record.
+    pending = _PendingLines()
+    reader = csv.reader(pending)
+    header = None
+    line_number = 0
+    skipped = 0  # Lines that never reached the reader; reader.line_num + skipped is the file position
+    quotes = 0
+    async for line in iter_lines(request):
+        line_number += 1
+        if line is None:
+            yield line_number, too_long
+            if pending.lines:
+                yield skipped + reader.line_num + 1, "Record ends inside an over-long line"
+            skipped += pending.clear() + 1
+            quotes = 0
+            continue
+
+        pending.append(line + "\n")
+        quotes += line.count('"')
+        if quotes % 2:
+            if pending.size > MAX_LINE_BYTES:
+                yield skipped + reader.line_num + 1, f"Quoted field is not closed within {MAX_LINE_BYTES} characters"
+                skipped += pending.clear()
+                quotes = 0
+            continue  # A quoted field continues on the next line
+        quotes = 0
+
+        while pending.lines:
+            start = skipped + reader.line_num + 1
+            values = next(reader)
+            if not values or (len(values) == 1 and not values[0].strip()):
+                continue  # Blank line
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            if len(values) != len(header):
+                yield start, f"Expected {len(header)} columns, got {len(values)}"
+                continue
+            yield start, dict(zip(header, values))
+
+    if pending.lines:
+        yield skipped + reader.line_num + 1, "Quoted field is not closed at the end of the file"
+
+
+def validate_record(record: dict):
+    """Validate a record against the Book schema; returns (book, None) or (None, error message)."""
+    try:
+        return Book(**record), None
+    except ValidationError as e:
+        details = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+        return None, details
+
+
+class ImportReport:
+    """Running totals and a bounded per-row error list for one import."""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line_number: int, error: str, barcode: str = None):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "barcode": barcode, "error": error})
+
+    def as_dict(self) -> dict:
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
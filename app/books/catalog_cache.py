@@ -0,0 +1,240 @@
+from app.database import db_connect
+from app.utils.cache import TTLCache
+from app.utils.pagination import page_clause, split_page
+from mysql.connector import Error
+from datetime import datetime, timezone
+from typing import Optional
+import asyncio
+import logging
+import os
+import time
+
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "50000"))  # Books kept as per-barcode entries
+CATALOG_PAGE_CACHE_SIZE = int(os.getenv("CATALOG_PAGE_CACHE_SIZE", "1000"))  # Catalog pages kept, as barcode lists
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "3600"))  # Safety net; versions normally invalidate first
+VERSION_CHECK_INTERVAL = float(os.getenv("CATALOG_VERSION_CHECK_INTERVAL", "1"))  # Seconds between version reads
+CHANGE_LOG_VERSIONS = 1000  # Versions whose changed barcodes stay in catalog_changes; workers further behind drop everything
+CHANGE_READ_LIMIT = 5000  # Changed barcodes read in one sync; a longer backlog drops everything instead
+
+BOOK_FIELDS = ["barcode", "name", "author", "price", "quantity", "added_by"]  # Order of cached row tuples
+BOOK_COLUMNS = ", ".join(BOOK_FIELDS)
+
+# What a version did to a barcode. Only added and removed books move catalog page boundaries;
+# changed ones (stock from orders, edits) only make that book's cached row stale.
+CHANGED, ADDED, REMOVED = "changed", "added", "removed"
+
+# LAST_INSERT_ID(expr) hands the new version back in the OK packet
+BUMP_VERSION_QUERY = """
+    UPDATE catalog_versions
+    SET version = LAST_INSERT_ID(version + 1), updated_at = UTC_TIMESTAMP()
+    WHERE name = 'books'
+"""
+RECORD_CHANGE_QUERY = "INSERT INTO catalog_changes (version, barcode, kind) VALUES (%s, %s, %s)"
+PRUNE_CHANGES_QUERY = "DELETE FROM catalog_changes WHERE version <= %s"
+VERSION_QUERY = db_connect.read("SELECT version, updated_at FROM catalog_versions WHERE name = 'books'")
+CHANGES_QUERY = db_connect.read(
+    "SELECT barcode, kind FROM catalog_changes WHERE version > %s AND version <= %s ORDER BY version LIMIT %s"
+)
+BOOK_QUERY = db_connect.read(f"SELECT {BOOK_COLUMNS} FROM books WHERE barcode = %s")
+
+
+def books_query(count: int) -> str:
+    """SELECT of the cached columns for `count` barcodes."""
+    return f"SELECT {BOOK_COLUMNS} FROM books WHERE barcode IN ({', '.join(['%s'] * count)})"
+
+
+def page_query(cursor: Optional[str], limit: int):
+    """SQL and parameters for one keyset page of the catalog in barcode order."""
+    predicate, params, order_and_limit, limit_params = page_clause(["barcode"], cursor, limit)
+    query = f"SELECT {BOOK_COLUMNS} FROM books"
+    if predicate:
+        query += f" WHERE {predicate}"
+    return query + order_and_limit, tuple(params + limit_params)
+
+
+async def bump_catalog_version(changes) -> Optional[int]:
+    """
+    Increase the catalog version once a book write has committed, recording the (barcode, kind)
+    changes under it, and return the new value. It runs after the write's own transaction, so
+    write transactions never queue on the single version row; the row lock it takes orders the
+    versions, so any worker that sees a version also sees every change up to it.
+    Returns None when the bump fails; the other workers then keep their rows until they expire.
+    """
+    try:
+        async with db_connect.transaction() as tx:
+            version = (await tx.execute(BUMP_VERSION_QUERY))["lastrowid"]
+            if changes:
+                await tx.executemany(RECORD_CHANGE_QUERY, [(version, barcode, kind) for barcode, kind in changes])
+        if version % CHANGE_LOG_VERSIONS == 0:
+            # Workers further behind than this drop their cache rather than read the log
+            await db_connect.execute_query_async(PRUNE_CHANGES_QUERY, (version - CHANGE_LOG_VERSIONS,))
+    except (Error, OSError) as e:  # The write itself has committed, so the request still succeeds
+        logging.error(f"Could not bump the catalog version, other workers may serve stale books: '{e}'")
+        return None
+    return version
+
+
+async def read_books(tx, barcodes) -> dict:
+    """
+    {barcode: row} as stored, read back inside the writing transaction. Caches and facet counters
+    take their values from here rather than the request: books.price is an INT column, so MySQL
+    rounds a fractional price on the way in.
+    """
+    barcodes = list(dict.fromkeys(barcodes))
+    if not barcodes:
+        return {}
+    result = await tx.execute(books_query(len(barcodes)), tuple(barcodes))
+    return {row[0]: row for row in result["data"]}
+
+
+class CatalogCache:
+    """
+    Read-through cache of book rows, kept coherent across workers by the catalog version.
+    - Per-barcode entries serve pricing, cart lookups and the rows of catalog pages.
+    - Catalog pages are cached as the barcodes they list, so a page costs one keyset query
+      when missing and no query when its books are cached.
+    Local writes patch the affected rows in place. Versions written by other workers (seen at most
+    VERSION_CHECK_INTERVAL seconds later) drop only the barcodes they changed, and the cached
+    pages only when books were added or removed.
+    """
+
+    def __init__(self):
+        self.entries = TTLCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL)
+        self.pages = TTLCache(CATALOG_PAGE_CACHE_SIZE, CATALOG_CACHE_TTL)  # (cursor, limit) -> (barcodes, next_cursor)
+        self.version = None
+        self.updated_at = None  # UTC time of the last catalog change, for Last-Modified
+        self.page_loads = 0
+        self.invalidations = 0  # Whole-cache drops, after falling too far behind
+        self.changes_applied = 0  # Barcodes dropped for changes made by other workers
+        self._checked_at = 0.0
+        self._generation = 0  # Bumped on every change, so loads racing a write are not stored
+
+    def clear(self):
+        self.entries.clear()
+        self.pages.clear()
+        self._generation += 1
+        self.invalidations += 1
+
+    async def sync(self):
+        """Drop the rows other workers have changed since the last check."""
+        now = time.monotonic()
+        if now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        result = await db_connect.execute_statement(VERSION_QUERY)
+        version, updated_at = result["data"][0] if result["data"] else (0, None)
+        seen = self.version
+        if seen is not None and version > seen:
+            await self._apply_changes(seen, version)
+        if self.version is None or version >= self.version:  # A local write may have moved it on meanwhile
+            self.version, self.updated_at = version, updated_at
+
+    async def _apply_changes(self, seen: int, version: int):
+        if version - seen > CHANGE_LOG_VERSIONS:
+            self.clear()
+            return
+        result = await db_connect.execute_statement(CHANGES_QUERY, (seen, version, CHANGE_READ_LIMIT + 1))
+        if len(result["data"]) > CHANGE_READ_LIMIT:
+            self.clear()
+            return
+        self._generation += 1
+        for barcode, kind in result["data"]:
+            self.entries.invalidate(barcode)
+            if kind != CHANGED:
+                self.pages.clear()
+        self.changes_applied += len(result["data"])
+
+    async def page(self, cursor: Optional[str], limit: int):
+        """One keyset page of the catalog in barcode order, with the same cursors as the SQL path."""
+        await self.sync()
+        listed = self.pages.get((cursor, limit))
+        if listed is not None:
+            barcodes, next_cursor = listed
+            books = await self.get_books(barcodes)
+            if len(books) == len(barcodes):
+                return [books[barcode] for barcode in barcodes], next_cursor
+            # A listed book has gone since the page was cached; read the page again
+
+        generation = self._generation
+        query, params = page_query(cursor, limit)
+        result = await db_connect.execute_statement(db_connect.read(query), params)
+        rows, next_cursor = split_page(result["data"], limit, key=lambda row: (row[0],))
+        self.page_loads += 1
+        if generation == self._generation:
+            for row in rows:
+                self.entries.set(row[0], row)
+            self.pages.set((cursor, limit), ([row[0] for row in rows], next_cursor))
+        return rows, next_cursor
+
+    async def get_books(self, barcodes) -> dict:
+        """Return {barcode: row} for the given barcodes, reading only the uncached ones from MySQL."""
+        await self.sync()
+        found, missing = {}, []
+        for barcode in dict.fromkeys(barcodes):
+            row = self.entries.get(barcode)
+            if row is None:
+                missing.append(barcode)
+            else:
+                found[barcode] = row
+
+        if missing:
+            generation = self._generation
+            if len(missing) == 1:
+                result = await db_connect.execute_statement(BOOK_QUERY, (missing[0],))
+            else:
+                # One IN list per size would crowd the per-connection statement cache, so it is sent as text
+                result = await db_connect.execute_query_async(books_query(len(missing)), tuple(missing))
+            for row in result["data"]:
+                found[row[0]] = row
+                if generation == self._generation:
+                    self.entries.set(row[0], row)
+        return found
+
+    async def publish(self, rows=(), added=(), deleted=(), quantities=None):
+        """
+        Record a committed book write: bump the catalog version with the changed barcodes, then
+        patch this worker's cache. `rows` are full rows of changed books and `added` of new ones,
+        `deleted` barcodes and `quantities` {barcode: new stock}.
+        """
+        rows, added, deleted, quantities = list(rows), list(added), list(deleted), quantities or {}
+        changes = {str(barcode): CHANGED for barcode in quantities}
+        changes.update((str(row[0]), CHANGED) for row in rows)
+        changes.update((str(row[0]), ADDED) for row in added)
+        changes.update((str(barcode), REMOVED) for barcode in deleted)
+        version = await bump_catalog_version(list(changes.items()))
+        self.committed(version, rows + added, deleted, quantities, moved=bool(added or deleted))
+
+    def committed(self, version: Optional[int], rows=(), deleted=(), quantities=None, moved: bool = False):
+        """
+        Apply a local write that committed as catalog `version` (None when the bump failed).
+        Barcodes are keyed as str, like books.barcode, whatever type the request carried.
+        `moved` says books were added or removed, which shifts the cached pages.
+        """
+        self._generation += 1
+        for row in rows:
+            self.entries.set(str(row[0]), (str(row[0]),) + tuple(row[1:]))
+        for barcode in deleted:
+            self.entries.invalidate(str(barcode))
+        for barcode, quantity in (quantities or {}).items():
+            row = self.entries.get(str(barcode))
+            if row is not None:
+                self.entries.set(str(barcode), row[:4] + (quantity,) + row[5:])
+        if moved:
+            self.pages.clear()
+        if version is not None and self.version is not None and version == self.version + 1:
+            # Nothing else was written in between, so the next sync has nothing to read back
+            self.version = version
+            self.updated_at = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "entries": self.entries.stats(),
+            "pages": self.pages.stats(),
+            "page_loads": self.page_loads,
+            "changes_applied": self.changes_applied,
+            "invalidations": self.invalidations,
+        }
+
+
+catalog_cache = CatalogCache()
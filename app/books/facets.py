@@ -0,0 +1,142 @@
+from collections import Counter
+from app.database import db_connect
+from mysql.connector import Error
+import logging
+
+# Price buckets as (label, lower bound inclusive, upper bound exclusive or None)
+PRICE_BUCKETS = [
+    ("0-10", 0, 10),
+    ("10-25", 10, 25),
+    ("25-50", 25, 50),
+    ("50-100", 50, 100),
+    ("100+", 100, None),
+]
+TOP_AUTHORS = 20  # Author facet entries returned with a search
+
+UPSERT_FACETS_QUERY = """
+    INSERT INTO book_facets (facet, bucket, book_count) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE book_count = book_count + VALUES(book_count)
+"""
+
+
+def price_bucket(price) -> str:
+    price = price or 0
+    for label, low, high in PRICE_BUCKETS:
+        if price >= low and (high is None or price < high):
+            return label
+    return PRICE_BUCKETS[0][0]
+
+
+def stock_bucket(quantity) -> str:
+    return "in_stock" if (quantity or 0) > 0 else "out_of_stock"
+
+
+def _price_bucket_sql(column: str = "COALESCE(price, 0)") -> str:
+    """SQL CASE expression matching price_bucket()."""
+    cases = " ".join(
+        f"WHEN {column} < {high} THEN '{label}'" for label, _, high in PRICE_BUCKETS if high is not None
+    )
+    return f"CASE {cases} ELSE '{PRICE_BUCKETS[-1][0]}' END"
+
+
+def _stock_bucket_sql(column: str = "quantity") -> str:
+    return f"IF({column} > 0, 'in_stock', 'out_of_stock')"
+
+
+def facet_keys(author, price, quantity) -> list:
+    return [("author", author or ""), ("price", price_bucket(price)), ("stock", stock_bucket(quantity))]
+
+
+def facet_delta(old=None, new=None) -> Counter:
+    """Counter changes for a book going from `old` to `new`; each is (author, price, quantity) or None."""
+    delta = Counter()
+    if old is not None:
+        delta.subtract(facet_keys(*old))
+    if new is not None:
+        delta.update(facet_keys(*new))
+    return delta
+
+
+def stock_delta(old_quantity, new_quantity) -> Counter:
+    """Counter changes when only a book's stock level moves (e.g. an order)."""
+    delta = Counter()
+    old_bucket, new_bucket = stock_bucket(old_quantity), stock_bucket(new_quantity)
+    if old_bucket != new_bucket:
+        delta[("stock", old_bucket)] -= 1
+        delta[("stock", new_bucket)] += 1
+    return delta
+
+
+async def publish_facet_delta(delta: Counter):
+    """
+    Apply counter changes once the write that caused them has committed, in a short transaction
+    of its own: the counters are a few hot rows, and holding their locks until a book write,
+    order or import batch commits would queue every other write behind it. Rows are updated in
+    key order, so two concurrent publishers cannot deadlock. A failed update is logged and leaves
+    the counters off by this delta until the next rebuild.
+    """
+    rows = sorted((facet, bucket, change) for (facet, bucket), change in delta.items() if change)
+    if not rows:
+        return
+    try:
+        async with db_connect.transaction() as tx:
+            await tx.executemany(UPSERT_FACETS_QUERY, rows)
+    except (Error, OSError) as e:  # The write itself has committed, so the request still succeeds
+        logging.error(f"Could not update the catalog facet counters, they are off until rebuilt: '{e}'")
+
+
+async def rebuild_facets():
+    """Recompute every counter from the books table (initial load or after out-of-band edits)."""
+    async with db_connect.transaction() as tx:
+        await tx.execute("DELETE FROM book_facets")
+        await tx.execute(f"""
+            INSERT INTO book_facets (facet, bucket, book_count)
+            SELECT 'author', COALESCE(author, ''), COUNT(*) FROM books GROUP BY COALESCE(author, '')
+            UNION ALL
+            SELECT 'price', {_price_bucket_sql()}, COUNT(*) FROM books GROUP BY 2
+            UNION ALL
+            SELECT 'stock', {_stock_bucket_sql()}, COUNT(*) FROM books GROUP BY 2
+        """)
+
+
+async def ensure_facets():
+    """Build the counters on first start, when the table is still empty."""
+    result = await db_connect.execute_query_async("SELECT 1 FROM book_facets LIMIT 1")
+    if not result["data"]:
+        await rebuild_facets()
+
+
+def _format(counts) -> dict:
+    facets = {"author": {}, "price": {}, "stock": {}}
+    for facet, bucket, count in counts:
+        if count > 0:
+            facets[facet][bucket] = facets[facet].get(bucket, 0) + int(count)
+    top_authors = sorted(facets["author"].items(), key=lambda item: (-item[1], item[0]))[:TOP_AUTHORS]
+    facets["author"] = dict(top_authors)
+    facets["price"] = {label: facets["price"].get(label, 0) for label, _, _ in PRICE_BUCKETS}
+    facets["stock"] = {bucket: facets["stock"].get(bucket, 0) for bucket in ("in_stock", "out_of_stock")}
+    return facets
+
+
+async def catalog_facets() -> dict:
+    """Facet counts for the whole catalog, read from the maintained counters."""
+    result = await db_connect.execute_query_async(
+        "SELECT facet, bucket, book_count FROM book_facets WHERE book_count > 0"
+    )
+    return _format(result["data"])
+
+
+async def filtered_facets(where_sql: str, params) -> dict:
+    """Facet counts for a filtered result set, counted in one pass over the matching rows only."""
+    result = await db_connect.execute_query_async(
+        f"""
+        SELECT COALESCE(author, ''), {_price_bucket_sql()}, {_stock_bucket_sql()}, COUNT(*)
+        FROM books WHERE {where_sql}
+        GROUP BY 1, 2, 3
+        """,
+        tuple(params)
+    )
+    counts = []
+    for author, price, stock, count in result["data"]:
+        counts.extend([("author", author, count), ("price", price, count), ("stock", stock, count)])
+    return _format(counts)
@@ -0,0 +1,304 @@
+from app.database import db_connect
+from mysql.connector import Error
+from bisect import bisect_left, insort
+from heapq import merge, nsmallest
+import asyncio
+import logging
+import os
+import re
+import time
+
+REBUILD_INTERVAL = float(os.getenv("SUGGEST_REBUILD_INTERVAL", "300"))  # Picks up writes made by other workers
+SHORT_PREFIX = 2  # Query words up to this length are answered from rankings precomputed by the build
+TOP_DEPTH = 200  # Books kept per precomputed ranking; at least the largest suggestion limit
+MERGE_THRESHOLD = 64  # New words in one batch above which the vocabulary is merged rather than insorted
+
+NAME, AUTHOR = 1, 2  # Bits recording which field a query token matched
+
+_WORD = re.compile(r"\w+")
+
+
+def words(text) -> tuple:
+    """Casefolded words of a title, author or query; punctuation separates words ("J.R.R." -> j, r, r)."""
+    return tuple(_WORD.findall(str(text or "").casefold()))
+
+
+class IndexState:
+    """
+    The data of one index build.
+    - `books`: barcode -> (name, author, quantity, name words, author words)
+    - `postings`: word -> {barcode: NAME/AUTHOR bits}
+    - `vocabulary`: every word in sorted order, so a prefix is a bisect plus a forward scan
+    - `tops`: rank keys of the best ranked books per short prefix, in rank order. Every book with
+      the prefix that is not listed ranks at or below `floors[prefix]` (None when the list holds
+      every match). Writes re-rank the book in place, so the lists stay at most TOP_DEPTH long.
+    """
+
+    def __init__(self):
+        self.books = {}
+        self.postings = {}
+        self.vocabulary = []
+        self.tops = {}
+        self.floors = {}
+
+    @classmethod
+    def build(cls, rows):
+        """Index (barcode, name, author, quantity) rows; pure CPU work, run off the event loop."""
+        state = cls()
+        for barcode, name, author, quantity in rows:
+            state.add(str(barcode), name, author, quantity)
+        state.vocabulary = sorted(state.postings)
+        state.rank_short_prefixes()
+        return state
+
+    def rank_key(self, barcode):
+        """Most stock first, then by name; the barcode makes every key unique."""
+        book = self.books[barcode]
+        return (-book[2], book[0] or "", barcode)
+
+    def add(self, barcode, name, author, quantity) -> list:
+        """Index one book; returns the words that were not in the index before."""
+        name_words, author_words = words(name), words(author)
+        self.books[barcode] = (name, author, quantity or 0, name_words, author_words)
+        new = []
+        for field, field_words in ((NAME, name_words), (AUTHOR, author_words)):
+            for word in field_words:
+                posting = self.postings.get(word)
+                if posting is None:
+                    posting = self.postings[word] = {}
+                    new.append(word)
+                posting[barcode] = posting.get(barcode, 0) | field
+        return new
+
+    def discard(self, barcode):
+        book = self.books.pop(barcode, None)
+        if book is None:
+            return
+        for word in set(book[3] + book[4]):
+            posting = self.postings.get(word)
+            if posting is not None:
+                posting.pop(barcode, None)
+                # Emptied words stay in the vocabulary until the next rebuild; lookups skip them
+
+    def add_words(self, new):
+        """Put newly seen words into the sorted vocabulary."""
+        if len(new) > MERGE_THRESHOLD:
+            self.vocabulary = list(merge(self.vocabulary, sorted(new)))
+        else:
+            for word in new:
+                insort(self.vocabulary, word)
+
+    def short_prefixes(self, barcode) -> set:
+        book = self.books[barcode]
+        return {word[:length] for word in book[3] + book[4] for length in range(1, SHORT_PREFIX + 1)}
+
+    def rank_short_prefixes(self):
+        """Fill `tops` with one pass over the books in rank order."""
+        for key in sorted(self.rank_key(barcode) for barcode in self.books):
+            for prefix in self.short_prefixes(key[2]):
+                top = self.tops.get(prefix)
+                if top is None:
+                    top = self.tops[prefix] = []
+                if len(top) < TOP_DEPTH:
+                    top.append(key)
+        self.floors = {prefix: top[-1] if len(top) == TOP_DEPTH else None for prefix, top in self.tops.items()}
+
+    def unrank(self, barcode):
+        """Take a book out of the short-prefix rankings, before it changes or goes."""
+        if barcode not in self.books:
+            return
+        key = self.rank_key(barcode)
+        for prefix in self.short_prefixes(barcode):
+            top = self.tops.get(prefix, [])
+            position = bisect_left(top, key)
+            if position < len(top) and top[position] == key:
+                del top[position]
+
+    def rank(self, barcode):
+        """Put a written book into the short-prefix rankings it now belongs in."""
+        key = self.rank_key(barcode)
+        for prefix in self.short_prefixes(barcode):
+            floor = self.floors.get(prefix)
+            if floor is not None and key >= floor:
+                continue  # Ranks with the books left out, which the floor already accounts for
+            top = self.tops.get(prefix)
+            if top is None:
+                top = self.tops[prefix] = []
+            insort(top, key)
+            if len(top) > TOP_DEPTH:
+                self.floors[prefix] = top.pop()
+
+    def prefix_matches(self, token) -> dict:
+        """barcode -> field bits for every book with a word starting with `token`."""
+        matches = {}
+        position = bisect_left(self.vocabulary, token)
+        while position < len(self.vocabulary):
+            word = self.vocabulary[position]
+            if not word.startswith(token):
+                break
+            for barcode, fields in self.postings[word].items():
+                matches[barcode] = matches.get(barcode, 0) | fields
+            position += 1
+        return matches
+
+    def narrow(self, candidates, token) -> dict:
+        """Keep the candidates with a word starting with `token`, and-ing the matched fields."""
+        narrowed = {}
+        for barcode, fields in candidates.items():
+            book = self.books.get(barcode)
+            if book is None:
+                continue
+            matched = 0
+            if any(word.startswith(token) for word in book[3]):
+                matched |= NAME
+            if any(word.startswith(token) for word in book[4]):
+                matched |= AUTHOR
+            if matched:
+                narrowed[barcode] = fields & matched
+        return narrowed
+
+    def search(self, tokens, limit: int):
+        """The `limit` best ranked matches of every token, as (barcodes, {barcode: field bits})."""
+        # The longest token has the fewest matches; the others only filter those candidates
+        ordered = sorted(set(tokens), key=len, reverse=True)
+
+        if len(ordered[0]) <= SHORT_PREFIX:
+            # Every book left out of the ranking ranks at or below its floor, so a full page
+            # that beats the floor is the true answer
+            candidates = {key[2]: NAME | AUTHOR for key in self.tops.get(ordered[0], ())}
+            for token in ordered:
+                candidates = self.narrow(candidates, token)
+            best = nsmallest(limit, candidates, key=self.rank_key)
+            floor = self.floors.get(ordered[0])
+            if floor is None or (len(best) == limit and self.rank_key(best[-1]) < floor):
+                return best, candidates
+
+        candidates = self.prefix_matches(ordered[0])
+        for token in ordered[1:]:
+            candidates = self.narrow(candidates, token)
+        return nsmallest(limit, candidates, key=self.rank_key), candidates
+
+
+class SuggestIndex:
+    """
+    In-memory prefix index over the words of book names and authors.
+    Every query word must start some word of the book's name or author ("lord ri" finds
+    "The Lord of the Rings", "tolk" finds "J.R.R. Tolkien"). All matches are ranked by stock.
+    """
+
+    def __init__(self):
+        self._state = IndexState()
+        self._journal = None  # Changes made while a rebuild is loading, replayed onto the new build
+        self.built_at = 0.0
+
+    def __len__(self):
+        return len(self._state.books)
+
+    def load(self, rows):
+        """Replace the index with (barcode, name, author, quantity) rows, building it on this thread."""
+        self.install(IndexState.build(rows))
+
+    def start_rebuild(self):
+        """Record changes from now on, so a build made from rows read after this point loses none."""
+        self._journal = []
+
+    def install(self, state: IndexState):
+        journal, self._journal = self._journal, None
+        self._state = state
+        for change, args in journal or ():
+            change(*args)
+        self.built_at = time.monotonic()
+
+    def abandon_rebuild(self):
+        self._journal = None
+
+    def upsert(self, barcode, name, author, quantity):
+        self.upsert_many([(barcode, name, author, quantity)])
+
+    def upsert_many(self, rows):
+        """Index a batch of (barcode, name, author, quantity) rows, e.g. one import batch."""
+        rows = list(rows)
+        if self._journal is not None:
+            self._journal.append((self.upsert_many, (rows,)))
+        state, new = self._state, []
+        for barcode, name, author, quantity in rows:
+            barcode = str(barcode)
+            state.unrank(barcode)
+            state.discard(barcode)
+            new.extend(state.add(barcode, name, author, quantity))
+            state.rank(barcode)
+        state.add_words(set(new))
+
+    def remove(self, barcode):
+        if self._journal is not None:
+            self._journal.append((self.remove, (barcode,)))
+        self._state.unrank(str(barcode))
+        self._state.discard(str(barcode))
+
+    def set_quantity(self, barcode, quantity):
+        """Stock only affects ranking, so no words move."""
+        if self._journal is not None:
+            self._journal.append((self.set_quantity, (barcode, quantity)))
+        barcode, state = str(barcode), self._state
+        book = state.books.get(barcode)
+        if book is not None:
+            state.unrank(barcode)
+            state.books[barcode] = book[:2] + (quantity or 0,) + book[3:]
+            state.rank(barcode)
+
+    def suggest(self, prefix: str, limit: int = 10) -> list:
+        tokens = words(prefix)
+        if not tokens:
+            return []
+        books = self._state.books
+        best, fields = self._state.search(tokens, limit)
+        return [
+            {
+                "barcode": barcode,
+                "name": books[barcode][0],
+                "author": books[barcode][1],
+                "matched": _matched_field(fields[barcode]),
+            }
+            for barcode in best
+        ]
+
+
+def _matched_field(fields: int) -> str:
+    """'name' or 'author' when that field alone holds every query word, 'both' when they are split."""
+    if fields & NAME:
+        return "name"
+    if fields & AUTHOR:
+        return "author"
+    return "both"
+
+
+suggest_index = SuggestIndex()
+
+
+async def rebuild_suggest_index():
+    """
+    Load the whole catalog into the index. Rows are read in chunks from an unbuffered cursor,
+    so the driver never buffers the result on top of the rows the index keeps, and the index
+    is built on a worker thread so the event loop keeps serving requests meanwhile.
+    """
+    suggest_index.start_rebuild()
+    try:
+        rows = []
+        async for _, chunk in db_connect.stream_query("SELECT barcode, name, author, quantity FROM books"):
+            rows.extend(chunk)
+        state = await asyncio.get_running_loop().run_in_executor(None, IndexState.build, rows)
+    except BaseException:
+        suggest_index.abandon_rebuild()
+        raise
+    suggest_index.install(state)
+    logging.info(f"Suggest index built with {len(suggest_index)} books.")
+
+
+async def refresh_suggest_index():
+    """Rebuild periodically so writes handled by other worker processes show up."""
+    while True:
+        await asyncio.sleep(REBUILD_INTERVAL)
+        try:
+            await rebuild_suggest_index()
+        except Error as e:
+            logging.error(f"Could not rebuild the suggest index: '{e}'")
@@ -1,131 +1,205 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from typing import List
+from typing import List, Optional
 from app.database import db_connect
 from app.auth.auth_routes import get_current_user
-from mysql.connector import Error
-from app.schemas.schemas import CartItem  # Importing the CartItem schema
+from mysql.connector import Error, errors, errorcode
+from app.schemas.schemas import CartItem, CartItemKey, CartBulkRequest  # Importing the cart schemas
+from app.books.catalog_cache import catalog_cache
+from app.utils.pagination import page_clause, split_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.responses import FastJSONResponse, format_rows, RESULT_FORMATS
 
 router = APIRouter()
 
+# One statement per mutation: the (user_id, barcode) unique key turns a repeated add into an update
+ADD_ITEM_QUERY = """
+    INSERT INTO cart (user_id, barcode, quantity) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)
+"""
+SET_ITEM_QUERY = """
+    INSERT INTO cart (user_id, barcode, quantity) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
+"""
+MODIFY_ITEM_QUERY = "UPDATE cart SET quantity = %s WHERE user_id = %s AND barcode = %s"
+DELETE_ITEM_QUERY = "DELETE FROM cart WHERE user_id = %s AND barcode = %s"
+
+def is_unknown_book(err: Error) -> bool:
+    """A foreign key failure on cart.barcode, i.e. the book does not exist."""
+    return isinstance(err, errors.IntegrityError) and err.errno == errorcode.ER_NO_REFERENCED_ROW_2
+
 @router.post("/add")
-def add_to_cart(
+async def add_to_cart(
     item: CartItem,
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Add an item to the user's cart.
+    Add an item to the user's cart. Adding a book that is already in the cart increases its quantity.
     """
     user_id = current_user["id"]
-
-    query = "INSERT INTO cart (user_id, barcode, quantity) VALUES (%s, %s, %s)"
     params = (user_id, item.barcode, item.quantity)
 
     try:
-        db_connect.execute_query(query, params)
+        await db_connect.execute_query_async(ADD_ITEM_QUERY, params)
         return {"message": "Item added to cart successfully."}
     except Error as db_err:
+        if is_unknown_book(db_err):
+            raise HTTPException(status_code=404, detail="Book not found.")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(db_err)}")
+
+@router.post("/bulk")
+async def bulk_update_cart(request: CartBulkRequest, current_user: dict = Depends(get_current_user)):
+    """
+    Add (or, with 'replace', set) many cart items in one request and one transaction.
+    Either every item is written or none is.
+    """
+    user_id = current_user["id"]
+
+    # Merge repeated barcodes so each cart row is written once
+    quantities = {}
+    for item in request.items:
+        if request.replace:
+            quantities[item.barcode] = item.quantity
+        else:
+            quantities[item.barcode] = quantities.get(item.barcode, 0) + item.quantity
+
+    try:
+        # Reject unknown books up front, from the catalog cache when it is warm
+        books = await catalog_cache.get_books(quantities)
+        unknown = [barcode for barcode in quantities if barcode not in books]
+        if unknown:
+            raise HTTPException(status_code=404, detail=f"Books not found: {', '.join(unknown)}")
+
+        async with db_connect.transaction() as tx:
+            await tx.executemany(
+                SET_ITEM_QUERY if request.replace else ADD_ITEM_QUERY,
+                [(user_id, barcode, quantity) for barcode, quantity in quantities.items()]
+            )
+        return {"message": "Cart updated successfully.", "items": len(quantities)}
+
+    except HTTPException as http_err:
+        raise http_err
+    except Error as db_err:
+        if is_unknown_book(db_err):
+            raise HTTPException(status_code=404, detail="Book not found.")
         raise HTTPException(status_code=500, detail=f"Database error: {str(db_err)}")
 
 @router.post("/modify")
-def modify_cart(cart_item: CartItem, current_user: dict = Depends(get_current_user)):
+async def modify_cart(cart_item: CartItem, current_user: dict = Depends(get_current_user)):
     """
     Modify the quantity of a cart item.
     """
     user_id = current_user["id"]
 
-    # Step 1: Update the cart with the new quantity
     try:
-        # Check if the item exists in the cart
-        check_query = """
-        SELECT quantity FROM cart
-        WHERE user_id = %s AND barcode = %s
-        """
-        check_params = (user_id, cart_item.barcode)
-        result = db_connect.execute_query(check_query, check_params)
-        existing_item = result.get("data", [])
+        # A single update; matching no row means the item is not in the cart
+        update_params = (cart_item.quantity, user_id, cart_item.barcode)
+        result = await db_connect.execute_query_async(MODIFY_ITEM_QUERY, update_params)
 
-        if not existing_item:
+        if result["rowcount"] == 0:
             raise HTTPException(status_code=404, detail="Item not found in the cart.")
 
-        # Step 2: Update the cart quantity
-        update_query = """
-        UPDATE cart
-        SET quantity = %s
-        WHERE user_id = %s AND barcode = %s
-        """
-        update_params = (cart_item.quantity, user_id, cart_item.barcode)
-        db_connect.execute_query(update_query, update_params)
-
-        # Step 3: Fetch the updated cart to return
-        return view_cart(current_user)  # Reuse the view_cart function to get the updated cart
+        return {
+            "message": "Cart item updated successfully.",
+            "barcode": cart_item.barcode,
+            "quantity": cart_item.quantity
+        }
 
+    except HTTPException as http_err:
+        raise http_err
     except Error as db_err:
         raise HTTPException(status_code=500, detail=f"Database error: {str(db_err)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
     
 @router.delete("/delete")
-def delete_cart_item(cart_item: CartItem, current_user: dict = Depends(get_current_user)):
+async def delete_cart_item(cart_item: CartItemKey, current_user: dict = Depends(get_current_user)):
     """
     Delete an item from the cart.
     """
     user_id = current_user["id"]
     
     try:
-        # Step 1: Check if the item exists in the cart
-        check_query = """
-        SELECT * FROM cart
-        WHERE user_id = %s AND barcode = %s
-        """
-        check_params = (user_id, cart_item.barcode)
-        result = db_connect.execute_query(check_query, check_params)
-        existing_item = result.get("data", [])
+        # A single delete; removing no row means the item was not in the cart
+        delete_params = (user_id, cart_item.barcode)
+        result = await db_connect.execute_query_async(DELETE_ITEM_QUERY, delete_params)
 
-        if not existing_item:
+        if result["rowcount"] == 0:
             raise HTTPException(status_code=404, detail="Item not found in the cart.")
 
-        # Step 2: Delete the item from the cart
-        delete_query = """
-        DELETE FROM cart
-        WHERE user_id = %s AND barcode = %s
-        """
-        delete_params = (user_id, cart_item.barcode)
-        db_connect.execute_query(delete_query, delete_params)
-
         return {"message": "Item deleted successfully from the cart."}
 
+    except HTTPException as http_err:
+        raise http_err
     except Error as db_err:
         raise HTTPException(status_code=500, detail=f"Database error: {str(db_err)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
-    
-from fastapi import HTTPException, Query, Depends
+
+# Fields of the rows returned by load_cart
+CART_FIELDS = ["barcode", "title", "quantity", "price", "total_price"]
+USER_ID_QUERY = db_connect.read("SELECT id FROM users WHERE username = %s")
 
 @router.get("/view")
-def view_cart(
+async def view_cart(
     current_user: dict = Depends(get_current_user),
-    username_param: str = Query(None, description="Username to view cart for. Required for admin.")
+    username_param: str = Query(None, description="Username to view cart for. Required for admin."),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of cart items per page."),
+    cursor: str = Query(None, description="Opaque cursor taken from the previous page's 'next_cursor'."),
+    result_format: str = Query("records", alias="format", regex=RESULT_FORMATS,
+                               description="'records' (one object per item) or 'columnar' (column names once, row arrays).")
 ):
     """
-    View items in the user's cart. Admins can view all users' carts if no username is provided.
+    View items in the user's cart, one page at a time. Admins can view all users' carts if no username is provided.
     """
-    user_id = current_user["id"]
-    is_admin = current_user["usertype"] == "admin"
-
-    # If admin but no username_param is provided, return all carts
-    if is_admin and username_param is None:       
+    cart_items, next_cursor = await load_cart(current_user, username_param, limit, cursor)
+    return FastJSONResponse({
+        "message": "Cart retrieved successfully.",
+        "cart_items": format_rows(CART_FIELDS, cart_items, result_format),
+        "next_cursor": next_cursor
+    })
+
+def cart_page_query(user_id: Optional[int], cursor: Optional[str], limit: int):
+    """
+    SQL and parameters for one page of cart rows (cart_id, barcode, quantity, ...) by cart_id.
+    user_id None reads every user's cart, with the owner's username.
+    """
+    if user_id is None:
         query = """
-        SELECT c.barcode, c.quantity, b.name AS title, b.price, u.username 
+        SELECT c.cart_id, c.barcode, c.quantity, u.username 
         FROM cart c
-        JOIN books b ON c.barcode = b.barcode
         JOIN users u ON c.user_id = u.id
         """
-        params = ()  # No specific user filter for admin
-        
+        where_clauses, params = [], []
+    else:
+        query = """
+        SELECT c.cart_id, c.barcode, c.quantity 
+        FROM cart c
+        """
+        where_clauses, params = ["c.user_id = %s"], [user_id]
+
+    # Page through cart rows by their primary key
+    predicate, page_params, order_and_limit, limit_params = page_clause(["c.cart_id"], cursor, limit)
+    if predicate:
+        where_clauses.append(predicate)
+        params.extend(page_params)
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+    return query + order_and_limit, tuple(params + limit_params)
+
+async def load_cart(current_user: dict, username_param: str, limit: int, cursor: str):
+    """
+    Read one page of cart items as (barcode, title, quantity, price, total_price) rows.
+    Returns (rows, next_cursor).
+    """
+    user_id = current_user["id"]
+    is_admin = current_user["usertype"] == "admin"
+
+    # If admin but no username_param is provided, return all carts
+    if is_admin and username_param is None:
+        user_id = None  # No specific user filter for admin
+
     elif is_admin and username_param:
         # If admin provided a username, fetch the user ID
-        user_id_query = "SELECT id FROM users WHERE username = %s;"
-        user_id_result = db_connect.execute_query(user_id_query, (username_param,))
+        user_id_result = await db_connect.execute_statement(USER_ID_QUERY, (username_param,))
         user_id_data = user_id_result["data"]
 
         if not user_id_data:
@@ -133,45 +207,24 @@ def view_cart(
 
         user_id = user_id_data[0][0]  # Get the user ID from the result
 
-        # Query to get cart items for the specified user
-        query = """
-        SELECT c.barcode, c.quantity, b.name AS title, b.price 
-        FROM cart c
-        JOIN books b ON c.barcode = b.barcode
-        WHERE c.user_id = %s
-        """
-        params = (user_id,)
-    else:
-        # If not admin, retrieve only the current user's cart
-        query = """
-        SELECT c.barcode, c.quantity, b.name AS title, b.price 
-        FROM cart c
-        JOIN books b ON c.barcode = b.barcode
-        WHERE c.user_id = %s
-        """
-        params = (user_id,)
+    query, params = cart_page_query(user_id, cursor, limit)
 
     try:
-        result = db_connect.execute_query(query, params)
-        cart_items = result.get("data", [])
-        columns = result.get("columns", [])
+        # Four texts (own or all carts x first or later page), each prepared once per connection
+        result = await db_connect.execute_statement(db_connect.read(query), params)
+        cart_items, next_cursor = split_page(result.get("data", []), limit, key=lambda row: (row[0],))
 
-        # Prepare formatted data with book details and calculate final prices
+        # Book titles and prices come from the catalog cache rather than a join on every view
+        books = await catalog_cache.get_books(row[1] for row in cart_items)
+
+        # Prepare rows with book details and calculate final prices
         formatted_cart_items = []
-        for row in cart_items:
-            item_data = dict(zip(columns, row))
-            total_price = item_data['price'] * item_data['quantity']
-            formatted_cart_items.append({
-                "barcode": item_data['barcode'],
-                "title": item_data['title'],
-                "quantity": item_data['quantity'],
-                "price": item_data['price'],
-                "total_price": total_price
-            })
+        for _, barcode, quantity, *_ in cart_items:
+            book = books.get(barcode)
+            if book is None:
+                continue
+            formatted_cart_items.append((barcode, book[1], quantity, book[3], book[3] * quantity))
 
-        return {
-            "message": "Cart retrieved successfully.",
-            "cart_items": formatted_cart_items
-        }
+        return formatted_cart_items, next_cursor
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
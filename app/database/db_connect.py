@@ -1,15 +1,42 @@
-from mysql.connector import Error, pooling
+from mysql.connector import Error, errors, pooling
+from mysql.connector.constants import ClientFlag
+from app.database.pool import AsyncConnectionPool
+from contextlib import asynccontextmanager, contextmanager
 from dotenv import load_dotenv
+from typing import NamedTuple
+import asyncio
 import os
+import threading
 import time  # For implementing the retry mechanism
 import logging  # Optional for logging errors
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Pool sizing, tune these from the figures reported by pool_stats()
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "5"))  # Temporary connections during bursts
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # Seconds a request may queue for a connection
+DB_POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "1800"))  # Replace connections older than this
+DB_POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", "30"))  # Ping connections idle longer than this
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "64"))  # Prepared statements kept per connection, 0 disables
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
+# Connection settings shared by the sync and async pools
+def get_connection_config():
+    return {
+        "host": os.getenv("DB_HOST"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+        "database": os.getenv("DB_NAME"),
+        "port": int(os.getenv("DB_PORT")),  # Accepting port number from the environment
+        # UPDATE row counts report matched rows, so "not found" can be told apart from "already set".
+        # An integer mask: the aio connector does not accept the list form the sync one does.
+        "client_flags": ClientFlag.get_default() | ClientFlag.FOUND_ROWS,
+    }
+
 # Create a connection pool with retries for failures
 def create_connection_pool():
     max_retries = 5  # Max attempts to establish connection pool
@@ -18,12 +45,8 @@ def create_connection_pool():
         try:
             pool = pooling.MySQLConnectionPool(
                 pool_name="mypool",
-                pool_size=5,  # Set the desired pool size
-                host=os.getenv("DB_HOST"),
-                user=os.getenv("DB_USER"),
-                password=os.getenv("DB_PASSWORD"),
-                database=os.getenv("DB_NAME"),
-                port=int(os.getenv("DB_PORT")),  # Accepting port number from the environment
+                pool_size=min(DB_POOL_SIZE, pooling.CNX_POOL_MAXSIZE),
+                **get_connection_config(),
             )
             logging.info("Database connection pool created successfully.")
             return pool  # Return the connection pool
@@ -34,8 +57,16 @@ def create_connection_pool():
             time.sleep(wait_time)
     raise RuntimeError("Failed to establish connection pool after multiple attempts.")
 
-# Initialize the pool at module load
-pool = create_connection_pool()
+# The sync pool only serves blocking code (scripts, thread pools), so it is created on first use
+pool = None
+_pool_lock = threading.Lock()
+
+def get_sync_pool():
+    global pool
+    with _pool_lock:
+        if pool is None:
+            pool = create_connection_pool()
+    return pool
 
 def get_column_descriptions(cursor):
     """Retrieve column descriptions from the executed query."""
@@ -49,19 +80,14 @@ def execute_query(query: str, params=None):
     cursor = None
     try:
         # Get a connection from the pool
-        connection = pool.get_connection()
+        connection = get_sync_pool().get_connection()
         cursor = connection.cursor()
 
         # Execute the query with parameters if provided
         cursor.execute(query, params)
 
-        # Check if the query modifies data (INSERT, UPDATE, DELETE)
-        if query.strip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
-            connection.commit()  # Commit the changes
-            return {"status": "success"}  # Indicate success for non-SELECT queries
-
-        # Fetch results for SELECT queries
-        if cursor.description:  # Check if the cursor has results
+        # Statements returning rows have a description; whatever the SQL starts with
+        if cursor.description:
             result = cursor.fetchall()
             column_names = get_column_descriptions(cursor)
             return {
@@ -69,7 +95,8 @@ def execute_query(query: str, params=None):
                 "columns": column_names
             }  # Return both result and column names
 
-        return None  # Return None if no results are found
+        connection.commit()  # Commit the changes
+        return {"status": "success", "rowcount": cursor.rowcount, "lastrowid": cursor.lastrowid}
 
     except Error as e:
         logging.error(f"Database error: '{e}' occurred")
@@ -80,3 +107,375 @@ def execute_query(query: str, params=None):
             cursor.close()  # Close the cursor
         if connection:
             connection.close()  # Return connection to the pool
+
+
+# The async pool is bound to the running event loop, so it is created on first use
+async_pool = None
+
+def get_async_pool():
+    global async_pool
+    if async_pool is None:
+        async_pool = AsyncConnectionPool(
+            size=DB_POOL_SIZE,
+            max_overflow=DB_POOL_MAX_OVERFLOW,
+            timeout=DB_POOL_TIMEOUT,
+            recycle=DB_POOL_RECYCLE,
+            ping_interval=DB_POOL_PING_INTERVAL,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+            **get_connection_config(),
+        )
+        logging.info("Async database connection pool created successfully.")
+    return async_pool
+
+async def close_async_pool():
+    global async_pool
+    if async_pool is not None:
+        await async_pool.close()
+        async_pool = None
+
+def pool_stats():
+    """Checkout wait times, in-use counts and exhaustion events of the async pool."""
+    if async_pool is None:
+        return {}
+    return async_pool.snapshot()
+
+async def execute_query_async(query: str, params=None):
+    """Execute a SQL query on a connection from the async pool without blocking the event loop."""
+    pool = get_async_pool()
+    pooled = await pool.acquire()
+    connection = pooled.connection
+    cursor = None
+    broken = False
+    try:
+        cursor = await connection.cursor()
+
+        # Execute the query with parameters if provided
+        await cursor.execute(query, params)
+
+        # Statements returning rows have a description; whatever the SQL starts with
+        if cursor.description:
+            result = await cursor.fetchall()
+            column_names = get_column_descriptions(cursor)
+            return {
+                "data": result,
+                "columns": column_names
+            }  # Return both result and column names
+
+        # The pool's connections autocommit, so a write is already durable here
+        return {"status": "success", "rowcount": cursor.rowcount, "lastrowid": cursor.lastrowid}
+
+    except Error as e:
+        # Only connection-level failures make the connection unusable
+        broken = isinstance(e, (errors.InterfaceError, errors.OperationalError))
+        logging.error(f"Database error: '{e}' occurred")
+        raise  # Reraise the exception for higher-level handling
+
+    except BaseException:
+        broken = True  # Cancelled mid-query, the connection state is unknown
+        raise
+
+    finally:
+        if cursor and not broken:
+            await cursor.close()  # Close the cursor
+        await pool.release(pooled, discard=broken)  # Return connection to the pool
+
+READ = "read"  # Returns rows and column names
+WRITE = "write"  # Returns the affected row count and last insert id
+
+
+class Statement(NamedTuple):
+    """
+    A statement declared once, at module level, and run with execute_statement().
+    The kind says how to read the outcome, so the SQL text is never inspected.
+    """
+    sql: str
+    kind: str = READ
+
+
+def read(sql: str) -> Statement:
+    return Statement(sql, READ)
+
+
+def write(sql: str) -> Statement:
+    return Statement(sql, WRITE)
+
+
+async def execute_statement(statement: Statement, params=None):
+    """
+    Execute a declared statement as a server-side prepared statement cached on the pooled
+    connection: the server parses it once per connection and later calls send only parameters,
+    in one round trip (see pool.StatementCursor).
+    Results have the same shape as execute_query_async().
+    """
+    pool = get_async_pool()
+    pooled = await pool.acquire()
+    cursor = None
+    broken = False
+    try:
+        if pool.statement_cache_size > 0:
+            sql, cursor = await pool.prepared(pooled, statement.sql)
+        else:
+            sql, cursor = statement.sql, await pooled.connection.cursor()
+        await cursor.execute(sql, params)
+
+        if statement.kind == READ:
+            result = await cursor.fetchall()
+            return {"data": result, "columns": get_column_descriptions(cursor)}
+        return {"status": "success", "rowcount": cursor.rowcount, "lastrowid": cursor.lastrowid}
+
+    except Error as e:
+        broken = isinstance(e, (errors.InterfaceError, errors.OperationalError))
+        logging.error(f"Database error: '{e}' occurred")
+        raise
+
+    except BaseException:
+        broken = True  # Cancelled mid-query, the connection state is unknown
+        raise
+
+    finally:
+        if cursor and not broken and pool.statement_cache_size <= 0:
+            await cursor.close()  # Prepared cursors stay open in the connection's cache
+        await pool.release(pooled, discard=broken)
+
+async def stream_query(query: str, params=None, chunk_size: int = 1000):
+    """
+    Yield (column_names, rows) chunks of a SELECT from an unbuffered cursor.
+    Rows are read from the server as the consumer asks for them, so memory stays flat
+    regardless of the result size. The pooled connection is held until the stream ends.
+    """
+    pool = get_async_pool()
+    pooled = await pool.acquire()
+    cursor = None
+    finished = False
+    try:
+        cursor = await pooled.connection.cursor(buffered=False)
+        await cursor.execute(query, params)
+        column_names = get_column_descriptions(cursor)
+        while True:
+            rows = await cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield column_names, rows
+        finished = True
+
+    except Error as e:
+        logging.error(f"Database error: '{e}' occurred")
+        raise
+
+    finally:
+        if cursor and finished:
+            await cursor.close()
+        # A stream abandoned midway leaves unread rows on the connection, so it is not reused
+        await pool.release(pooled, discard=not finished)
+
+
+def _savepoint_name(name: str) -> str:
+    # Savepoint names are identifiers, they cannot be sent as parameters
+    if not name.isidentifier():
+        raise ValueError(f"Invalid savepoint name: {name!r}")
+    return name
+
+
+class AsyncTransaction:
+    """Runs several statements on one pooled connection inside a single transaction."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0  # Rows affected (or returned) by the last statement
+        self.rows_affected = 0  # Rows changed by every write in the block so far
+
+    async def execute(self, query: str, params=None):
+        """Execute a statement; returns rows and columns for reads, or the affected row count for writes."""
+        cursor = await self.connection.cursor()
+        try:
+            await cursor.execute(query, params)
+            if cursor.description:
+                result = await cursor.fetchall()
+                self.rowcount = len(result)
+                return {"data": result, "columns": get_column_descriptions(cursor)}
+            self._count(cursor.rowcount)
+            return {"status": "success", "rowcount": cursor.rowcount, "lastrowid": cursor.lastrowid}
+        finally:
+            await cursor.close()
+
+    async def executemany(self, query: str, seq_params):
+        """Execute a write for every parameter set; INSERTs are sent as one multi-row statement."""
+        cursor = await self.connection.cursor()
+        try:
+            await cursor.executemany(query, seq_params)
+            self._count(cursor.rowcount)
+            return {"status": "success", "rowcount": cursor.rowcount}
+        finally:
+            await cursor.close()
+
+    @asynccontextmanager
+    async def savepoint(self, name: str):
+        """
+        Run part of the block under a savepoint. An exception inside it undoes only the
+        statements since the savepoint and is re-raised; the caller may catch it and go on.
+        """
+        name = _savepoint_name(name)
+        rows_affected = self.rows_affected
+        await self._run(f"SAVEPOINT {name}")
+        try:
+            yield self
+        except BaseException as e:
+            if not isinstance(e, (errors.InterfaceError, errors.OperationalError, asyncio.CancelledError)):
+                await self._run(f"ROLLBACK TO SAVEPOINT {name}")
+                self.rows_affected = rows_affected
+            raise
+        await self._run(f"RELEASE SAVEPOINT {name}")
+
+    async def _run(self, query: str):
+        # Savepoint bookkeeping, kept out of the row counts
+        cursor = await self.connection.cursor()
+        try:
+            await cursor.execute(query)
+        finally:
+            await cursor.close()
+
+    def _count(self, rowcount: int):
+        self.rowcount = rowcount
+        if rowcount > 0:
+            self.rows_affected += rowcount
+
+
+@asynccontextmanager
+async def transaction():
+    """
+    Hold one pooled connection for the block and commit once at the end.
+    Any exception raised inside the block rolls the whole transaction back;
+    tx.savepoint() narrows that to part of the block.
+    """
+    pool = get_async_pool()
+    pooled = await pool.acquire()
+    connection = pooled.connection
+    broken = False
+    try:
+        cursor = await connection.cursor()
+        await cursor.execute("START TRANSACTION")
+        await cursor.close()
+
+        yield AsyncTransaction(connection)
+
+        await connection.commit()
+
+    except BaseException as e:
+        # Connection-level failures and cancellation leave the connection unusable
+        broken = isinstance(e, (errors.InterfaceError, errors.OperationalError, asyncio.CancelledError))
+        if not broken:
+            try:
+                await connection.rollback()
+            except Error:
+                broken = True
+        if isinstance(e, Error):
+            logging.error(f"Database error: '{e}' occurred, transaction rolled back")
+        raise
+
+    finally:
+        await pool.release(pooled, discard=broken)
+
+
+@asynccontextmanager
+async def session():
+    """
+    Hold one pooled connection for the block without opening a transaction.
+    Each statement commits on its own; for DDL and connection-scoped state such as GET_LOCK.
+    """
+    pool = get_async_pool()
+    pooled = await pool.acquire()
+    broken = False
+    try:
+        yield AsyncTransaction(pooled.connection)
+    except BaseException as e:
+        broken = isinstance(e, (errors.InterfaceError, errors.OperationalError, asyncio.CancelledError))
+        raise
+    finally:
+        await pool.release(pooled, discard=broken)
+
+
+class Transaction:
+    """The blocking counterpart of AsyncTransaction, on a connection from the sync pool."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0  # Rows affected (or returned) by the last statement
+        self.rows_affected = 0  # Rows changed by every write in the block so far
+
+    def execute(self, query: str, params=None):
+        """Execute a statement; returns rows and columns for reads, or the affected row count for writes."""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(query, params)
+            if cursor.description:
+                result = cursor.fetchall()
+                self.rowcount = len(result)
+                return {"data": result, "columns": get_column_descriptions(cursor)}
+            self._count(cursor.rowcount)
+            return {"status": "success", "rowcount": cursor.rowcount, "lastrowid": cursor.lastrowid}
+        finally:
+            cursor.close()
+
+    def executemany(self, query: str, seq_params):
+        """Execute a write for every parameter set; INSERTs are sent as one multi-row statement."""
+        cursor = self.connection.cursor()
+        try:
+            cursor.executemany(query, seq_params)
+            self._count(cursor.rowcount)
+            return {"status": "success", "rowcount": cursor.rowcount}
+        finally:
+            cursor.close()
+
+    @contextmanager
+    def savepoint(self, name: str):
+        """Run part of the block under a savepoint, as AsyncTransaction.savepoint does."""
+        name = _savepoint_name(name)
+        rows_affected = self.rows_affected
+        self._run(f"SAVEPOINT {name}")
+        try:
+            yield self
+        except BaseException as e:
+            if not isinstance(e, (errors.InterfaceError, errors.OperationalError)):
+                self._run(f"ROLLBACK TO SAVEPOINT {name}")
+                self.rows_affected = rows_affected
+            raise
+        self._run(f"RELEASE SAVEPOINT {name}")
+
+    def _run(self, query: str):
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(query)
+        finally:
+            cursor.close()
+
+    def _count(self, rowcount: int):
+        self.rowcount = rowcount
+        if rowcount > 0:
+            self.rows_affected += rowcount
+
+
+@contextmanager
+def sync_transaction():
+    """
+    transaction() for blocking code (scripts, thread pools): one connection from the sync
+    pool for the block, committed once at the end and rolled back on any exception.
+    """
+    connection = get_sync_pool().get_connection()
+    try:
+        connection.start_transaction()
+
+        yield Transaction(connection)
+
+        connection.commit()
+
+    except BaseException as e:
+        try:
+            connection.rollback()
+        except Error:
+            pass  # The connection is gone; the server rolls back on disconnect
+        if isinstance(e, Error):
+            logging.error(f"Database error: '{e}' occurred, transaction rolled back")
+        raise
+
+    finally:
+        connection.close()  # Return connection to the pool
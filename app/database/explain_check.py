@@ -0,0 +1,156 @@
+"""
+Run EXPLAIN on the queries the routers issue and fail on full scans of large tables.
+
+    python -m app.database.explain_check [--min-rows 1000]
+
+Run it against a database with production-like data after changing queries or indexes;
+it exits with status 1 when a query scans a whole table estimated at --min-rows or more.
+"""
+from app.database import db_connect
+from app.auth import auth_routes
+from app.books import bookscontroller, catalog_cache
+from app.cart import cartcontroller
+from app.orders import ordermanagement
+from app.search import fulltext, searchcontroller
+from app.search.schema_registry import TABLES, compile_keyword, select_fields
+from app.users import user_routes
+from app.utils import export
+from app.utils.pagination import DEFAULT_PAGE_SIZE, encode_cursor
+from datetime import datetime
+from typing import NamedTuple, Tuple
+import argparse
+import asyncio
+import sys
+
+
+class CheckedQuery(NamedTuple):
+    name: str
+    query: str
+    params: Tuple = ()
+    full_scan_ok: bool = False  # Reads the whole table by design (totals)
+
+
+def search_query(name: str, text: str, cursor=None) -> CheckedQuery:
+    """A full-text search page, built by the search router's own query builder."""
+    match_query = fulltext.boolean_query(text)
+    query, params, _ = searchcontroller.build_search_query(
+        "books", select_fields("books", "barcode,name") + ["relevance"], [fulltext.BOOKS_MATCH], [match_query],
+        ["relevance", "barcode"], cursor, DEFAULT_PAGE_SIZE, True, match_query
+    )
+    return CheckedQuery(name, query, params)
+
+
+def keyword_query(name: str, table: str, keyword: str) -> CheckedQuery:
+    """A keyword search page on one table, compiled the way the search router compiles it."""
+    clause, params = compile_keyword(table, keyword)
+    primary_key = TABLES[table]["primary_key"]
+    query, params, _ = searchcontroller.build_search_query(
+        table, [primary_key], [clause], params, [primary_key], None, DEFAULT_PAGE_SIZE, False
+    )
+    return CheckedQuery(name, query, params)
+
+
+def sort_query(name: str, table: str, column: str, cursor=None) -> CheckedQuery:
+    """A search page ordered by one sortable column, with the primary key as tie-breaker."""
+    primary_key = TABLES[table]["primary_key"]
+    query, params, _ = searchcontroller.build_search_query(
+        table, [primary_key], [], [], [column, primary_key], cursor, DEFAULT_PAGE_SIZE, False
+    )
+    return CheckedQuery(name, query, params)
+
+
+def page_query(name: str, built) -> CheckedQuery:
+    query, params = built[:2]
+    return CheckedQuery(name, query, params)
+
+
+LATER_PAGE = encode_cursor([datetime(2024, 1, 1), 1])
+
+# The routers' own statements and query builders, with representative parameters
+QUERIES = [
+    CheckedQuery("auth: login", auth_routes.LOGIN_QUERY.sql, ("user1",)),
+    CheckedQuery("auth: load principal", auth_routes.USER_BY_ID_QUERY.sql, (1,)),
+    page_query("books: catalog page", catalog_cache.page_query(None, DEFAULT_PAGE_SIZE)),
+    page_query("books: catalog later page", catalog_cache.page_query(encode_cursor(["1"]), DEFAULT_PAGE_SIZE)),
+    CheckedQuery("books: catalog changes", catalog_cache.CHANGES_QUERY.sql, (1, 2, 5001)),
+    CheckedQuery("books: by barcode", catalog_cache.BOOK_QUERY.sql, ("1",)),
+    CheckedQuery("books: lookup", catalog_cache.books_query(2), ("1", "2")),
+    CheckedQuery("books: modify ownership", bookscontroller.LOCK_BOOK_QUERY, ("1",)),
+    CheckedQuery("books: added by user", user_routes.OWN_BOOKS_QUERY, ("user1",)),
+    search_query("search: full-text", "harry"),
+    search_query("search: full-text, later page", "harry", encode_cursor([1.5, "1"])),
+    page_query("orders: user page", ordermanagement.orders_page_query(["order_id"], 1, None, DEFAULT_PAGE_SIZE)),
+    page_query("orders: user later page", ordermanagement.orders_page_query(["order_id"], 1, LATER_PAGE, DEFAULT_PAGE_SIZE)),
+    page_query("orders: admin page", ordermanagement.orders_page_query(["order_id"], None, None, DEFAULT_PAGE_SIZE)),
+    CheckedQuery("orders: recent with names", user_routes.RECENT_ORDERS_QUERY, (10,)),
+    CheckedQuery("orders: own with names", user_routes.OWN_ORDERS_QUERY, (1,)),
+    CheckedQuery("orders: totals by status", user_routes.ORDER_TOTALS_QUERY, full_scan_ok=True),
+    keyword_query("search: orders by status", "orders", "status:Order Placed"),
+    keyword_query("search: books by owner", "books", "added_by:user1"),
+    keyword_query("search: users by username prefix", "users", "username:user*"),
+    page_query("orders: export", export.export_chunk_query(ordermanagement.EXPORT_SELECT, ["user_id = %s"], [1], ["order_id"])),
+    page_query("orders: export, later chunk",
+               export.export_chunk_query(ordermanagement.EXPORT_SELECT, ["user_id = %s"], [1], ["order_id"], [1000])),
+    page_query("orders: export all", export.export_chunk_query(ordermanagement.EXPORT_SELECT, [], [], ["order_id"], [1000])),
+    page_query("books: export", export.export_chunk_query(bookscontroller.EXPORT_SELECT, [], [], ["barcode"], ["1"])),
+    page_query("cart: page", cartcontroller.cart_page_query(1, None, DEFAULT_PAGE_SIZE)),
+    CheckedQuery("cart: modify", cartcontroller.MODIFY_ITEM_QUERY, (2, 1, "1")),
+    CheckedQuery("cart: delete", cartcontroller.DELETE_ITEM_QUERY, (1, "1")),
+    CheckedQuery("cart: checkout", ordermanagement.CART_LINES_QUERY, (1,)),
+    page_query("cart: admin page", cartcontroller.cart_page_query(None, None, DEFAULT_PAGE_SIZE)),
+    page_query("cart: admin later page", cartcontroller.cart_page_query(None, encode_cursor([1]), DEFAULT_PAGE_SIZE)),
+    CheckedQuery("orders: place, decrement stock", ordermanagement.ORDER_STOCK_QUERY, (1, "1", 1)),
+    CheckedQuery("orders: place, book exists", ordermanagement.BOOK_EXISTS_QUERY, ("1",)),
+    CheckedQuery("orders: place, insert priced", ordermanagement.ORDER_INSERT_QUERY,
+                 (1, "2024-01-01 00:00:00", "t", 1, "Order Placed", 1, "1")),
+    CheckedQuery("orders: place, stock left", ordermanagement.STOCK_QUERY, ("1",)),
+    CheckedQuery("orders: checkout, update stock", ordermanagement.CHECKOUT_STOCK_QUERY, (1,)),
+    CheckedQuery("orders: checkout, clear cart", ordermanagement.CLEAR_CART_QUERY, (1,)),
+    page_query("orders: admin later page", ordermanagement.orders_page_query(["order_id"], None, LATER_PAGE, DEFAULT_PAGE_SIZE)),
+    CheckedQuery("users: own details", user_routes.OWN_USER_QUERY, ("user1",)),
+    CheckedQuery("users: update, lock by username", user_routes.LOCK_USER_QUERY, ("user1",)),
+    page_query("users: admin page", user_routes.users_page_query(None, DEFAULT_PAGE_SIZE)),
+    page_query("users: admin later page", user_routes.users_page_query(encode_cursor([1]), DEFAULT_PAGE_SIZE)),
+    sort_query("search: books sorted by price, later page", "books", "price", encode_cursor([20, "1"])),
+] + [
+    # Every column the search route lets a caller sort by
+    sort_query(f"search: {table} sorted by {column}", table, column)
+    for table, schema in TABLES.items() for column in schema["sortable"]
+]
+
+
+async def explain(checked: CheckedQuery) -> list:
+    result = await db_connect.execute_query_async("EXPLAIN " + checked.query, checked.params or None)
+    return [dict(zip(result["columns"], row)) for row in result["data"]]
+
+
+async def check(min_rows: int) -> int:
+    """Print one line per query and return the number of offending ones."""
+    failures = 0
+    try:
+        for checked in QUERIES:
+            scans = [
+                row for row in await explain(checked)
+                if row.get("type") == "ALL" and (row.get("rows") or 0) >= min_rows
+            ]
+            if scans and not checked.full_scan_ok:
+                failures += 1
+                tables = ", ".join(f"{row['table']} (~{row['rows']} rows)" for row in scans)
+                print(f"FAIL  {checked.name}: full scan of {tables}")
+            else:
+                print(f"ok    {checked.name}")
+    finally:
+        await db_connect.close_async_pool()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN the application's queries and flag full table scans.")
+    parser.add_argument("--min-rows", type=int, default=1000, help="Ignore scans of tables estimated below this size.")
+    args = parser.parse_args()
+    failures = asyncio.run(check(args.min_rows))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
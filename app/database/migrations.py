@@ -0,0 +1,221 @@
+"""
+Versioned schema migrations.
+
+Applied at startup (DB_MIGRATE_ON_STARTUP) or from the command line:
+
+    python -m app.database.migrations           # apply pending migrations
+    python -m app.database.migrations status    # list applied and pending versions
+
+A change that alters the schema appends its migration here, and updates setup_db.sql and
+app/search/schema_registry.py, in the same commit. Versions are never renumbered or edited
+once released; the first ones below catch up on schema changes made before this module existed.
+"""
+from app.database import db_connect
+from mysql.connector import Error, errorcode
+from typing import List, NamedTuple, Tuple, Union
+import argparse
+import asyncio
+import logging
+import os
+
+MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "true").lower() == "true"
+LOCK_TIMEOUT = 60  # Seconds a worker waits while another one migrates
+
+# Errors meaning the change is already in place, e.g. on a database created from the current setup_db.sql
+ALREADY_APPLIED = {
+    errorcode.ER_TABLE_EXISTS_ERROR,
+    errorcode.ER_DUP_FIELDNAME,
+    errorcode.ER_DUP_KEYNAME,
+}
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    statements: List[Union[str, Tuple[str, ...]]]  # A tuple of statements runs as one transaction
+
+
+MIGRATIONS = [
+    # Maintained facet counters for faceted book search, and the version row behind the catalog cache
+    Migration(1, "catalog_support_tables", [
+        """
+        CREATE TABLE book_facets (
+            facet VARCHAR(20),
+            bucket VARCHAR(100),
+            book_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (facet, bucket)
+        )
+        """,
+        """
+        CREATE TABLE catalog_versions (
+            name VARCHAR(50) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "INSERT IGNORE INTO catalog_versions (name, version) VALUES ('books', 0)",
+    ]),
+    # Self-contained JWTs carry the version; bumping it revokes every token of the user
+    Migration(2, "users_token_version", [
+        "ALTER TABLE users ADD COLUMN token_version INT NOT NULL DEFAULT 0",
+    ]),
+    # Full-text book search with relevance ranking
+    Migration(3, "books_fulltext", [
+        "ALTER TABLE books ADD FULLTEXT KEY ft_books_name_author (name, author)",
+    ]),
+    # Profile "added books" and the modify/import ownership checks filter on added_by
+    Migration(4, "books_added_by_index", [
+        "CREATE INDEX idx_books_added_by ON books (added_by)",
+    ]),
+    # A user's orders page by (order_date, order_id); admins page all orders the same way
+    Migration(5, "orders_date_indexes", [
+        "CREATE INDEX idx_orders_user_date ON orders (user_id, order_date)",
+        "CREATE INDEX idx_orders_order_date ON orders (order_date)",
+    ]),
+    # Search by order status ('status:...' is an equality match on this indexed column)
+    Migration(6, "orders_status_index", [
+        "CREATE INDEX idx_orders_status ON orders (status)",
+    ]),
+    # Single-statement cart upserts need (user_id, barcode) unique.
+    # Merge duplicate cart lines into the oldest row before the unique key can be added. The merge
+    # and the delete commit together: after the merge alone, a rerun would add the quantities twice
+    Migration(7, "cart_user_barcode_unique", [
+        (
+            """
+            UPDATE cart c
+            JOIN (
+                SELECT MIN(cart_id) AS cart_id, SUM(quantity) AS quantity
+                FROM cart GROUP BY user_id, barcode HAVING COUNT(*) > 1
+            ) merged ON c.cart_id = merged.cart_id
+            SET c.quantity = merged.quantity
+            """,
+            """
+            DELETE c FROM cart c
+            JOIN cart kept ON c.user_id = kept.user_id AND c.barcode = kept.barcode AND c.cart_id > kept.cart_id
+            """,
+        ),
+        "ALTER TABLE cart ADD UNIQUE KEY uq_cart_user_barcode (user_id, barcode)",
+    ]),
+    # The barcodes each catalog version changed, so other workers' caches drop only those
+    Migration(8, "catalog_changes", [
+        """
+        CREATE TABLE catalog_changes (
+            version BIGINT NOT NULL,
+            barcode VARCHAR(100) NOT NULL,
+            kind VARCHAR(10) NOT NULL,
+            PRIMARY KEY (version, barcode)
+        )
+        """,
+    ]),
+    # Search pages sort by any sortable column of schema_registry.TABLES, with the primary key
+    # as tie-breaker; an index on the column alone covers both, since InnoDB appends the key
+    Migration(9, "search_sort_indexes", [
+        "CREATE INDEX idx_books_name ON books (name)",
+        "CREATE INDEX idx_books_author ON books (author)",
+        "CREATE INDEX idx_books_price ON books (price)",
+        "CREATE INDEX idx_books_quantity ON books (quantity)",
+        "CREATE INDEX idx_orders_total_amount ON orders (total_amount)",
+        "CREATE INDEX idx_orders_quantity ON orders (quantity)",
+        "CREATE INDEX idx_cart_quantity ON cart (quantity)",
+        "CREATE INDEX idx_users_firstname ON users (firstname)",
+        "CREATE INDEX idx_users_lastname ON users (lastname)",
+        "CREATE INDEX idx_users_usertype ON users (usertype)",
+    ]),
+]
+
+
+async def applied_versions(session) -> set:
+    await session.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    result = await session.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in result["data"]}
+
+
+async def run_in_transaction(session, statements):
+    await session.execute("START TRANSACTION")
+    try:
+        for statement in statements:
+            await session.execute(statement)
+    except BaseException:
+        await session.execute("ROLLBACK")
+        raise
+    await session.execute("COMMIT")
+
+
+async def apply_migration(session, migration: Migration):
+    """
+    Run one migration's statements in order. MySQL commits DDL implicitly, so a failed
+    migration is not rolled back; statements are written to be safe to rerun instead, and
+    data changes that are only safe together are grouped in a tuple and run as one transaction.
+    """
+    for statement in migration.statements:
+        if isinstance(statement, tuple):
+            await run_in_transaction(session, statement)
+            continue
+        try:
+            await session.execute(statement)
+        except Error as e:
+            if e.errno not in ALREADY_APPLIED:
+                raise
+            logging.info(f"Migration {migration.version}: already in place ({e.msg})")
+    await session.execute(
+        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (migration.version, migration.name)
+    )
+
+
+async def migrate() -> list:
+    """Apply every pending migration in version order; returns the versions applied."""
+    applied = []
+    async with db_connect.session() as session:
+        # One worker migrates at a time; the others wait and then find nothing pending
+        result = await session.execute("SELECT GET_LOCK('schema_migrations', %s)", (LOCK_TIMEOUT,))
+        if result["data"][0][0] != 1:
+            raise RuntimeError("Timed out waiting for another process to finish migrating.")
+        try:
+            done = await applied_versions(session)
+            for migration in MIGRATIONS:
+                if migration.version in done:
+                    continue
+                logging.info(f"Applying migration {migration.version}: {migration.name}")
+                await apply_migration(session, migration)
+                applied.append(migration.version)
+        finally:
+            await session.execute("SELECT RELEASE_LOCK('schema_migrations')")
+    return applied
+
+
+async def status() -> list:
+    """(version, name, applied) for every known migration."""
+    async with db_connect.session() as session:
+        done = await applied_versions(session)
+    return [(m.version, m.name, m.version in done) for m in MIGRATIONS]
+
+
+async def _run(command: str):
+    try:
+        if command == "status":
+            for version, name, applied in await status():
+                print(f"{version:>4}  {'applied' if applied else 'pending':8}  {name}")
+        else:
+            versions = await migrate()
+            print(f"Applied migrations: {versions}" if versions else "Schema is up to date.")
+    finally:
+        await db_connect.close_async_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply or list database schema migrations.")
+    parser.add_argument("command", nargs="?", default="apply", choices=["apply", "status"])
+    args = parser.parse_args()
+    asyncio.run(_run(args.command))
+
+
+if __name__ == "__main__":
+    main()
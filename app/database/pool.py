@@ -0,0 +1,298 @@
+from mysql.connector import aio, errors, Error
+from mysql.connector.aio.cursor import MySQLCursorPrepared
+from collections import OrderedDict, deque
+import asyncio
+import logging
+import time
+
+
+class PooledConnection:
+    """A pooled aio connection plus the bookkeeping the pool needs to manage it."""
+
+    def __init__(self, connection, overflow: bool = False):
+        self.connection = connection
+        self.overflow = overflow
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.statements = OrderedDict()  # SQL -> (SQL, prepared cursor), least recently used first
+
+
+class StatementCursor(MySQLCursorPrepared):
+    """
+    Prepared cursor that runs a statement it already prepared in one round trip.
+    The stock cursor sends COM_STMT_RESET before every execution, which only matters after
+    long data was sent or a result was left unread; the pool's statements do neither, as
+    every result is read to the end and a connection that failed mid-read is discarded.
+    """
+
+    async def execute(self, operation, params=None, multi=False):
+        if self._prepared is None or operation is not self._executed:
+            # First run of this statement: the driver prepares it
+            await super().execute(operation, params, multi)
+            return
+        result = await self._connection.cmd_stmt_execute(
+            self._prepared["statement_id"],
+            data=tuple(params or ()),
+            parameters=self._prepared["parameters"],
+        )
+        await self._handle_result(result)
+
+
+class PoolStats:
+    """Counters describing how the pool behaves under load."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.waits = 0  # Checkouts that had to queue for a connection
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.exhausted = 0  # Checkouts that gave up after the pool timeout
+        self.overflow_opened = 0
+        self.recycled = 0  # Connections replaced for age or a failed ping
+        self.discarded = 0  # Connections dropped after a connection-level error
+        self.statement_hits = 0  # Executions that reused a statement already prepared on the connection
+        self.statements_prepared = 0
+        self.statements_evicted = 0  # Prepared statements closed to stay within the per-connection cache size
+
+    def record_wait(self, seconds: float):
+        self.waits += 1
+        self.total_wait_time += seconds
+        self.max_wait_time = max(self.max_wait_time, seconds)
+
+
+class AsyncConnectionPool:
+    """
+    Async MySQL connection pool with a fair wait queue.
+    - Holds up to `size` connections, plus `max_overflow` temporary ones during bursts.
+    - Callers queue in FIFO order for up to `timeout` seconds before a PoolError is raised.
+    - Connections older than `recycle` seconds are replaced, and connections idle for
+      longer than `ping_interval` seconds are pinged before being handed out.
+    - Each connection keeps up to `statement_cache_size` server-side prepared statements.
+    """
+
+    def __init__(self, size: int, max_overflow: int = 0, timeout: float = 10.0,
+                 recycle: float = 1800.0, ping_interval: float = 30.0,
+                 statement_cache_size: int = 64, **config):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self.statement_cache_size = statement_cache_size
+        self.config = config
+        self.stats = PoolStats()
+        self._idle = deque()
+        self._waiters = deque()
+        self._opened = 0  # Connections that exist (idle, checked out or being opened)
+        self._overflow = 0
+        self._in_use = 0
+        self._closed = False
+
+    async def acquire(self) -> PooledConnection:
+        """Check out a connection, waiting in line when the pool is exhausted."""
+        if self._closed:
+            raise errors.PoolError("The database pool is closed")
+        self.stats.checkouts += 1
+
+        while self._idle:
+            pooled = self._idle.pop()  # Most recently used first, so idle extras can age out
+            pooled = await self._validate(pooled)
+            if pooled is not None:
+                return self._checkout(pooled)
+
+        if self._opened < self.size + self.max_overflow:
+            overflow = self._opened >= self.size
+            return self._checkout(await self._open(overflow))
+
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            pooled = await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            if not self._handed_over(waiter):
+                self.stats.exhausted += 1
+                logging.warning(
+                    f"Database pool exhausted: no connection within {self.timeout}s "
+                    f"({self._in_use} in use, {len(self._waiters)} waiting)"
+                )
+                raise errors.PoolError("Timed out waiting for a database connection")
+            pooled = waiter.result()  # Handed over just as the timeout fired
+        except BaseException:
+            if self._handed_over(waiter):
+                await self.release(waiter.result())  # Cancelled after the handover
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.stats.record_wait(time.monotonic() - started)
+        # A connection handed over by release() is already counted as in use
+        return pooled
+
+    async def release(self, pooled: PooledConnection, discard: bool = False):
+        """Hand a connection back to the next waiter or the idle set, or drop it."""
+        self._in_use -= 1
+        pooled.last_used = time.monotonic()
+
+        if discard:
+            self.stats.discarded += 1
+            await self._close(pooled)
+            await self._refill_waiter(pooled.overflow)
+            return
+
+        if self._closed:
+            await self._close(pooled)
+            return
+
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_use += 1
+                waiter.set_result(pooled)
+                return
+
+        if pooled.overflow:
+            # Overflow connections only live for as long as there is a queue
+            await self._close(pooled)
+            return
+        self._idle.append(pooled)
+
+    async def close(self):
+        """
+        Close every idle connection and fail every waiter. Connections still checked out are
+        closed when they are released, and no new ones are handed out.
+        """
+        self._closed = True
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(errors.PoolError("The database pool is closed"))
+        while self._idle:
+            await self._close(self._idle.pop())
+
+    def snapshot(self) -> dict:
+        """Current pool state and counters, for sizing the pool from real traffic."""
+        stats = self.stats
+        return {
+            "size": self.size,
+            "max_overflow": self.max_overflow,
+            "opened": self._opened,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "overflow_in_use": self._overflow,
+            "waiting": len(self._waiters),
+            "checkouts": stats.checkouts,
+            "waits": stats.waits,
+            "avg_wait_ms": round(1000 * stats.total_wait_time / stats.waits, 3) if stats.waits else 0.0,
+            "max_wait_ms": round(1000 * stats.max_wait_time, 3),
+            "exhausted": stats.exhausted,
+            "overflow_opened": stats.overflow_opened,
+            "recycled": stats.recycled,
+            "discarded": stats.discarded,
+            "statement_cache_size": self.statement_cache_size,
+            "statement_hits": stats.statement_hits,
+            "statements_prepared": stats.statements_prepared,
+            "statements_evicted": stats.statements_evicted,
+        }
+
+    async def prepared(self, pooled: PooledConnection, sql: str):
+        """
+        The (sql, cursor) pair caching `sql` as a prepared statement on this connection.
+        Callers must execute the returned sql object rather than their own copy: the driver
+        only skips preparing again when it is handed the very same string.
+        """
+        cached = pooled.statements.get(sql)
+        if cached is not None:
+            pooled.statements.move_to_end(sql)
+            self.stats.statement_hits += 1
+            return cached
+
+        cursor = await pooled.connection.cursor(cursor_class=StatementCursor)
+        cached = pooled.statements[sql] = (sql, cursor)
+        self.stats.statements_prepared += 1
+        if len(pooled.statements) > self.statement_cache_size:
+            _, (_, evicted) = pooled.statements.popitem(last=False)
+            self.stats.statements_evicted += 1
+            await evicted.close()  # Deallocates the statement on the server
+        return cached
+
+    @staticmethod
+    def _handed_over(waiter) -> bool:
+        return waiter.done() and not waiter.cancelled() and waiter.exception() is None
+
+    def _checkout(self, pooled: PooledConnection) -> PooledConnection:
+        self._in_use += 1
+        return pooled
+
+    async def _open(self, overflow: bool) -> PooledConnection:
+        self._opened += 1
+        if overflow:
+            self._overflow += 1
+            self.stats.overflow_opened += 1
+        try:
+            # Autocommit keeps single statements atomic without leaving a snapshot open;
+            # multi-statement work opens an explicit transaction.
+            connection = await aio.connect(autocommit=True, **self.config)
+        except BaseException:
+            self._forget(overflow)
+            raise
+        return PooledConnection(connection, overflow=overflow)
+
+    async def _close(self, pooled: PooledConnection):
+        self._forget(pooled.overflow)
+        try:
+            await pooled.connection.close()
+        except Error:
+            pass
+
+    def _forget(self, overflow: bool):
+        self._opened -= 1
+        if overflow:
+            self._overflow -= 1
+
+    async def _validate(self, pooled: PooledConnection):
+        """Return the connection if it is still usable, or None after closing it."""
+        now = time.monotonic()
+        if self.recycle and now - pooled.created_at > self.recycle:
+            self.stats.recycled += 1
+            await self._close(pooled)
+            return None
+        if self.ping_interval is not None and now - pooled.last_used > self.ping_interval:
+            try:
+                alive = await pooled.connection.is_connected()
+            except BaseException:
+                # Cancelled or failed mid-ping: the connection is in an unknown state and no
+                # longer idle, so drop it rather than leave it counted but unreachable
+                await self._close(pooled)
+                raise
+            if not alive:
+                self.stats.recycled += 1
+                await self._close(pooled)
+                return None
+        return pooled
+
+    async def _refill_waiter(self, overflow: bool):
+        """
+        Open a replacement for a discarded connection if someone is queueing for one. The
+        replacement takes over the discarded connection's slot, overflow or not, so losing a
+        regular connection while overflow ones are open does not shrink the regular pool.
+        """
+        while self._waiters and self._opened < self.size + self.max_overflow:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            try:
+                pooled = await self._open(overflow)
+            except Error as e:
+                waiter.set_exception(e)
+                return
+            if waiter.done():
+                # The caller gave up while the connection was being opened
+                if pooled.overflow:
+                    await self._close(pooled)
+                else:
+                    self._idle.append(pooled)
+                return
+            self._in_use += 1
+            waiter.set_result(pooled)
+            return
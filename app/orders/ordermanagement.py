@@ -1,126 +1,289 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from app.database import db_connect
 from app.auth.auth_routes import get_current_user
+from app.books.facets import stock_delta, publish_facet_delta
+from app.books.suggest import suggest_index
+from app.books.catalog_cache import catalog_cache
+from app.utils.export import export_response, keyset_chunks, ExportBusyError, EXPORT_FORMATS
+from app.utils.pagination import page_clause, split_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.responses import FastJSONResponse, format_rows, RESULT_FORMATS
+from app.search.schema_registry import select_fields, with_keys
 from app.schemas.schemas import (
-    OrderRequest, OrderStatusUpdate, OrdersResponse, OrderPlacementResponse, OrderActionResponse
+    OrderRequest, OrderStatusUpdate, OrderPlacementResponse, OrderActionResponse,
+    CheckoutResponse, OrdersResponse, ColumnarOrdersResponse
 )
+from collections import Counter
 from datetime import datetime
+from typing import Optional, Union
 import uuid
 
 router = APIRouter()
 
+ORDER_FIELDS = ["order_id", "user_id", "barcode", "order_date", "transaction_id", "total_amount", "status", "quantity"]
+ORDER_SORT_KEYS = ["order_date", "order_id"]
+# view_orders returns a FastJSONResponse in either shape, so both are documented instead of validated
+VIEW_ORDERS_RESPONSES = {
+    200: {
+        "model": Union[OrdersResponse, ColumnarOrdersResponse],
+        "description": "One page of orders, as objects or (format=columnar) as row arrays.",
+    }
+}
+
+CART_LINES_QUERY = """
+    SELECT c.barcode, c.quantity, b.price, b.quantity
+    FROM cart c
+    JOIN books b ON c.barcode = b.barcode
+    WHERE c.user_id = %s
+    FOR UPDATE
+"""
+ORDER_STOCK_QUERY = "UPDATE books SET quantity = quantity - %s WHERE barcode = %s AND quantity >= %s"
+BOOK_EXISTS_QUERY = "SELECT 1 FROM books WHERE barcode = %s"
+STOCK_QUERY = "SELECT quantity FROM books WHERE barcode = %s"
+ORDER_INSERT_QUERY = """
+    INSERT INTO orders (user_id, barcode, order_date, transaction_id, 
+                        total_amount, status, quantity) 
+    SELECT %s, barcode, %s, %s, price * %s, %s, %s
+    FROM books WHERE barcode = %s
+"""
+CHECKOUT_INSERT_QUERY = """
+    INSERT INTO orders (user_id, barcode, order_date, transaction_id, 
+                        total_amount, status, quantity) 
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+CHECKOUT_STOCK_QUERY = """
+    UPDATE books b
+    JOIN (
+        SELECT barcode, SUM(quantity) AS quantity
+        FROM cart WHERE user_id = %s GROUP BY barcode
+    ) c ON b.barcode = c.barcode
+    SET b.quantity = b.quantity - c.quantity
+"""
+CLEAR_CART_QUERY = "DELETE FROM cart WHERE user_id = %s"
+EXPORT_SELECT = f"SELECT {', '.join(ORDER_FIELDS)} FROM orders"
+
+
+def orders_page_query(columns: list, user_id: Optional[int], cursor: Optional[str], limit: int):
+    """
+    SQL and parameters for one page of orders by date, and the columns it selects.
+    user_id None reads every user's orders.
+    """
+    where_clauses, params = [], []
+    if user_id is not None:
+        where_clauses.append("user_id = %s")
+        params.append(user_id)
+    predicate, page_params, order_and_limit, limit_params = page_clause(
+        ORDER_SORT_KEYS, cursor, limit, nullable=["order_date"]
+    )
+    if predicate:
+        where_clauses.append(predicate)
+        params.extend(page_params)
+
+    # Read only the requested columns, plus the sort keys the cursor needs
+    select_columns = with_keys(columns, ORDER_SORT_KEYS)
+    query = f"SELECT {', '.join(select_columns)} FROM orders"
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+    return query + order_and_limit, tuple(params + limit_params), select_columns
+
+
 @router.post("/order_book", response_model=OrderPlacementResponse)
-def order_book(
+async def order_book(
     order_details: OrderRequest, 
     current_user: dict = Depends(get_current_user)
 ):
     """
     Place an order for a book.
+    Stock check, stock decrement and order insert run as one transaction on one connection.
     """
     try:
-        query_result = db_connect.execute_query(
-            "SELECT price, quantity FROM books WHERE barcode = %s", (order_details.barcode,)
-        )
-        book = query_result["data"]
-
-        if not book:
-            raise HTTPException(status_code=404, detail="Book not found.")
-
-        price, available_quantity = book[0]
-        if available_quantity < order_details.quantity:
-            raise HTTPException(status_code=400, detail="Insufficient stock.")
-
-        total_amount = price * order_details.quantity
+        # OrderRequest.barcode is an int; bound as one, MySQL would compare the VARCHAR key
+        # numerically, scan the whole table and lock every row it reads
+        barcode = str(order_details.barcode)
         transaction_id = str(uuid.uuid4())
         order_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        db_connect.execute_query(
-            """
-            INSERT INTO orders (user_id, barcode, order_date, transaction_id, 
-                                total_amount, status, quantity) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                current_user['id'], order_details.barcode, order_date, 
-                transaction_id, total_amount, "Order Placed", order_details.quantity
+        async with db_connect.transaction() as tx:
+            # Conditional decrement: only matches when enough stock is left, and locks the row until commit
+            await tx.execute(ORDER_STOCK_QUERY, (order_details.quantity, barcode, order_details.quantity))
+            if tx.rowcount == 0:
+                book = await tx.execute(BOOK_EXISTS_QUERY, (barcode,))
+                if not book["data"]:
+                    raise HTTPException(status_code=404, detail="Book not found.")
+                raise HTTPException(status_code=400, detail="Insufficient stock.")
+
+            # Price the order from the locked row in the same statement as the insert
+            await tx.execute(
+                ORDER_INSERT_QUERY,
+                (
+                    current_user['id'], order_date, transaction_id, order_details.quantity,
+                    "Order Placed", order_details.quantity, barcode
+                )
             )
-        )
 
-        new_quantity = available_quantity - order_details.quantity
-        if new_quantity > 0:
-            db_connect.execute_query(
-                "UPDATE books SET quantity = %s WHERE barcode = %s", 
-                (new_quantity, order_details.barcode)
-            )
-        else:
-            db_connect.execute_query("DELETE FROM books WHERE barcode = %s", (order_details.barcode,))
+            # The stock left, for the facet counters and the caches
+            stock = await tx.execute(STOCK_QUERY, (barcode,))
+            remaining = stock["data"][0][0]
 
+        await publish_facet_delta(stock_delta(remaining + order_details.quantity, remaining))
+        await catalog_cache.publish(quantities={barcode: remaining})
+        suggest_index.set_quantity(barcode, remaining)
         return {"message": "Order placed successfully", "transaction_id": transaction_id}
 
+    except HTTPException as http_err:
+        raise http_err
+    except Exception as e:
+        raise_db_error(e)
+
+
+@router.post("/checkout", response_model=CheckoutResponse)
+async def checkout(current_user: dict = Depends(get_current_user)):
+    """
+    Order every item in the user's cart.
+    Validation, order inserts, stock updates and clearing the cart run as one transaction
+    with a fixed number of statements, whatever the size of the cart.
+    """
+    try:
+        user_id = current_user["id"]
+        order_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        async with db_connect.transaction() as tx:
+            # Step 1: Read and lock every cart line with its book in one query
+            result = await tx.execute(CART_LINES_QUERY, (user_id,))
+            if not result["data"]:
+                raise HTTPException(status_code=400, detail="Cart is empty.")
+
+            # Step 2: Merge repeated barcodes and validate stock for every line
+            lines = {}
+            for barcode, quantity, price, stock in result["data"]:
+                line = lines.setdefault(barcode, {"quantity": 0, "price": price, "stock": stock})
+                line["quantity"] += quantity
+
+            short = [barcode for barcode, line in lines.items() if line["stock"] < line["quantity"]]
+            if short:
+                raise HTTPException(status_code=400, detail=f"Insufficient stock for: {', '.join(short)}")
+
+            # Step 3: Write all order rows with one batched insert
+            orders = [
+                (
+                    user_id, barcode, order_date, str(uuid.uuid4()),
+                    line["price"] * line["quantity"], "Order Placed", line["quantity"]
+                )
+                for barcode, line in lines.items()
+            ]
+            await tx.executemany(CHECKOUT_INSERT_QUERY, orders)
+
+            # Step 4: Adjust stock for every book in the cart with one statement
+            await tx.execute(CHECKOUT_STOCK_QUERY, (user_id,))
+
+            # Step 5: Clear the cart
+            await tx.execute(CLEAR_CART_QUERY, (user_id,))
+
+        # Move sold-out books to the out-of-stock facet once the checkout has committed
+        delta = Counter()
+        for line in lines.values():
+            delta.update(stock_delta(line["stock"], line["stock"] - line["quantity"]))
+        await publish_facet_delta(delta)
+        remaining = {barcode: line["stock"] - line["quantity"] for barcode, line in lines.items()}
+        await catalog_cache.publish(quantities=remaining)
+        for barcode, quantity in remaining.items():
+            suggest_index.set_quantity(barcode, quantity)
+        return {
+            "message": "Checkout completed successfully",
+            "transaction_ids": [order[3] for order in orders],
+            "total_amount": float(sum(order[4] for order in orders)),
+        }
+
+    except HTTPException as http_err:
+        raise http_err
     except Exception as e:
         raise_db_error(e)
 
 
-@router.get("/view_orders", response_model=OrdersResponse)
-def view_orders(
+@router.get("/view_orders", responses=VIEW_ORDERS_RESPONSES)
+async def view_orders(
     current_user: dict = Depends(get_current_user),
-    username_param: str = Query(None, description="Username to filter orders (admin only).")
+    username_param: str = Query(None, description="Username to filter orders (admin only)."),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of orders per page."),
+    cursor: str = Query(None, description="Opaque cursor taken from the previous page's 'next_cursor'."),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. 'order_id,status'. Defaults to all."),
+    result_format: str = Query("records", alias="format", regex=RESULT_FORMATS,
+                               description="'records' (one object per order) or 'columnar' (column names once, row arrays).")
 ):
     """
-    View orders. Admins can view all orders or filter by username.
+    View orders, one page at a time by order date. Admins can view all orders or filter by username.
     """
     try:
+        columns = select_fields("orders", fields)
         user_id = current_user["id"]
         is_admin = current_user["usertype"] == "admin"
-
         if is_admin and username_param:
             # Fetch the user ID using the provided username
             user_id_query = "SELECT id FROM users WHERE username = %s"
-            user_id_result = db_connect.execute_query(user_id_query, (username_param,))
+            user_id_result = await db_connect.execute_query_async(user_id_query, (username_param,))
             user_data = user_id_result["data"]
 
             if not user_data:
                 raise HTTPException(status_code=404, detail="User not found.")
 
             user_id = user_data[0][0]  # Extract user ID from the result
-            query = "SELECT * FROM orders WHERE user_id = %s"
-            params = (user_id,)
 
         elif is_admin:
-            # If no username provided by admin, return all orders
-            query = "SELECT * FROM orders"
-            params = ()
+            # Admins without a username filter see all orders
+            user_id = None
+
+        query, params, select_columns = orders_page_query(columns, user_id, cursor, limit)
+        orders_result = await db_connect.execute_query_async(query, params)
+        date_at, id_at = select_columns.index("order_date"), select_columns.index("order_id")
+        orders, next_cursor = split_page(orders_result["data"], limit, key=lambda row: (row[date_at], row[id_at]))
+        if len(select_columns) > len(columns):
+            orders = [row[:len(columns)] for row in orders]
+
+        return FastJSONResponse({
+            "orders": format_rows(columns, orders, result_format),
+            "next_cursor": next_cursor
+        })
+
+    except HTTPException as http_err:
+        raise http_err
+    except Exception as e:
+        raise_db_error(e)
 
+@router.get("/export")
+async def export_orders(
+    current_user: dict = Depends(get_current_user),
+    username_param: str = Query(None, description="Username to filter orders (admin only)."),
+    file_format: str = Query("ndjson", alias="format", regex=EXPORT_FORMATS, description="'ndjson' or 'csv'.")
+):
+    """
+    Stream orders as NDJSON or CSV. Admins export all orders or one user's; other users export their own.
+    """
+    try:
+        user_id = current_user["id"]
+        is_admin = current_user["usertype"] == "admin"
+
+        if is_admin and username_param:
+            user_id_result = await db_connect.execute_query_async(
+                "SELECT id FROM users WHERE username = %s", (username_param,)
+            )
+            if not user_id_result["data"]:
+                raise HTTPException(status_code=404, detail="User not found.")
+            user_id = user_id_result["data"][0][0]
+
+        if is_admin and not username_param:
+            stream = keyset_chunks(EXPORT_SELECT, [], [], ["order_id"])
         else:
-            # For regular users, return only their own orders
-            query = "SELECT * FROM orders WHERE user_id = %s"
-            params = (user_id,)
-
-        orders_result = db_connect.execute_query(query, params)
-        orders = orders_result["data"]
-
-        # Prepare the response data
-        orders_data = [
-            {
-                "order_id": row[0],
-                "user_id": row[1],
-                "barcode": row[2],
-                "order_date": row[3],
-                "transaction_id": row[4],
-                "total_amount": row[5],
-                "status": row[6],
-                "quantity": row[7],
-            }
-            for row in orders
-        ]
-
-        return {"orders": orders_data}
+            stream = keyset_chunks(EXPORT_SELECT, ["user_id = %s"], [user_id], ["order_id"])
+        return export_response(stream, file_format, "orders")
 
+    except HTTPException as http_err:
+        raise http_err
+    except ExportBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         raise_db_error(e)
 
 @router.put("/cancel_order/{transaction_id}", response_model=OrderActionResponse)
-def cancel_order(
+async def cancel_order(
     transaction_id: str, 
     current_user: dict = Depends(get_current_user)
 ):
@@ -128,25 +291,34 @@ def cancel_order(
     Cancel an order if it belongs to the current user.
     """
     try:
-        order_query = "SELECT status FROM orders WHERE transaction_id = %s AND user_id = %s"
-        order_result = db_connect.execute_query(order_query, (transaction_id, current_user["id"]))
-        order = order_result["data"]
+        # The status check and the update share one locked read, so a concurrent status change cannot slip in
+        async with db_connect.transaction() as tx:
+            order_result = await tx.execute(
+                "SELECT status FROM orders WHERE transaction_id = %s AND user_id = %s FOR UPDATE",
+                (transaction_id, current_user["id"])
+            )
+            order = order_result["data"]
 
-        if not order:
-            raise HTTPException(status_code=404, detail="Order not found.")
+            if not order:
+                raise HTTPException(status_code=404, detail="Order not found.")
 
-        if order[0][0] != "Order Placed":
-            raise HTTPException(status_code=400, detail="Order cannot be canceled.")
+            if order[0][0] != "Order Placed":
+                raise HTTPException(status_code=400, detail="Order cannot be canceled.")
 
-        db_connect.execute_query("UPDATE orders SET status = 'Order Canceled' WHERE transaction_id = %s", (transaction_id,))
+            await tx.execute(
+                "UPDATE orders SET status = 'Order Canceled' WHERE transaction_id = %s AND user_id = %s",
+                (transaction_id, current_user["id"])
+            )
 
         return {"message": "Order canceled successfully"}
 
+    except HTTPException as http_err:
+        raise http_err
     except Exception as e:
         raise_db_error(e)
 
 @router.put("/update_order_status/{transaction_id}", response_model=OrderActionResponse)
-def update_order_status(
+async def update_order_status(
     transaction_id: str,
     status_update: OrderStatusUpdate,
     current_user: dict = Depends(get_current_user)
@@ -163,7 +335,7 @@ def update_order_status(
         raise HTTPException(status_code=403, detail="Only admin can update order status.")
 
     try:
-        db_connect.execute_query(
+        await db_connect.execute_query_async(
             "UPDATE orders SET status = %s WHERE transaction_id = %s", 
             (status_update.status, transaction_id)
         )
@@ -39,7 +39,16 @@ class UserUpdateRequest(BaseModel):
 
 class CartItem(BaseModel):
     barcode: str
-    quantity: int
+    quantity: int = Field(..., gt=0)
+
+# Schema for removing a cart item; a quantity sent along is ignored
+class CartItemKey(BaseModel):
+    barcode: str
+
+# Schema for adding or updating several cart items at once
+class CartBulkRequest(BaseModel):
+    items: list[CartItem] = Field(..., min_length=1, max_length=500)
+    replace: bool = Field(False, description="Set quantities to the given values instead of adding to them.")
 
 
 # Schema for placing an order request
@@ -65,12 +74,29 @@ class OrderResponse(BaseModel):
 # Response schema for viewing orders
 class OrdersResponse(BaseModel):
     orders: list[OrderResponse] = Field(..., description="List of orders.")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, null on the last page.")
+
+# Rows sent with format=columnar: the column names once, then one array per row
+class ColumnarRows(BaseModel):
+    columns: list[str]
+    rows: list[list]
+
+# Response schema for viewing orders with format=columnar
+class ColumnarOrdersResponse(BaseModel):
+    orders: ColumnarRows = Field(..., description="Orders as column names and row arrays.")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page, null on the last page.")
 
 # Response schema for order placement
 class OrderPlacementResponse(BaseModel):
     message: str
     transaction_id: str
 
+# Response schema for checking out the whole cart
+class CheckoutResponse(BaseModel):
+    message: str
+    transaction_ids: list[str] = Field(..., description="One transaction ID per ordered book.")
+    total_amount: float
+
 # Response schema for order cancellation or status update
 class OrderActionResponse(BaseModel):
     message: str
\ No newline at end of file
@@ -0,0 +1,36 @@
+import os
+import re
+
+# InnoDB ignores words shorter than innodb_ft_min_token_size (3 by default)
+MIN_TOKEN_SIZE = int(os.getenv("FULLTEXT_MIN_TOKEN_SIZE", "3"))
+MAX_TERMS = 10
+
+# Relevance of a book for a boolean-mode query, backed by the ft_books_name_author index
+BOOKS_MATCH = "MATCH(name, author) AGAINST (%s IN BOOLEAN MODE)"
+
+# InnoDB's default stopword list; these are never indexed, so requiring them would match nothing
+STOPWORDS = {
+    "a", "about", "an", "are", "as", "at", "be", "by", "com", "de", "en", "for", "from", "how",
+    "i", "in", "is", "it", "la", "of", "on", "or", "that", "the", "this", "to", "was", "what",
+    "when", "where", "who", "will", "with", "und", "www",
+}
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list:
+    """Split search text into lowercase indexable terms, without stopwords or duplicates."""
+    terms = []
+    for term in _TOKEN.findall(text.lower()):
+        if len(term) >= MIN_TOKEN_SIZE and term not in STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+
+def boolean_query(text: str) -> str:
+    """
+    Build a boolean-mode query where every term is required and prefix-matched,
+    so 'tolk lord' finds 'The Lord of the Rings' by 'Tolkien'.
+    Returns an empty string when the text has no searchable terms.
+    """
+    return " ".join(f"+{term}*" for term in tokenize(text))
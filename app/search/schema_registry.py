@@ -0,0 +1,163 @@
+from fastapi import HTTPException
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple, Optional
+import re
+
+
+class Column(NamedTuple):
+    name: str
+    type: str  # 'str', 'int', 'decimal' or 'datetime'
+    index: Optional[str] = None  # 'primary', 'unique' or 'index' when a B-tree index starts with this column
+    hidden: bool = False  # Never searchable or returned
+
+
+# Mirrors setup_db.sql and app/database/migrations.py. InnoDB indexes every foreign key column, so those count as indexed.
+# Every sortable column leads an index as well (migration 9); `index` marks only the columns 'field:value' matches
+# exactly, so free-text columns such as name keep their substring match.
+TABLES = {
+    "books": {
+        "primary_key": "barcode",
+        "sortable": ["name", "author", "price", "quantity"],
+        "columns": [
+            Column("barcode", "str", "primary"),
+            Column("name", "str"),
+            Column("author", "str"),
+            Column("price", "int"),
+            Column("quantity", "int"),
+            Column("added_by", "str", "index"),
+        ],
+    },
+    "orders": {
+        "primary_key": "order_id",
+        "sortable": ["order_date", "total_amount", "status", "quantity"],
+        "columns": [
+            Column("order_id", "int", "primary"),
+            Column("user_id", "int", "index"),
+            Column("barcode", "str", "index"),
+            Column("order_date", "datetime", "index"),
+            Column("transaction_id", "str", "unique"),
+            Column("total_amount", "decimal"),
+            Column("status", "str", "index"),
+            Column("quantity", "int"),
+        ],
+    },
+    "cart": {
+        "primary_key": "cart_id",
+        "sortable": ["quantity"],
+        "columns": [
+            Column("cart_id", "int", "primary"),
+            Column("user_id", "int", "index"),
+            Column("barcode", "str", "index"),
+            Column("quantity", "int"),
+        ],
+    },
+    "users": {
+        "primary_key": "id",
+        "sortable": ["username", "firstname", "lastname", "mailid", "usertype"],
+        "columns": [
+            Column("id", "int", "primary"),
+            Column("username", "str", "unique"),
+            Column("password", "str", hidden=True),
+            Column("firstname", "str"),
+            Column("lastname", "str"),
+            Column("address", "str"),
+            Column("phone", "str"),
+            Column("mailid", "str", "unique"),
+            Column("usertype", "str"),
+            Column("token_version", "int", hidden=True),
+        ],
+    },
+}
+
+# field, operator, value; e.g. 'barcode:123', 'price>=20', 'name:harry*'
+_KEYWORD = re.compile(r"^(\w+)(>=|<=|>|<|:)(.*)$", re.DOTALL)
+
+
+def get_column(table: str, field: str) -> Column:
+    """Look up a searchable column, rejecting unknown or hidden fields with a 400."""
+    for column in TABLES[table]["columns"]:
+        if column.name == field and not column.hidden:
+            return column
+    raise HTTPException(status_code=400, detail=f"Unknown field '{field}' for table '{table}'.")
+
+
+def visible_columns(table: str) -> list:
+    return [column.name for column in TABLES[table]["columns"] if not column.hidden]
+
+
+def select_fields(table: str, fields: Optional[str]) -> list:
+    """
+    Resolve a comma-separated ?fields= value to column names, in the order given.
+    Unknown and hidden columns are rejected with a 400; no value means every visible column.
+    """
+    if not fields:
+        return visible_columns(table)
+    names = []
+    for field in fields.split(","):
+        field = field.strip()
+        if field and field not in names:
+            names.append(get_column(table, field).name)
+    if not names:
+        raise HTTPException(status_code=400, detail="No fields requested.")
+    return names
+
+
+def with_keys(names: list, keys) -> list:
+    """
+    Append the sort keys a page needs for its cursor but `names` lacks. They go last,
+    so rows can be cut back to the requested columns with row[:len(names)].
+    """
+    return names + [key for key in keys if key not in names]
+
+
+def _convert(column: Column, value: str):
+    try:
+        if column.type == "int":
+            return int(value)
+        if column.type == "decimal":
+            return Decimal(value)
+        if column.type == "datetime":
+            return datetime.fromisoformat(value)
+    except (ValueError, InvalidOperation):
+        raise HTTPException(
+            status_code=400, detail=f"Invalid {column.type} value for '{column.name}': '{value}'"
+        )
+    return value
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def compile_keyword(table: str, keyword: str):
+    """
+    Compile one search keyword into the cheapest SQL predicate for its column.
+    - Indexed string columns, numbers and dates: 'field:value' is an equality match.
+    - Numbers and dates: 'field>=value', 'field<=value', 'field>value', 'field<value' are range scans.
+    - Strings: 'field:value*' is a prefix match (LIKE 'value%'), which can use an index.
+    - Other strings: 'field:value' keeps the substring match (LIKE '%value%').
+    Returns (clause, params).
+    """
+    match = _KEYWORD.match(keyword)
+    if not match:
+        raise HTTPException(status_code=400, detail=f"Invalid keyword format: '{keyword}'")
+
+    field, operator, value = match.groups()
+    column = get_column(table, field)
+
+    if operator != ":":
+        if column.type == "str":
+            raise HTTPException(status_code=400, detail=f"Range filters are not supported on text field '{field}'.")
+        return f"{field} {operator} %s", [_convert(column, value)]
+
+    if column.type != "str":
+        return f"{field} = %s", [_convert(column, value)]
+
+    if value.endswith("*"):
+        return f"{field} LIKE %s", [_escape_like(value[:-1]) + "%"]
+
+    if column.index:
+        return f"{field} = %s", [value]
+
+    return f"{field} LIKE %s", [f"%{_escape_like(value)}%"]
@@ -1,8 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from typing import Optional, List
 from app.database import db_connect
 from app.auth.auth_routes import get_current_user
 from mysql.connector import Error
+from app.utils.pagination import page_clause, split_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.responses import FastJSONResponse, format_rows, RESULT_FORMATS
+from app.search import fulltext
+from app.search.schema_registry import TABLES, compile_keyword, select_fields, with_keys
+from app.books.facets import catalog_facets, filtered_facets
+from app.books.catalog_cache import catalog_cache
+from app.utils.conditional import (
+    version_etag, body_etag, is_not_modified, not_modified, set_validators,
+    CATALOG_CACHE_CONTROL, PRIVATE_CACHE_CONTROL
+)
 
 router = APIRouter()
 
@@ -10,26 +20,72 @@ router = APIRouter()
 NON_ADMIN_TABLES = ["books", "orders","cart"]
 ADMIN_TABLES = NON_ADMIN_TABLES + ["users"]
 
-# Define valid order_by fields for each table
-VALID_ORDER_BY = {
-    "books": ["title", "author", "price"],
-    "orders": ["order_date", "total"],
-    "users": ["username", "email"],  # Add more fields as necessary
-}
+def build_search_query(table: str, output_columns: list, where_clauses: list, params: list, sort_keys: list,
+                       cursor: Optional[str], limit: int, descending: bool, match_query: Optional[str] = None):
+    """
+    SQL and parameters for one page of search results, and the sort keys selected only for the cursor.
+    match_query adds the full-text relevance column; the MATCH filter itself is one of where_clauses.
+    """
+    where_clauses, params = list(where_clauses), list(params)
+    select_params, relevance = [], ""
+    if match_query is not None:
+        relevance = f", {fulltext.BOOKS_MATCH} AS relevance"
+        select_params.append(match_query)
+
+    # Every sortable column may hold NULL; only the primary key and relevance never do
+    nullable = [key for key in sort_keys if key not in (TABLES[table]["primary_key"], "relevance")]
+    predicate, page_params, order_and_limit, limit_params = page_clause(sort_keys, cursor, limit, descending, nullable)
+    having = ""
+    if predicate:
+        if "relevance" in sort_keys:
+            # The relevance alias cannot be referenced in WHERE, so ranked pages filter in HAVING
+            having = f" HAVING {predicate}"
+        else:
+            where_clauses.append(predicate)
+        params.extend(page_params)
+
+    # Sort keys the caller did not ask for are still read, for the cursor, and cut off below
+    requested = [column for column in output_columns if column != "relevance"]
+    extra_keys = with_keys(output_columns, sort_keys)[len(output_columns):]
+    query = f"SELECT {', '.join(requested)}{relevance}"
+    query += "".join(f", {key}" for key in extra_keys) + f" FROM {table}"
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+    query += having
+    return query + order_and_limit, tuple(select_params + params + limit_params), extra_keys
 
 @router.get("/search")
-def search(
+async def search(
+    request: Request,
     table: str = Query(..., description="Table to search in.", enum=NON_ADMIN_TABLES + ["users"]),
-    keywords: List[str] = Query(None, description="Search keywords in the format 'field:value'"),
+    keywords: List[str] = Query(
+        None,
+        description="Search keywords: 'field:value' (exact on keys, numbers and dates; substring otherwise), "
+                    "'field:value*' (prefix), or 'field>=value' / 'field<=value' / 'field>value' / 'field<value' (ranges)."
+    ),
+    q: Optional[str] = Query(None, description="Full-text search over book name and author, ranked by relevance (books only)."),
     order_by: Optional[str] = Query(None, description="Field to sort by, e.g., 'price'."),
     sort_order: Optional[str] = Query("asc", regex="^(asc|desc)$", description="Sort order: 'asc' or 'desc'."),
+    facets: bool = Query(False, description="Also return author, price range and stock counts for the matching books."),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of results per page."),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from the previous page's 'next_cursor'."),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. 'barcode,name,price'. Defaults to all."),
+    result_format: str = Query("records", alias="format", regex=RESULT_FORMATS,
+                               description="'records' (one object per row) or 'columnar' (column names once, row arrays)."),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Search API to perform searches across one selected table.
     - Only admin users can search in the 'users' table.
-    - Supports multiple input parameters for search.
+    - Supports multiple input parameters for search, each compiled into the cheapest predicate for its column.
+    - 'q' runs a prefix-matching full-text search over book names and authors, ordered by relevance.
+    - 'facets' adds author, price range and stock counts for the matching books.
     - Allows sorting by a specified field in ascending or descending order.
+    - Returns one page of results; pass 'next_cursor' back as 'cursor' for the next page.
+    - 'fields' limits the returned columns; only those are read from the table.
+    - 'format=columnar' returns the column names once and each row as a bare array.
+    - Honors If-None-Match / If-Modified-Since: book searches are validated against the catalog
+      version before any query runs, other tables against a hash of the result.
     """
 
     # Step 1: Check if user is allowed to search in the selected table
@@ -42,54 +98,100 @@ def search(
         )
 
     try:
+        # Book results only change with the catalog version, so a repeat request is answered without querying
+        if table == "books":
+            await catalog_cache.sync()
+            etag = version_etag("books", catalog_cache.version)
+            last_modified = catalog_cache.updated_at
+            if is_not_modified(request, etag, last_modified):
+                return not_modified(etag, last_modified, CATALOG_CACHE_CONTROL)
+
         # Step 2: Build the query dynamically
         where_clauses = []
         params = []
 
         if keywords:
             for keyword in keywords:
-                # Split keyword by colon to get field and value
-                field_value = keyword.split(":", 1)
-                if len(field_value) != 2:
-                    raise HTTPException(status_code=400, detail=f"Invalid keyword format: '{keyword}'")
-                
-                field, value = field_value
-                where_clauses.append(f"{field} LIKE %s")
-                params.append(f"%{value}%")
-
-        query = f"SELECT * FROM {table}"
-
-        if where_clauses:
-            query += " WHERE " + " AND ".join(where_clauses)
-
-        # Step 3: Handle ordering
+                # Unknown fields and malformed values are rejected before any SQL is sent
+                clause, values = compile_keyword(table, keyword)
+                where_clauses.append(clause)
+                params.extend(values)
+
+        # Only whitelisted, visible columns are ever selected
+        output_columns = select_fields(table, fields)
+        match_query = None
+
+        # Full-text mode: filter and rank books through the FULLTEXT index
+        if q is not None:
+            if table != "books":
+                raise HTTPException(status_code=400, detail="Full-text search is only available for the 'books' table.")
+            match_query = fulltext.boolean_query(q)
+            if not match_query:
+                raise HTTPException(status_code=400, detail="Search text has no searchable terms.")
+            output_columns = output_columns + ["relevance"]
+            where_clauses.append(fulltext.BOOKS_MATCH)
+            params.append(match_query)
+
+        # Facets describe the whole matching set, so they are taken before the page predicate is added
+        facet_counts = None
+        if facets:
+            if table != "books":
+                raise HTTPException(status_code=400, detail="Facets are only available for the 'books' table.")
+            if where_clauses:
+                facet_counts = await filtered_facets(" AND ".join(where_clauses), params)
+            else:
+                facet_counts = await catalog_facets()  # Maintained counters, no scan
+
+        # Step 3: Handle ordering, always ending with the primary key so pages are stable
+        primary_key = TABLES[table]["primary_key"]
+        sort_keys = [primary_key]
+        descending = sort_order == "desc"
         if order_by:
             # Check if order_by is a valid field for the selected table
-            if order_by not in VALID_ORDER_BY[table]:
+            if order_by not in TABLES[table]["sortable"] + [primary_key]:
                 raise HTTPException(status_code=400, detail=f"Invalid order_by field: '{order_by}'")
-            query += f" ORDER BY {order_by} {sort_order.upper()}"
+            if order_by != primary_key:
+                sort_keys.insert(0, order_by)
+        elif q is not None:
+            # Most relevant first
+            sort_keys.insert(0, "relevance")
+            descending = True
+
+        query, query_params, extra_keys = build_search_query(
+            table, output_columns, where_clauses, params, sort_keys, cursor, limit, descending, match_query
+        )
 
         # Execute the query and get the result data and columns
-        result = db_connect.execute_query(query, tuple(params))
+        result = await db_connect.execute_query_async(query, query_params)
 
         # Extract data and column names
-        data = result.get("data", [])
         columns = result.get("columns", [])
+        key_positions = [columns.index(key) for key in sort_keys]
+        data, next_cursor = split_page(
+            result.get("data", []), limit, key=lambda row: tuple(row[i] for i in key_positions)
+        )
 
-        # Format the data into a list of dictionaries
-        formatted_data = [dict(zip(columns, row)) for row in data]
-
-        # Step 4: Hide passwords if the users table is queried
-        if table == "users":
-            for item in formatted_data:
-                item.pop("password", None)  # Remove password field if it exists
+        # Step 4: Keep only the requested columns
+        if extra_keys:
+            data = [row[:len(output_columns)] for row in data]
 
-        # Step 5: Return the search result
-        return {
+        # Step 5: Return the search result with its validators
+        response = FastJSONResponse({
             "message": "Search completed successfully",
             "table": table,
-            "results": formatted_data or "No matching records found."
-        }
+            "results": format_rows(output_columns, data, result_format) or "No matching records found.",
+            "next_cursor": next_cursor,
+            **({"facets": facet_counts} if facets else {})
+        })
+        if table == "books":
+            set_validators(response, etag, last_modified, CATALOG_CACHE_CONTROL)
+            return response
+
+        etag = body_etag(response.body)
+        if is_not_modified(request, etag):
+            return not_modified(etag, cache_control=PRIVATE_CACHE_CONTROL)
+        set_validators(response, etag, cache_control=PRIVATE_CACHE_CONTROL)
+        return response
 
     except HTTPException as http_err:
         raise http_err  # Re-raise HTTP exceptions
@@ -1,21 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from app.database import db_connect
-from app.auth.auth_routes import get_current_user
+from app.auth.auth_routes import get_current_user, invalidate_cached_user, revoke_token_version
 from app.schemas.schemas import UserCreate, UserUpdateRequest
-from app.utils.password_utils import pwd_context
+from app.utils.password_utils import hash_password, HashingBusyError
 from mysql.connector import Error
-from app.cart.cartcontroller import view_cart
+from app.cart.cartcontroller import load_cart, CART_FIELDS
+from app.utils.pagination import page_clause, split_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.responses import FastJSONResponse, format_rows, RESULT_FORMATS
+from app.books.facets import catalog_facets
+from typing import Optional
+import asyncio
+import os
 router = APIRouter()
 
+# Profile queries one request may run at once. The default covers the six of the admin profile,
+# so its latency is that of the slowest query; lower it to trade latency for pool connections.
+PROFILE_QUERY_CONCURRENCY = int(os.getenv("PROFILE_QUERY_CONCURRENCY", "6"))
+
 @router.post("/register")
-def register(user: UserCreate):
-    hashed_password = pwd_context.hash(user.password)
+async def register(user: UserCreate):
+    try:
+        hashed_password = await hash_password(user.password)
+    except HashingBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     query = """
         INSERT INTO users (username, password, firstname, lastname, address, phone, mailid, usertype) 
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
     """
     try:
-        db_connect.execute_query(query, (
+        await db_connect.execute_query_async(query, (
             user.username, hashed_password, user.firstname, user.lastname,
             user.address, user.phone, user.mailid, user.usertype
         ))
@@ -23,47 +36,29 @@ def register(user: UserCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
    
+USER_FIELDS = ["username", "firstname", "lastname", "address", "phone", "mailid", "usertype"]
+OWN_USER_QUERY = f"SELECT {', '.join(USER_FIELDS)} FROM users WHERE username = %s"
+LOCK_USER_QUERY = "SELECT id, usertype, token_version FROM users WHERE username = %s FOR UPDATE"
+
 @router.get("/user_details")
-def user_details(user: dict = Depends(get_current_user)):
+async def user_details(
+    user: dict = Depends(get_current_user),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of users per page (admin only)."),
+    cursor: str = Query(None, description="Opaque cursor taken from the previous page's 'next_cursor'."),
+    result_format: str = Query("records", alias="format", regex=RESULT_FORMATS,
+                               description="'records' (one object per user) or 'columnar' (column names once, row arrays; admin only).")
+):
     try:
+        user_rows, next_cursor = await fetch_user_rows(user, limit, cursor)
         if user["usertype"] == 'admin':
-            user_data_query = "SELECT username, firstname, lastname, address, phone, mailid, usertype FROM users;"
-            users_result = db_connect.execute_query(user_data_query)
-            users = users_result["data"]
-
-            user_data = [
-                {
-                    "username": row[0],
-                    "firstname": row[1],
-                    "lastname": row[2],
-                    "address": row[3],
-                    "phone": row[4],
-                    "mailid": row[5],
-                    "usertype": row[6]
-                }
-                for row in users
-            ]
-            return {"message": "User details retrieved successfully", "user_data": user_data}
+            return FastJSONResponse({
+                "message": "User details retrieved successfully",
+                "user_data": format_rows(USER_FIELDS, user_rows, result_format),
+                "next_cursor": next_cursor
+            })
 
-        else:
-            user_data_query = "SELECT username, firstname, lastname, address, phone, mailid, usertype FROM users WHERE username = %s;"
-            user_result = db_connect.execute_query(user_data_query, (user['username'],))
-            user_info = user_result["data"][0] if user_result["data"] else None
-
-            if not user_info:
-                raise HTTPException(status_code=404, detail="User not found")
-
-            user_data = {
-                "username": user_info[0],
-                "firstname": user_info[1],
-                "lastname": user_info[2],
-                "address": user_info[3],
-                "phone": user_info[4],
-                "mailid": user_info[5],
-                "usertype": user_info[6]
-            }
-
-            return {"message": "User details retrieved successfully", "user_data": user_data}
+        user_data = dict(zip(USER_FIELDS, user_rows[0]))
+        return FastJSONResponse({"message": "User details retrieved successfully", "user_data": user_data})
 
     except HTTPException as http_err:
         raise http_err
@@ -72,8 +67,31 @@ def user_details(user: dict = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
+def users_page_query(cursor: Optional[str], limit: int):
+    """SQL and parameters for one page of users (USER_FIELDS, then id) by id."""
+    predicate, params, order_and_limit, limit_params = page_clause(["id"], cursor, limit)
+    query = f"SELECT {', '.join(USER_FIELDS)}, id FROM users"
+    if predicate:
+        query += f" WHERE {predicate}"
+    return query + order_and_limit, tuple(params + limit_params)
+
+async def fetch_user_rows(user: dict, limit: int, cursor: str):
+    """
+    Admins get one page of all users by id, everyone else their own row (404 if it is gone).
+    Returns (rows of USER_FIELDS, next_cursor).
+    """
+    if user["usertype"] == 'admin':
+        users_result = await db_connect.execute_query_async(*users_page_query(cursor, limit))
+        users, next_cursor = split_page(users_result["data"], limit, key=lambda row: (row[7],))
+        return [row[:7] for row in users], next_cursor
+
+    user_result = await db_connect.execute_query_async(OWN_USER_QUERY, (user['username'],))
+    if not user_result["data"]:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user_result["data"][:1], None
+
 @router.put("/update_user")
-def update_user(
+async def update_user(
     user_update: UserUpdateRequest,
     username: str = Query(None, description="Username to update (only for admins)", example="john_doe"), 
     current_user: dict = Depends(get_current_user)
@@ -88,18 +106,6 @@ def update_user(
         else:
             username = current_user["username"]
 
-        user_query = "SELECT id, usertype FROM users WHERE username = %s"
-        user_result = db_connect.execute_query(user_query, (username,))
-        user_data = user_result["data"]
-
-        if not user_data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"User '{username}' not found."
-            )
-
-        user_id, existing_role = user_data[0]
-
         update_fields = []
         update_params = []
 
@@ -131,6 +137,8 @@ def update_user(
                 )
             update_fields.append("usertype = %s")
             update_params.append(user_update.usertype)
+            # Role changes invalidate tokens that carry the old role in their claims
+            update_fields.append("token_version = token_version + 1")
 
         if not update_fields:
             raise HTTPException(
@@ -138,10 +146,23 @@ def update_user(
                 detail="No valid fields provided for update."
             )
 
-        update_query = f"UPDATE users SET {', '.join(update_fields)} WHERE username = %s"
-        update_params.append(username)
+        # Look the user up and update it on one connection, with the row locked in between
+        async with db_connect.transaction() as tx:
+            user_result = await tx.execute(LOCK_USER_QUERY, (username,))
+            if not user_result["data"]:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"User '{username}' not found."
+                )
+            user_id, _, token_version = user_result["data"][0]
 
-        db_connect.execute_query(update_query, tuple(update_params))
+            update_query = f"UPDATE users SET {', '.join(update_fields)} WHERE id = %s"
+            update_params.append(user_id)
+            await tx.execute(update_query, tuple(update_params))
+
+        invalidate_cached_user(user_id)
+        if user_update.usertype:
+            await revoke_token_version(user_id, token_version)
 
         return {"message": f"User '{username}' updated successfully."}
 
@@ -152,131 +173,153 @@ def update_user(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
+PROFILE_ORDERS_QUERY = """
+    SELECT o.order_id, o.order_date, o.transaction_id, o.total_amount,
+           o.status, o.quantity, b.name AS book_name, u.username
+    FROM orders o
+    JOIN books b ON o.barcode = b.barcode
+    JOIN users u ON o.user_id = u.id
+"""
+PROFILE_USER_QUERY = f"SELECT {', '.join(USER_FIELDS)} FROM users WHERE id = %s"
+OWN_ORDERS_QUERY = PROFILE_ORDERS_QUERY + " WHERE o.user_id = %s"
+OWN_BOOKS_QUERY = "SELECT barcode, name, author, price, quantity FROM books WHERE added_by = %s"
+RECENT_ORDERS_QUERY = PROFILE_ORDERS_QUERY + " ORDER BY o.order_date DESC, o.order_id DESC LIMIT %s"
+ORDER_TOTALS_QUERY = "SELECT status, COUNT(*), COALESCE(SUM(total_amount), 0) FROM orders GROUP BY status"
+TABLE_COUNTS_QUERY = """
+    SELECT (SELECT COUNT(*) FROM users),
+           (SELECT COUNT(*) FROM cart),
+           (SELECT COUNT(DISTINCT user_id) FROM cart)
+"""
+
+def format_profile_orders(rows) -> list:
+    return [
+        {
+            "order_id": row[0],
+            "order_date": row[1].strftime("%Y-%m-%d %H:%M:%S"),
+            "transaction_id": row[2],
+            "total_amount": float(row[3]),
+            "status": row[4],
+            "quantity": row[5],
+            "book_name": row[6],
+            "ordered_by": row[7],  # Username of the person who placed the order
+        }
+        for row in rows
+    ]
+
+async def fetch_profile_user(user: dict) -> dict:
+    result = await db_connect.execute_query_async(PROFILE_USER_QUERY, (user["id"],))
+    if not result["data"]:
+        raise HTTPException(status_code=404, detail="User not found")
+    return dict(zip(USER_FIELDS, result["data"][0]))
+
+async def fetch_own_orders(user: dict) -> list:
+    result = await db_connect.execute_query_async(OWN_ORDERS_QUERY, (user["id"],))
+    return format_profile_orders(result["data"])
+
+async def fetch_own_books(user: dict) -> list:
+    result = await db_connect.execute_query_async(OWN_BOOKS_QUERY, (user["username"],))
+    return [
+        {"barcode": row[0], "name": row[1], "author": row[2], "price": float(row[3]), "quantity": row[4]}
+        for row in result["data"]
+    ]
+
+async def fetch_own_cart(user: dict):
+    """
+    The first page of the user's own cart, also for admins (view_cart without a username shows
+    every cart to them). Returns (items, next_cursor); the cursor continues at /cart/view.
+    """
+    cart_items, next_cursor = await load_cart({**user, "usertype": "user"}, None, DEFAULT_PAGE_SIZE, None)
+    return format_rows(CART_FIELDS, cart_items), next_cursor
+
+async def gather_limited(*coroutines):
+    """asyncio.gather, running at most PROFILE_QUERY_CONCURRENCY of the coroutines at a time."""
+    semaphore = asyncio.Semaphore(PROFILE_QUERY_CONCURRENCY)
+
+    async def limited(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(limited(coroutine) for coroutine in coroutines))
+
+async def fetch_recent_orders(count: int) -> list:
+    result = await db_connect.execute_query_async(RECENT_ORDERS_QUERY, (count,))
+    return format_profile_orders(result["data"])
+
+async def fetch_order_totals() -> dict:
+    result = await db_connect.execute_query_async(ORDER_TOTALS_QUERY)
+    by_status = {status_name: {"count": count, "total_amount": float(total)} for status_name, count, total in result["data"]}
+    return {
+        "count": sum(entry["count"] for entry in by_status.values()),
+        "total_amount": round(sum(entry["total_amount"] for entry in by_status.values()), 2),
+        "by_status": by_status,
+    }
+
+async def fetch_table_counts() -> dict:
+    result = await db_connect.execute_query_async(TABLE_COUNTS_QUERY)
+    users, cart_items, carts = result["data"][0]
+    return {"users": users, "cart_items": cart_items, "carts": carts}
+
+async def fetch_catalog_totals() -> dict:
+    # Read from the maintained facet counters rather than counting books
+    stock = (await catalog_facets())["stock"]
+    return {"count": sum(stock.values()), "in_stock": stock["in_stock"], "out_of_stock": stock["out_of_stock"]}
+
 @router.get("/profile")
-def get_profile(user: dict = Depends(get_current_user)):
+async def get_profile(
+    user: dict = Depends(get_current_user),
+    recent: int = Query(10, ge=1, le=100, description="Most recent orders included in the admin summary.")
+):
+    """
+    Profile of the current user. Every part is loaded by an independent query and up to
+    PROFILE_QUERY_CONCURRENCY of them run at once. With the default, every query of the route
+    runs at once and latency follows the slowest one; a lower setting runs them in waves.
+    - The cart holds its first page; 'cart_next_cursor' continues it at /cart/view.
+    - Users get their details, orders, added books and cart.
+    - Admins get their details and cart plus a summary of the store (counts, totals and the
+      most recent orders) instead of every order, book and cart in the system.
+    """
     try:
         # Ensure the user has a valid ID
         if "id" not in user:
             raise HTTPException(status_code=403, detail="User ID not found.")
 
-        orders_data = []
-        books_data = []
-        cart_response = {}
-
         if user["usertype"] == "admin":
-            # Admin: Fetch all orders across users
-            orders_query = """
-                SELECT o.order_id, o.order_date, o.transaction_id, o.total_amount, 
-                       o.status, o.quantity, b.name AS book_name, u.username 
-                FROM orders o
-                JOIN books b ON o.barcode = b.barcode
-                JOIN users u ON o.user_id = u.id
-            """
-            orders_result = db_connect.execute_query(orders_query)
-            orders = orders_result["data"]
-
-            # Prepare order data for admin
-            orders_data = [
-                {
-                    "order_id": row[0],
-                    "order_date": row[1].strftime("%Y-%m-%d %H:%M:%S"),
-                    "transaction_id": row[2],
-                    "total_amount": float(row[3]),
-                    "status": row[4],
-                    "quantity": row[5],
-                    "book_name": row[6],
-                    "ordered_by": row[7],  # Username of the person who placed the order
-                }
-                for row in orders
-            ]
-
-            # Admin: Fetch all books added by any user
-            added_books_query = """
-                SELECT barcode, name, author, price, quantity, added_by 
-                FROM books
-            """
-            added_books_result = db_connect.execute_query(added_books_query)
-            added_books = added_books_result["data"]
-
-            # Prepare books data for admin
-            books_data = [
-                {
-                    "barcode": row[0],
-                    "name": row[1],
-                    "author": row[2],
-                    "price": float(row[3]),
-                    "quantity": row[4],
-                    "added_by": row[5],  # Username of the user who added the book
-                }
-                for row in added_books
-            ]
-
-            # Admin: Get all cart items using view_cart without username filter
-            cart_response = view_cart(current_user=user,username_param=None)
-
-        else:
-            # Non-admin: Fetch only their own orders
-            orders_query = """
-                SELECT o.order_id, o.order_date, o.transaction_id, o.total_amount, 
-                       o.status, o.quantity, b.name AS book_name 
-                FROM orders o
-                JOIN books b ON o.barcode = b.barcode
-                WHERE o.user_id = %s
-            """
-            orders_params = (user["id"],)
-            orders_result = db_connect.execute_query(orders_query, orders_params)
-            orders = orders_result["data"]
-
-            # Prepare order data for non-admin
-            orders_data = [
-                {
-                    "order_id": row[0],
-                    "order_date": row[1].strftime("%Y-%m-%d %H:%M:%S"),
-                    "transaction_id": row[2],
-                    "total_amount": float(row[3]),
-                    "status": row[4],
-                    "quantity": row[5],
-                    "book_name": row[6],
-                    "ordered_by": user["username"],  # Current user's username
-                }
-                for row in orders
-            ]
-
-            # Non-admin: Fetch only their added books
-            added_books_query = """
-                SELECT barcode, name, author, price, quantity 
-                FROM books 
-                WHERE added_by = %s
-            """
-            added_books_params = (user["username"],)
-            added_books_result = db_connect.execute_query(added_books_query, added_books_params)
-            added_books = added_books_result["data"]
-
-            # Prepare books data for non-admin
-            books_data = [
-                {
-                    "barcode": row[0],
-                    "name": row[1],
-                    "author": row[2],
-                    "price": float(row[3]),
-                    "quantity": row[4],
-                }
-                for row in added_books
-            ]
-
-            # Non-admin: Get cart items for the current user
-            cart_response = view_cart(current_user=user)
-
-        # User information using the user_details function
-        user_info_response = user_details(user)
-
-        return {
+            user_data, (cart_items, cart_cursor), recent_orders, orders, catalog, counts = await gather_limited(
+                fetch_profile_user(user),
+                fetch_own_cart(user),
+                fetch_recent_orders(recent),
+                fetch_order_totals(),
+                fetch_catalog_totals(),
+                fetch_table_counts(),
+            )
+            return FastJSONResponse({
+                "message": "Profile details retrieved successfully!",
+                "user_data": user_data,
+                "summary": {
+                    "orders": orders,
+                    "books": catalog,
+                    "users": counts["users"],
+                    "carts": {"count": counts["carts"], "items": counts["cart_items"]},
+                },
+                "recent_orders": recent_orders or "No orders found.",
+                "cart_items": cart_items or "No products available in cart.",
+                "cart_next_cursor": cart_cursor,
+            })
+
+        user_data, orders_data, books_data, (cart_items, cart_cursor) = await gather_limited(
+            fetch_profile_user(user),
+            fetch_own_orders(user),
+            fetch_own_books(user),
+            fetch_own_cart(user),
+        )
+        return FastJSONResponse({
             "message": "Profile details retrieved successfully!",
-            "user_data": user_info_response.get("user_data", "No User Data found"),
+            "user_data": user_data,
             "orders": orders_data or "No orders found.",
             "added_books": books_data or "No books added.",
-            "cart_items": cart_response.get("cart_items", "No products available in cart."),
-        }
+            "cart_items": cart_items or "No products available in cart.",
+            "cart_next_cursor": cart_cursor,
+        })
 
     except HTTPException as http_exc:
         # Handle HTTP exceptions explicitly
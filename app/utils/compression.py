@@ -0,0 +1,229 @@
+from starlette.datastructures import Headers, MutableHeaders
+import os
+import time
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Optional; brotli is only offered when the package is installed
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional; zstd is only offered when the package is installed
+    zstandard = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # Smaller complete bodies are sent as-is
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))  # 1 (fastest) to 9 (smallest)
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))  # 0 to 11; above ~5 costs far more CPU
+ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))  # 1 to 19
+
+# Compressed already, or not worth the CPU
+SKIP_CONTENT_TYPES = ("image/", "video/", "audio/", "application/zip", "application/gzip")
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        # Sync flush after each chunk so streamed responses reach the client as they are produced
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class ZstdEncoder:
+    name = "zstd"
+
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class CompressionStats:
+    """Bytes before/after and CPU time per encoding, to judge levels against real traffic."""
+
+    def __init__(self):
+        self.encodings = {}
+        self.skipped = 0  # Responses sent uncompressed (too small, already encoded or not negotiable)
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int, seconds: float):
+        entry = self.encodings.setdefault(
+            encoding, {"responses": 0, "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0}
+        )
+        entry["responses"] += 1
+        entry["bytes_in"] += bytes_in
+        entry["bytes_out"] += bytes_out
+        entry["cpu_seconds"] += seconds
+
+    def snapshot(self) -> dict:
+        encodings = {}
+        for name, entry in self.encodings.items():
+            encodings[name] = {
+                **entry,
+                "cpu_seconds": round(entry["cpu_seconds"], 4),
+                "ratio": round(entry["bytes_out"] / entry["bytes_in"], 4) if entry["bytes_in"] else None,
+                "mb_per_cpu_second": (
+                    round(entry["bytes_in"] / entry["cpu_seconds"] / 1e6, 2) if entry["cpu_seconds"] else None
+                ),
+            }
+        return {"skipped": self.skipped, "encodings": encodings}
+
+
+stats = CompressionStats()
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing response bodies with the best coding the client accepts.
+    - Preference is zstd, then br, then gzip, limited to the libraries that are installed.
+    - Complete bodies under `minimum_size` are left alone; streamed bodies are compressed chunk by chunk.
+    - Responses that already have a Content-Encoding, or media that is compressed already, pass through.
+    - Every other response carries Vary: Accept-Encoding, compressed or not, so a shared cache never
+      serves the copy made for one Accept-Encoding to a client that sent another.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, gzip_level: int = GZIP_LEVEL,
+                 brotli_quality: int = BROTLI_QUALITY, zstd_level: int = ZSTD_LEVEL):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.factories = []
+        if zstandard is not None:
+            self.factories.append(("zstd", lambda: ZstdEncoder(zstd_level)))
+        if brotli is not None:
+            self.factories.append(("br", lambda: BrotliEncoder(brotli_quality)))
+        self.factories.append(("gzip", lambda: GzipEncoder(gzip_level)))
+
+    def choose(self, accept_encoding: str):
+        accepted = parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        best, best_q = None, 0.0
+        for name, factory in self.factories:
+            q = accepted.get(name, wildcard)
+            if q > best_q:  # Ties keep the earlier, preferred coding
+                best, best_q = factory, q
+        return best
+
+    @staticmethod
+    def negotiable(headers: MutableHeaders, status: int) -> bool:
+        """Whether the response could be compressed for some Accept-Encoding, size aside."""
+        return (
+            "content-encoding" not in headers
+            and status != 204
+            and not headers.get("content-type", "").startswith(SKIP_CONTENT_TYPES)
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        factory = self.choose(Headers(scope=scope).get("accept-encoding", ""))
+        if factory is None:
+            async def identity_send(message):
+                if message["type"] == "http.response.start":
+                    stats.skipped += 1
+                    headers = MutableHeaders(scope=message)
+                    if self.negotiable(headers, message["status"]):
+                        headers.add_vary_header("Accept-Encoding")
+                await send(message)
+
+            await self.app(scope, receive, identity_send)
+            return
+
+        start_message = None
+        encoder = None
+        passthrough = False
+        bytes_in = bytes_out = 0
+        cpu = 0.0
+
+        async def compressing_send(message):
+            nonlocal start_message, encoder, passthrough, bytes_in, bytes_out, cpu
+
+            if message["type"] == "http.response.start":
+                start_message = message  # Held until the first body chunk shows whether to compress
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if encoder is None:
+                headers = MutableHeaders(scope=start_message)
+                negotiable = self.negotiable(headers, start_message["status"])
+                if (
+                    not negotiable
+                    or start_message["status"] == 304
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    passthrough = True
+                    stats.skipped += 1
+                    if negotiable:  # A larger body, or another Accept-Encoding, could get a different response
+                        headers.add_vary_header("Accept-Encoding")
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                encoder = factory()
+                headers["Content-Encoding"] = encoder.name
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = "W/" + etag  # The compressed bytes differ from what a strong ETag names
+                await send(start_message)
+
+            started = time.perf_counter()
+            chunk = encoder.compress(body) if more_body else encoder.finish(body)
+            cpu += time.perf_counter() - started
+            bytes_in += len(body)
+            bytes_out += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            if not more_body:
+                stats.record(encoder.name, bytes_in, bytes_out, cpu)
+
+        await self.app(scope, receive, compressing_send)
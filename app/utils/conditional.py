@@ -0,0 +1,80 @@
+from fastapi import Request, Response
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import hashlib
+import os
+
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "0"))  # Seconds browsers and CDNs may reuse catalog responses
+
+# Catalog data is the same for every client; revalidation is cheap because it never touches the catalog rows
+CATALOG_CACHE_CONTROL = f"public, max-age={CATALOG_MAX_AGE}, must-revalidate"
+# Everything else may be per-user, so only the client itself may keep it
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def version_etag(name: str, version) -> str:
+    """Weak ETag for a versioned resource; weak so compressed and plain bodies share it."""
+    return f'W/"{name}-{version}"'
+
+
+def body_etag(content: bytes) -> str:
+    """Weak ETag from a hash of the rendered response body, for data without a version to key on."""
+    return f'W/"{hashlib.sha256(content).hexdigest()[:32]}"'
+
+
+def http_date(moment: datetime) -> str:
+    """Format a naive UTC (or aware) datetime as an HTTP date."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return format_datetime(moment.astimezone(timezone.utc), usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/ prefixes are ignored on both sides
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == wanted:
+            return True
+    return False
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime = None) -> bool:
+    """
+    Evaluate the request's validators. If-None-Match wins when present, as RFC 9110 requires;
+    If-Modified-Since is only consulted without it.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def set_validators(response: Response, etag: str, last_modified: datetime = None, cache_control: str = None):
+    """Attach ETag, Last-Modified and Cache-Control to a response."""
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+    if cache_control:
+        response.headers["Cache-Control"] = cache_control
+
+
+def not_modified(etag: str, last_modified: datetime = None, cache_control: str = None) -> Response:
+    """An empty 304 carrying the same validators a 200 would have had."""
+    response = Response(status_code=304)
+    set_validators(response, etag, last_modified, cache_control)
+    return response
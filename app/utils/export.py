@@ -0,0 +1,102 @@
+from fastapi.responses import StreamingResponse
+import csv
+import io
+import os
+from app.database import db_connect
+from app.utils.pagination import keyset_predicate
+from app.utils.responses import encode_objects
+
+EXPORT_FORMATS = "^(ndjson|csv)$"
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))  # Rows read per query while exporting
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "4"))  # Exports running at once before 503
+
+
+class ExportBusyError(Exception):
+    """Raised when EXPORT_MAX_CONCURRENT exports are already running."""
+
+
+active_exports = 0
+
+
+def export_chunk_query(select: str, where_clauses: list, params: list, keys: list, after=None,
+                       chunk_size: int = EXPORT_CHUNK_SIZE):
+    """SQL and parameters for the chunk of `select` following the key values `after` in `keys` order."""
+    where_clauses, params = list(where_clauses), list(params)
+    if after is not None:
+        predicate, after_params = keyset_predicate(keys, after)
+        where_clauses.append(predicate)
+        params.extend(after_params)
+    query = select
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
+    return query + f" ORDER BY {', '.join(keys)} LIMIT %s", tuple(params + [chunk_size])
+
+
+async def keyset_chunks(select: str, where_clauses: list, params: list, keys: list,
+                        chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Yield (column_names, rows) chunks of `select` in `keys` order, one short query per chunk.
+    A pooled connection is held only while a chunk is read, never while the client downloads it,
+    so slow downloads cannot starve the request pool. `keys` must be unique together and selected.
+    """
+    after = None
+    while True:
+        result = await db_connect.execute_query_async(
+            *export_chunk_query(select, where_clauses, params, keys, after, chunk_size)
+        )
+        rows = result["data"]
+        if rows:
+            yield result["columns"], rows
+        if len(rows) < chunk_size:
+            return
+        positions = [result["columns"].index(key) for key in keys]
+        after = [rows[-1][i] for i in positions]
+
+
+async def ndjson_chunks(stream):
+    """Encode streamed (columns, rows) chunks as newline-delimited JSON objects."""
+    async for columns, rows in stream:
+        if rows:
+            yield b"\n".join(encode_objects(columns, rows)) + b"\n"
+
+
+async def csv_chunks(stream):
+    """Encode streamed (columns, rows) chunks as CSV with a header row."""
+    header_written = False
+    async for columns, rows in stream:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+async def _counted(body):
+    global active_exports
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        active_exports -= 1
+
+
+def export_response(stream, file_format: str, filename: str) -> StreamingResponse:
+    """
+    Send a keyset_chunks stream to the client as rows arrive.
+    Raises ExportBusyError when EXPORT_MAX_CONCURRENT exports are already being sent.
+    """
+    global active_exports
+    if active_exports >= EXPORT_MAX_CONCURRENT:
+        raise ExportBusyError("Too many exports in progress, retry shortly")
+    if file_format == "csv":
+        body, media_type = csv_chunks(stream), "text/csv"
+    else:
+        body, media_type = ndjson_chunks(stream), "application/x-ndjson"
+    active_exports += 1
+    return StreamingResponse(
+        _counted(body),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{file_format}"'},
+    )
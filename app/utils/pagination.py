@@ -0,0 +1,85 @@
+from fastapi import HTTPException
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(values) -> str:
+    """Encode the sort key of the last row on a page as an opaque cursor."""
+    raw = json.dumps(list(values), default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key_count: int) -> list:
+    """Decode a cursor produced by encode_cursor, rejecting anything malformed with a 400."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != key_count:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+    return values
+
+
+def _after(key, value, descending: bool, nullable: bool):
+    """Condition (or None when nothing can follow) for `key` coming after `value`, with its params."""
+    op = "<" if descending else ">"
+    if not nullable:
+        return f"{key} {op} %s", [value]
+    # MySQL sorts NULL before every value, so NULLs come first ascending and last descending
+    if value is None:
+        return (None, []) if descending else (f"{key} IS NOT NULL", [])
+    if descending:
+        return f"({key} {op} %s OR {key} IS NULL)", [value]
+    return f"{key} {op} %s", [value]  # NULLs never compare greater
+
+
+def keyset_predicate(keys, values, descending: bool = False, nullable=()):
+    """
+    Build the WHERE predicate selecting rows after `values` in (keys...) order, e.g. for
+    (order_date, order_id): order_date > %s OR (order_date = %s AND order_id > %s).
+    The expanded form lets MySQL use a range scan on the sort index. Keys in `nullable` get
+    IS NULL forms, since a plain comparison with a NULL cursor value matches no row.
+    """
+    clauses, params = [], []
+    for i, key in enumerate(keys):
+        condition, condition_params = _after(key, values[i], descending, key in nullable)
+        if condition is None:
+            continue
+        parts, part_params = [], []
+        for previous, value in zip(keys[:i], values[:i]):
+            if value is None:
+                parts.append(f"{previous} IS NULL")
+            else:
+                parts.append(f"{previous} = %s")
+                part_params.append(value)
+        clauses.append("(" + " AND ".join(parts + [condition]) + ")")
+        params.extend(part_params + condition_params)
+    return "(" + " OR ".join(clauses) + ")", params
+
+
+def page_clause(keys, cursor: str, limit: int, descending: bool = False, nullable=()):
+    """
+    Return (predicate or None, params, order_by_and_limit, limit_params) for one page over `keys`.
+    One extra row is requested so the caller can tell whether another page exists. The limit is
+    bound as a parameter, so every page size shares one statement text (and prepared statement);
+    limit_params go after all other parameters of the query.
+    The last key must be unique and NOT NULL; earlier keys that may hold NULL go in `nullable`.
+    """
+    predicate, params = None, []
+    if cursor:
+        predicate, params = keyset_predicate(keys, decode_cursor(cursor, len(keys)), descending, nullable)
+    direction = "DESC" if descending else "ASC"
+    order_by = ", ".join(f"{key} {direction}" for key in keys)
+    return predicate, params, f" ORDER BY {order_by} LIMIT %s", [int(limit) + 1]
+
+
+def split_page(rows, limit: int, key):
+    """Split a LIMIT n+1 result into the page and the cursor for the next one (None on the last page)."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(key(rows[-1]))
+    return rows, None
@@ -1,3 +1,93 @@
 from passlib.context import CryptContext
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import os
+import time
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# BCRYPT_ROUNDS sets the cost factor; hashes made with another cost are upgraded at the next login
+_bcrypt_rounds = os.getenv("BCRYPT_ROUNDS")
+if _bcrypt_rounds:
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=int(_bcrypt_rounds))
+else:
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt runs in its own process pool so login storms cannot starve the request threads or hold the GIL
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "256"))  # Calls queued or running before rejecting
+
+
+class HashingBusyError(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class HashingStats:
+    def __init__(self):
+        self.completed = 0
+        self.rejected = 0
+        self.pending = 0  # Queued plus running
+        self.max_pending = 0
+        self.total_time = 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": HASH_WORKERS,
+            "max_pending": HASH_MAX_PENDING,
+            "pending": self.pending,
+            "queued": max(0, self.pending - HASH_WORKERS),
+            "peak_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_ms": round(1000 * self.total_time / self.completed, 3) if self.completed else 0.0,
+        }
+
+
+stats = HashingStats()
+_executor = None
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed: str):
+    return pwd_context.verify_and_update(password, hashed)
+
+
+async def _run(fn, *args):
+    global _executor
+    if stats.pending >= HASH_MAX_PENDING:
+        stats.rejected += 1
+        raise HashingBusyError("Too many password operations in progress, retry shortly")
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+
+    stats.pending += 1
+    stats.max_pending = max(stats.max_pending, stats.pending)
+    started = time.monotonic()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        stats.pending -= 1
+        stats.completed += 1
+        stats.total_time += time.monotonic() - started
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password on the hashing pool."""
+    return await _run(_hash, password)
+
+
+async def verify_password(password: str, hashed: str):
+    """
+    Verify a password on the hashing pool.
+    Returns (valid, new_hash); new_hash is set when the stored hash uses outdated
+    settings (e.g. a lower bcrypt cost) and should replace it.
+    """
+    return await _run(_verify_and_update, password, hashed)
+
+
+def shutdown_hashing_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,77 @@
+from fastapi.responses import JSONResponse
+from datetime import date, datetime
+from decimal import Decimal
+import orjson
+
+# 'records' is a list of objects, 'columnar' is {"columns": [...], "rows": [[...], ...]}
+RESULT_FORMATS = "^(records|columnar)$"
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+# Types whose JSON never contains a comma, so a whole column of them can be encoded at once and split
+_COMMA_FREE = {int, float, bool, type(None), Decimal, date, datetime}
+
+
+def _default(value):
+    """Types orjson does not handle natively, encoded the way FastAPI's jsonable_encoder would."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """Encode rows and dicts straight from the driver's Python types (datetime, Decimal, tuples)."""
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered by orjson. Routes return it directly, which also skips FastAPI's
+    jsonable_encoder pass over the whole result.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def _encode_column(values):
+    """
+    JSON for each value of one column, as (quoted, parts). Uniform columns take one orjson call;
+    string parts are returned without their quotes, which the row template puts back.
+    """
+    kinds = set(map(type, values))
+    if kinds == {str}:
+        # Quotes inside an encoded string are escaped, so '","' only ever separates items
+        return True, dumps(values)[2:-2].split(b'","')
+    if kinds <= _COMMA_FREE:
+        return False, dumps(values)[1:-1].split(b",")
+    return False, [dumps(value) for value in values]
+
+
+def encode_objects(columns, rows) -> list:
+    """One encoded JSON object per row, keyed by `columns`, without building a dict per row."""
+    if not rows:
+        return []
+    parts, encoded = [], []
+    for name, values in zip(columns, zip(*rows)):
+        quoted, column = _encode_column(values)
+        encoded.append(column)
+        parts.append(dumps(str(name)).replace(b"%", b"%%") + (b':"%b"' if quoted else b":%b"))
+    template = b"{" + b",".join(parts) + b"}"
+    return [template % values for values in zip(*encoded)]
+
+
+def format_rows(columns, rows, result_format: str = "records"):
+    """
+    Shape query rows for a response: objects per row, or columns once plus bare row arrays.
+    Records are encoded here and embedded as-is by dumps(); no rows gives an empty (falsy) list.
+    """
+    if result_format == "columnar":
+        return {"columns": list(columns), "rows": rows}
+    if not rows:
+        return []
+    return orjson.Fragment(b"[" + b",".join(encode_objects(columns, rows)) + b"]")
@@ -3,9 +3,18 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.openapi.models import OAuthFlows as OAuthFlowsModel
 from fastapi.security import OAuth2
+from contextlib import asynccontextmanager
+from app.database import db_connect, migrations
+from app.utils import password_utils, compression
+from app.books import facets, suggest
+from mysql.connector import Error
+import asyncio
+import logging
 
 # Import routers
-from app.auth.auth_routes import router as auth_router
+from app.auth.auth_routes import router as auth_router, user_cache, revocations
+from app.auth.jwt_handler import token_cache
+from app.books.catalog_cache import catalog_cache
 from app.users.user_routes import router as user_router
 from app.books.bookscontroller import router as books_router
 from app.search.searchcontroller import router as search_router
@@ -18,8 +27,30 @@ class OAuth2BearerHeader(OAuth2):
         flows = OAuthFlowsModel(password={"tokenUrl": "/auth/login"})
         super().__init__(flows=flows)
 
+# Migrate the schema and prepare derived data at startup; release pooled database connections and hashing workers at shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if migrations.MIGRATE_ON_STARTUP:
+        try:
+            await migrations.migrate()
+        except (Error, RuntimeError) as e:
+            logging.error(f"Could not apply schema migrations: '{e}'")
+    try:
+        await facets.ensure_facets()
+    except Error as e:
+        logging.error(f"Could not build catalog facet counters: '{e}'")
+    try:
+        await suggest.rebuild_suggest_index()
+    except Error as e:
+        logging.error(f"Could not build the suggest index: '{e}'")
+    refresher = asyncio.create_task(suggest.refresh_suggest_index())
+    yield
+    refresher.cancel()
+    await db_connect.close_async_pool()
+    password_utils.shutdown_hashing_pool()
+
 # Create FastAPI instance
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Middleware: Allow Cross-Origin Resource Sharing (CORS)
 app.add_middleware(
@@ -30,6 +61,9 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Middleware: Compress responses for clients that accept it (gzip, plus brotli/zstd when installed)
+app.add_middleware(compression.CompressionMiddleware)
+
 # Include routers
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 app.include_router(user_router, prefix="/users", tags=["User Management"])
@@ -38,6 +72,19 @@ app.include_router(search_router, prefix="/api", tags=["Search Management"])
 app.include_router(cart_router, prefix="/cart", tags=["Cart Management"])
 app.include_router(order_router, prefix="/order", tags=["order Management"])
 
+# Runtime metrics used to size pools and caches from real traffic
+@app.get("/metrics", tags=["Monitoring"])
+async def metrics():
+    return {
+        "db_pool": db_connect.pool_stats(),
+        "user_cache": user_cache.stats(),
+        "catalog_cache": catalog_cache.stats(),
+        "token_cache": token_cache.stats(),
+        "revoked_tokens": await revocations.stats(),
+        "password_hashing": password_utils.stats.snapshot(),
+        "compression": compression.stats.snapshot(),
+    }
+
 # Global Exception Handling
 @app.exception_handler(Exception)
 async def universal_exception_handler(request: Request, exc: Exception):
@@ -7,7 +7,38 @@ CREATE TABLE IF NOT EXISTS books (
     author VARCHAR(100),
     price INT,
     quantity INT,
-    added_by VARCHAR(100)
+    added_by VARCHAR(100),
+    KEY idx_books_added_by (added_by),
+    KEY idx_books_name (name),
+    KEY idx_books_author (author),
+    KEY idx_books_price (price),
+    KEY idx_books_quantity (quantity),
+    FULLTEXT KEY ft_books_name_author (name, author)
+);
+
+-- Facet counters for catalog search, maintained by the book write paths
+CREATE TABLE IF NOT EXISTS book_facets (
+    facet VARCHAR(20),
+    bucket VARCHAR(100),
+    book_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (facet, bucket)
+);
+
+-- Catalog version, bumped by every book write; drives the in-process catalog caches
+CREATE TABLE IF NOT EXISTS catalog_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO catalog_versions (name, version) VALUES ('books', 0);
+
+-- Barcodes changed by each catalog version ('changed', 'added' or 'removed'); old versions are pruned
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    version BIGINT NOT NULL,
+    barcode VARCHAR(100) NOT NULL,
+    kind VARCHAR(10) NOT NULL,
+    PRIMARY KEY (version, barcode)
 );
 
 CREATE TABLE IF NOT EXISTS users (
@@ -19,7 +50,11 @@ CREATE TABLE IF NOT EXISTS users (
     address VARCHAR(255),
     phone VARCHAR(20),
     mailid VARCHAR(100) UNIQUE,
-    usertype VARCHAR(50)
+    usertype VARCHAR(50),
+    token_version INT NOT NULL DEFAULT 0,
+    KEY idx_users_firstname (firstname),
+    KEY idx_users_lastname (lastname),
+    KEY idx_users_usertype (usertype)
 );
 
 CREATE TABLE IF NOT EXISTS orders (
@@ -31,6 +66,11 @@ CREATE TABLE IF NOT EXISTS orders (
     total_amount DECIMAL(10, 2),
     status VARCHAR(50),
     quantity INT DEFAULT 1,
+    KEY idx_orders_user_date (user_id, order_date),
+    KEY idx_orders_order_date (order_date),
+    KEY idx_orders_status (status),
+    KEY idx_orders_total_amount (total_amount),
+    KEY idx_orders_quantity (quantity),
     FOREIGN KEY (user_id) REFERENCES users(id),
     FOREIGN KEY (barcode) REFERENCES books(barcode)
 );
@@ -40,6 +80,8 @@ CREATE TABLE IF NOT EXISTS cart (
     user_id INT,
     barcode VARCHAR(100),
     quantity INT DEFAULT 1,
+    UNIQUE KEY uq_cart_user_barcode (user_id, barcode),
+    KEY idx_cart_quantity (quantity),
     FOREIGN KEY (user_id) REFERENCES users(id),
     FOREIGN KEY (barcode) REFERENCES books(barcode)
 );
@@ -0,0 +1,36 @@
+import os
+
+# Settings read at import time; a real .env still wins
+os.environ.setdefault("DB_PORT", "3306")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+from mysql.connector import Error
+import mysql.connector
+import pytest
+
+
+@pytest.fixture(scope="session")
+def mysql_config():
+    """Connection settings of a reachable MySQL server, or skip the test."""
+    from app.database import db_connect
+
+    config = db_connect.get_connection_config()
+    if not config["host"]:
+        pytest.skip("DB_HOST is not set")
+    try:
+        mysql.connector.connect(connection_timeout=3, **config).close()
+    except Error as e:
+        pytest.skip(f"MySQL is not reachable: {e}")
+    return config
+
+
+@pytest.fixture
+def database(mysql_config):
+    """db_connect bound to the test server, with the async pool closed after the test."""
+    import asyncio
+    from app.database import db_connect, migrations
+
+    asyncio.run(migrations.migrate())
+    asyncio.run(db_connect.close_async_pool())
+    yield db_connect
+    asyncio.run(db_connect.close_async_pool())
@@ -0,0 +1,150 @@
+"""In-memory stand-ins for driver connections, recording the SQL they are sent."""
+from app.database import db_connect
+from contextlib import asynccontextmanager
+from mysql.connector import errors
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+        self.lastrowid = None
+        self._rows = []
+
+    def _run(self, query, params=None):
+        self.connection.statements.append(query)
+        self.connection.params.append(params)
+        for fragment, error in self.connection.failures.items():
+            if fragment in query:
+                raise error
+        if params is not None and params in self.connection.rejected:
+            raise data_error()
+        result = self.connection.results.get(query)
+        if result is not None:
+            self.description = [(name,) for name in result[0]]
+            self._rows = list(result[1])
+            self.rowcount = len(self._rows)
+        else:
+            self.description = None
+            self.rowcount = 1
+
+    def _run_many(self, query, seq_params):
+        seq_params = list(seq_params)
+        self._run(query)
+        self.connection.params[-1] = seq_params
+        if any(params in self.connection.rejected for params in seq_params):
+            raise data_error()  # One bad row fails the whole multi-row statement
+        self.rowcount = len(seq_params)
+
+    def _fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+
+class FakeAsyncCursor(FakeCursor):
+    async def execute(self, query, params=None):
+        self._run(query, params)
+
+    async def executemany(self, query, seq_params):
+        self._run_many(query, seq_params)
+
+    async def fetchall(self):
+        return self._fetchall()
+
+    async def close(self):
+        pass
+
+
+class FakeSyncCursor(FakeCursor):
+    def execute(self, query, params=None):
+        self._run(query, params)
+
+    def executemany(self, query, seq_params):
+        self._run_many(query, seq_params)
+
+    def fetchall(self):
+        return self._fetchall()
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """
+    `results` maps exact SQL to (columns, rows); `failures` maps an SQL fragment to the
+    error raised by any statement containing it; `rejected` holds parameter tuples the
+    server refuses, as a column constraint would.
+    """
+
+    def __init__(self, results=None, failures=None, rejected=()):
+        self.statements = []
+        self.params = []
+        self.results = results or {}
+        self.failures = failures or {}
+        self.rejected = set(rejected)
+        self.committed = False
+        self.rolled_back = False
+        self.closed = False
+
+
+class FakeAsyncConnection(FakeConnection):
+    async def cursor(self, **kwargs):
+        return FakeAsyncCursor(self)
+
+    async def commit(self):
+        self.committed = True
+
+    async def rollback(self):
+        self.rolled_back = True
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeSyncConnection(FakeConnection):
+    def cursor(self, **kwargs):
+        return FakeSyncCursor(self)
+
+    def start_transaction(self):
+        self.statements.append("START TRANSACTION")
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSyncPool:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def get_connection(self):
+        return self.connection
+
+
+def integrity_error(msg="Duplicate entry"):
+    return errors.IntegrityError(msg=msg, errno=1062)
+
+
+def data_error(msg="Data too long"):
+    return errors.DataError(msg=msg, errno=1406)
+
+
+def fake_transactions(connection):
+    """A replacement for db_connect.transaction() running every block on `connection`."""
+
+    @asynccontextmanager
+    async def transaction():
+        try:
+            yield db_connect.AsyncTransaction(connection)
+        except BaseException:
+            await connection.rollback()
+            raise
+        await connection.commit()
+
+    return transaction
@@ -0,0 +1,59 @@
+from app.auth import auth_routes
+from app.auth.jwt_handler import build_user_claims, create_access_token, decode_token
+from app.auth.revocation import MemoryRevocationStore, token_key
+from fastapi import HTTPException
+import asyncio
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def revocations(monkeypatch):
+    store = MemoryRevocationStore()
+    monkeypatch.setattr(auth_routes, "revocations", store)
+    return store
+
+
+@pytest.fixture
+def no_user_lookups(monkeypatch):
+    async def load_user(user_id):
+        raise AssertionError("self-contained tokens must not read the users table")
+
+    monkeypatch.setattr(auth_routes, "load_user", load_user)
+
+
+def current_user(token):
+    return asyncio.run(auth_routes.get_current_user(token))
+
+
+def test_self_contained_token_builds_the_principal_from_its_claims(no_user_lookups):
+    token = create_access_token(build_user_claims(7, "alice", "seller", 3))
+    assert current_user(token) == {"id": 7, "username": "alice", "usertype": "seller", "token_version": 3}
+
+
+def test_role_change_revokes_the_old_token_version(no_user_lookups):
+    old = create_access_token(build_user_claims(7, "alice", "seller", 3))
+    asyncio.run(auth_routes.revoke_token_version(7, 3))
+    with pytest.raises(HTTPException) as raised:
+        current_user(old)
+    assert raised.value.status_code == 401
+
+    fresh = create_access_token(build_user_claims(7, "alice", "admin", 4))
+    assert current_user(fresh)["usertype"] == "admin"
+
+
+def test_logged_out_token_is_rejected(revocations, no_user_lookups):
+    token = create_access_token(build_user_claims(7, "alice", "seller", 3))
+    claims = decode_token(token)
+    asyncio.run(revocations.revoke(token_key(claims, token), claims["exp"]))
+    with pytest.raises(HTTPException) as raised:
+        current_user(token)
+    assert raised.value.status_code == 401
+
+
+def test_plain_token_loads_the_user(monkeypatch):
+    async def load_user(user_id):
+        return {"id": int(user_id), "username": "bob", "usertype": "user", "token_version": 0}
+
+    monkeypatch.setattr(auth_routes, "load_user", load_user)
+    token = create_access_token({"sub": "9"})
+    assert current_user(token)["username"] == "bob"
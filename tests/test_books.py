@@ -0,0 +1,118 @@
+from app.books import bookscontroller
+from app.books import catalog_cache as catalog_module
+from app.books.bulk_import import ImportReport
+from app.books.catalog_cache import BOOK_COLUMNS, CatalogCache
+from app.database import db_connect
+from app.schemas.schemas import Book, BookUpdateRequest
+from mysql.connector import errors
+from tests.fakes import FakeAsyncConnection, fake_transactions
+from collections import Counter
+import asyncio
+import pytest
+
+USER = {"id": 1, "username": "user1", "usertype": "user", "token_version": 0}
+READ_ONE = f"SELECT {BOOK_COLUMNS} FROM books WHERE barcode IN (%s)"
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    cache = CatalogCache()
+    cache.version = 4
+
+    async def bump_catalog_version(changes):
+        return cache.version + 1
+
+    monkeypatch.setattr(bookscontroller, "catalog_cache", cache)
+    monkeypatch.setattr(catalog_module, "bump_catalog_version", bump_catalog_version)
+    return cache
+
+
+def facet_rows(connection):
+    return [
+        params for query, params in zip(connection.statements, connection.params)
+        if "book_facets" in query
+    ]
+
+
+def test_added_book_is_cached_with_the_stored_price(monkeypatch, catalog):
+    # books.price is INT: MySQL stores 12.6 as 13
+    connection = FakeAsyncConnection(results={READ_ONE: (["barcode"], [("b1", "Emma", "Austen", 13, 2, "user1")])})
+    monkeypatch.setattr(db_connect, "transaction", fake_transactions(connection))
+
+    book = Book(barcode="b1", name="Emma", author="Austen", price=12.6, quantity=2)
+    asyncio.run(bookscontroller.add_books(book, USER))
+
+    assert catalog.entries.get("b1")[3] == 13
+    assert catalog.version == 5
+    # The version row is not touched inside the book transaction
+    assert not any("catalog_versions" in query for query in connection.statements)
+
+
+def test_price_change_moves_facet_buckets_by_the_stored_price(monkeypatch, catalog):
+    # 9.6 is stored as 10, so the book leaves the 0-10 bucket
+    locked = "SELECT added_by, name, author, price, quantity FROM books WHERE barcode = %s FOR UPDATE"
+    connection = FakeAsyncConnection(results={
+        locked: (["added_by"], [("user1", "Emma", "Austen", 5, 2)]),
+        READ_ONE: (["barcode"], [("b1", "Emma", "Austen", 10, 2, "user1")]),
+    })
+    monkeypatch.setattr(db_connect, "transaction", fake_transactions(connection))
+
+    asyncio.run(bookscontroller.modify_or_delete_book(BookUpdateRequest(barcode="b1", price=9.6), False, USER))
+
+    [changes] = facet_rows(connection)
+    assert ("price", "0-10", -1) in changes and ("price", "10-25", 1) in changes
+    assert catalog.entries.get("b1")[3] == 10
+
+
+def test_failed_import_batch_reports_each_row_once(monkeypatch, catalog):
+    # The second row is rejected on its own, then reading the batch back fails and rolls it all back
+    batch = [
+        (2, Book(barcode="b1", name="Emma", author="Austen", price=5, quantity=1)),
+        (3, Book(barcode="b2", name="Persuasion", author="Austen", price=6, quantity=1)),
+    ]
+    locked = "SELECT barcode, added_by, author, price, quantity FROM books WHERE barcode IN (%s, %s) FOR UPDATE"
+    connection = FakeAsyncConnection(
+        results={locked: (["barcode"], [])},
+        failures={f"SELECT {BOOK_COLUMNS} FROM books": errors.DatabaseError(msg="connection reset")},
+        rejected=[("b2", "Persuasion", "Austen", 6, 1, "user1")],
+    )
+    monkeypatch.setattr(db_connect, "transaction", fake_transactions(connection))
+
+    report = ImportReport()
+    asyncio.run(bookscontroller.write_import_batch(batch, USER, report, Counter()))
+
+    assert report.failed == 2 and report.imported == 0
+    assert [error["line"] for error in report.errors] == [3, 2]
+    assert "connection reset" not in report.errors[0]["error"]
+
+
+def test_facet_counters_are_updated_after_the_book_write_commits(monkeypatch, catalog):
+    book_connection = FakeAsyncConnection(results={READ_ONE: (["barcode"], [("b1", "Emma", "Austen", 13, 2, "user1")])})
+    facet_connection = FakeAsyncConnection()
+    connections, opened = iter([book_connection, facet_connection]), []
+
+    def transaction():
+        # Each transaction starts only once the previous one has committed
+        assert all(connection.committed for connection in opened)
+        opened.append(next(connections))
+        return fake_transactions(opened[-1])()
+
+    monkeypatch.setattr(db_connect, "transaction", transaction)
+
+    asyncio.run(bookscontroller.add_books(Book(barcode="b1", name="Emma", author="Austen", price=13, quantity=2), USER))
+
+    assert not facet_rows(book_connection)
+    [changes] = facet_rows(facet_connection)
+    assert changes == sorted([("author", "Austen", 1), ("price", "10-25", 1), ("stock", "in_stock", 1)])
+
+
+def test_failed_facet_update_does_not_fail_the_committed_write(monkeypatch, catalog):
+    connection = FakeAsyncConnection(
+        results={READ_ONE: (["barcode"], [("b1", "Emma", "Austen", 13, 2, "user1")])},
+        failures={"book_facets": errors.DatabaseError(msg="Lock wait timeout exceeded")},
+    )
+    monkeypatch.setattr(db_connect, "transaction", fake_transactions(connection))
+
+    asyncio.run(bookscontroller.add_books(Book(barcode="b1", name="Emma", author="Austen", price=13, quantity=2), USER))
+
+    assert catalog.entries.get("b1")[3] == 13
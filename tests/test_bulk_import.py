@@ -0,0 +1,77 @@
+from app.books import bulk_import
+from app.books.bulk_import import ImportReport, iter_records, validate_record
+import asyncio
+
+
+class Upload:
+    """Stands in for a Request whose body arrives in the given chunks."""
+
+    def __init__(self, *chunks: bytes):
+        self.chunks = chunks
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def records(*chunks, file_format="csv"):
+    async def collect():
+        return [item async for item in iter_records(Upload(*chunks), file_format)]
+    return asyncio.run(collect())
+
+
+def test_csv_quoted_fields_may_span_lines_and_chunks():
+    body = b'barcode,name,author\r\n1,"Line one\nline two, ""quoted""",Someone\n\n2,Plain,"A, B"\n'
+    for split in (len(body), 20, 1):
+        chunks = [body[i:i + split] for i in range(0, len(body), split)]
+        assert records(*chunks) == [
+            (2, {"barcode": "1", "name": 'Line one\nline two, "quoted"', "author": "Someone"}),
+            (5, {"barcode": "2", "name": "Plain", "author": "A, B"}),
+        ]
+
+
+def test_csv_column_count_errors_keep_line_numbers():
+    assert records(b"barcode,name\n1,a,extra\n   \n2,b") == [
+        (2, "Expected 2 columns, got 3"),
+        (4, {"barcode": "2", "name": "b"}),
+    ]
+
+
+def test_over_long_lines_are_rejected_without_buffering_them(monkeypatch):
+    monkeypatch.setattr(bulk_import, "MAX_LINE_BYTES", 16)
+    long_line = b"3," + b"x" * 40 + b"\n"
+    result = records(b"barcode,name\n1,a\n", long_line[:10], long_line[10:], b"2,b\n")
+    assert result == [
+        (2, {"barcode": "1", "name": "a"}),
+        (3, "Line is longer than 16 bytes"),
+        (4, {"barcode": "2", "name": "b"}),
+    ]
+
+
+def test_unclosed_quotes_are_bounded(monkeypatch):
+    monkeypatch.setattr(bulk_import, "MAX_LINE_BYTES", 16)
+    result = records(b'barcode,name\n1,"open\n', b"more\n", b"and more text\n", b"2,b\n")
+    assert result[0] == (2, "Quoted field is not closed within 16 characters")
+    assert result[-1] == (5, {"barcode": "2", "name": "b"})
+    assert records(b'barcode,name\n1,"open') == [(2, "Quoted field is not closed at the end of the file")]
+
+
+def test_ndjson():
+    assert records(b'{"barcode": "1"}\n\n[1]\nnot json\n', file_format="ndjson")[:2] == [
+        (1, {"barcode": "1"}),
+        (3, "Each line must be a JSON object"),
+    ]
+
+
+def test_validate_record_and_report():
+    book, error = validate_record({"barcode": "1", "name": "Dune", "author": "Herbert", "price": "9.5", "quantity": "2"})
+    assert error is None and book.quantity == 2
+    _, error = validate_record({"barcode": "1"})
+    assert "name" in error
+
+    report = ImportReport()
+    for line in range(bulk_import.MAX_REPORTED_ERRORS + 1):
+        report.add_error(line, "bad")
+    summary = report.as_dict()
+    assert summary["failed"] == bulk_import.MAX_REPORTED_ERRORS + 1
+    assert summary["errors_truncated"]
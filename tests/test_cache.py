@@ -0,0 +1,47 @@
+from app.utils import cache as cache_module
+from app.utils.cache import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = TTLCache(2, 60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    cache = TTLCache(10, 60)
+    cache.set("default", 1)
+    cache.set("short", 2, ttl=5)
+    clock.now += 10
+    assert cache.get("short", "gone") == "gone"
+    assert cache.get("default") == 1
+    clock.now += 60
+    assert cache.get("default") is None
+    assert len(cache) == 0
+
+
+def test_invalidate_clear_and_stats():
+    cache = TTLCache(10, 60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.stats() == {"size": 1, "maxsize": 10, "hits": 1, "misses": 1, "evictions": 0, "hit_rate": 0.5}
+    cache.clear()
+    assert len(cache) == 0
@@ -0,0 +1,153 @@
+from app.books import catalog_cache as catalog_module
+from app.books.catalog_cache import CatalogCache, CHANGED, ADDED, REMOVED
+from app.books.suggest import SuggestIndex
+from app.database import db_connect
+import asyncio
+import pytest
+
+BOOKS = [
+    ("100", "Dune", "Frank Herbert", 20, 5, "user1"),
+    ("123", "Emma", "Jane Austen", 10, 3, "user1"),
+    ("200", "Ulysses", "James Joyce", 15, 1, "user2"),
+]
+
+
+class FakeCatalogDatabase:
+    """The catalog tables as another worker would leave them: books, a version and its change log."""
+
+    def __init__(self):
+        self.books = {row[0]: row for row in BOOKS}
+        self.version = 7
+        self.changes = []  # (version, barcode, kind)
+        self.statements = []
+
+    def write(self, barcode, kind, row=None):
+        self.version += 1
+        self.changes.append((self.version, barcode, kind))
+        if row is None:
+            self.books.pop(barcode, None)
+        else:
+            self.books[barcode] = row
+
+    async def execute_statement(self, statement, params=None):
+        self.statements.append(statement.sql)
+        if statement is catalog_module.VERSION_QUERY:
+            return {"data": [(self.version, None)]}
+        if statement is catalog_module.CHANGES_QUERY:
+            after, upto, limit = params
+            rows = [(barcode, kind) for version, barcode, kind in self.changes if after < version <= upto]
+            return {"data": rows[:limit]}
+        if statement is catalog_module.BOOK_QUERY:
+            return {"data": [self.books[params[0]]] if params[0] in self.books else []}
+        # A keyset page: barcode order, after the cursor's barcode
+        limit = params[-1]
+        after = params[0] if len(params) > 1 else ""
+        return {"data": [self.books[barcode] for barcode in sorted(self.books) if barcode > after][:limit]}
+
+    async def execute_query_async(self, query, params=None):
+        self.statements.append(query)
+        return {"data": [self.books[barcode] for barcode in params if barcode in self.books]}
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = FakeCatalogDatabase()
+    monkeypatch.setattr(db_connect, "execute_statement", database.execute_statement)
+    monkeypatch.setattr(db_connect, "execute_query_async", database.execute_query_async)
+    monkeypatch.setattr(catalog_module, "VERSION_CHECK_INTERVAL", 0)
+    return database
+
+
+def page_reads(database):
+    return sum(1 for sql in database.statements if "ORDER BY barcode" in sql)
+
+
+def test_pages_are_served_from_cache(database):
+    catalog = CatalogCache()
+    rows, cursor = asyncio.run(catalog.page(None, 2))
+    assert [row[0] for row in rows] == ["100", "123"]
+    rows, last = asyncio.run(catalog.page(cursor, 2))
+    assert [row[0] for row in rows] == ["200"] and last is None
+
+    asyncio.run(catalog.page(None, 2))
+    assert page_reads(database) == 2
+
+
+def test_stock_changes_elsewhere_reload_only_the_changed_book(database):
+    catalog = CatalogCache()
+    asyncio.run(catalog.page(None, 3))
+
+    database.write("123", CHANGED, BOOKS[1][:4] + (0,) + BOOKS[1][5:])
+    rows, _ = asyncio.run(catalog.page(None, 3))
+
+    assert rows[1][4] == 0
+    assert page_reads(database) == 1
+    assert database.statements.count(catalog_module.BOOK_QUERY.sql) == 1
+    assert catalog.version == 8 and catalog.invalidations == 0
+
+
+def test_added_and_removed_books_reload_the_pages(database):
+    catalog = CatalogCache()
+    asyncio.run(catalog.page(None, 3))
+
+    database.write("150", ADDED, ("150", "New", "Someone", 5, 1, "user1"))
+    rows, _ = asyncio.run(catalog.page(None, 3))
+    assert [row[0] for row in rows] == ["100", "123", "150"]
+
+    database.write("100", REMOVED)
+    rows, _ = asyncio.run(catalog.page(None, 3))
+    assert [row[0] for row in rows] == ["123", "150", "200"]
+    assert page_reads(database) == 3
+
+
+def test_a_long_backlog_drops_everything(database, monkeypatch):
+    monkeypatch.setattr(catalog_module, "CHANGE_LOG_VERSIONS", 2)
+    catalog = CatalogCache()
+    asyncio.run(catalog.get_books(["100", "123"]))
+    for _ in range(3):
+        database.write("200", CHANGED, BOOKS[2])
+
+    asyncio.run(catalog.sync())
+    assert catalog.invalidations == 1 and len(catalog.entries) == 0
+    assert catalog.version == 10
+
+
+def test_publish_records_changes_and_patches_the_cache(database, monkeypatch):
+    recorded = []
+
+    async def bump_catalog_version(changes):
+        recorded.extend(changes)
+        return 8
+
+    monkeypatch.setattr(catalog_module, "bump_catalog_version", bump_catalog_version)
+    catalog = CatalogCache()
+    asyncio.run(catalog.page(None, 3))
+
+    # OrderRequest.barcode is an int; changes and cache entries are keyed by str
+    asyncio.run(catalog.publish(quantities={123: 2}))
+
+    assert recorded == [("123", CHANGED)]
+    assert catalog.version == 8
+    assert asyncio.run(catalog.get_books(["123"]))["123"][4] == 2
+    assert len(catalog.pages) == 1
+
+
+def test_publish_after_a_foreign_write_leaves_the_version_to_sync(database, monkeypatch):
+    async def bump_catalog_version(changes):
+        return 9
+
+    monkeypatch.setattr(catalog_module, "bump_catalog_version", bump_catalog_version)
+    catalog = CatalogCache()
+    asyncio.run(catalog.sync())
+    asyncio.run(catalog.publish(added=[("150", "New", "Someone", 5, 1, "user1")]))
+
+    assert catalog.version == 7
+    assert catalog.entries.get("150")[1] == "New"
+    assert len(catalog.pages) == 0
+
+
+def test_suggest_quantity_with_int_barcode():
+    index = SuggestIndex()
+    index.load([("123", "Emma", "Jane Austen", 3), ("124", "Emma", "Someone Else", 5)])
+    index.set_quantity(123, 9)
+    assert [book["barcode"] for book in index.suggest("emma")] == ["123", "124"]
@@ -0,0 +1,86 @@
+from app.utils.compression import CompressionMiddleware, parse_accept_encoding
+import asyncio
+import gzip
+import pytest
+
+BODY = b"x" * 4096
+
+
+def app_sending(*bodies, status=200, headers=()):
+    """An ASGI app sending `bodies` as consecutive chunks."""
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status, "headers": list(headers)})
+        for position, body in enumerate(bodies):
+            await send({"type": "http.response.body", "body": body, "more_body": position < len(bodies) - 1})
+    return app
+
+
+def call(app, accept_encoding="gzip"):
+    """Run the middleware around `app`; returns (headers, body)."""
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def receive():
+        return {"type": "http.request"}
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=1024)(scope, receive, send))
+    headers = {name.decode().lower(): value.decode() for name, value in messages[0]["headers"]}
+    return headers, b"".join(message.get("body", b"") for message in messages[1:])
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip, br;q=0.5, zstd;q=x, ,*;q=0") == {"gzip": 1.0, "br": 0.5, "zstd": 0.0, "*": 0.0}
+
+
+@pytest.mark.parametrize("accept, expected", [("gzip", "gzip"), ("*", "gzip"), ("gzip;q=0", None), ("identity", None)])
+def test_choose(accept, expected):
+    factory = CompressionMiddleware(None).choose(accept)
+    assert (factory().name if factory else None) == expected
+
+
+def test_large_bodies_are_compressed():
+    headers, body = call(app_sending(BODY, headers=[(b"content-length", b"4096"), (b"etag", b'"v1"')]))
+    assert headers["content-encoding"] == "gzip"
+    assert "content-length" not in headers
+    assert headers["etag"] == 'W/"v1"'
+    assert headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(body) == BODY
+
+
+def test_streamed_bodies_are_compressed_chunk_by_chunk():
+    headers, body = call(app_sending(b"a" * 10, b"b" * 10, b""))
+    assert headers["content-encoding"] == "gzip"
+    assert gzip.decompress(body) == b"a" * 10 + b"b" * 10
+
+
+@pytest.mark.parametrize("app", [
+    app_sending(b"small"),
+    app_sending(BODY, headers=[(b"content-type", b"image/png")]),
+    app_sending(BODY, headers=[(b"content-encoding", b"br")]),
+    app_sending(b"", status=304),
+])
+def test_passthrough(app):
+    headers, body = call(app)
+    assert headers.get("content-encoding") in (None, "br")
+    assert len(body) in (0, 5, len(BODY))
+
+
+@pytest.mark.parametrize("accept", ["gzip", "identity", ""])
+@pytest.mark.parametrize("app", [app_sending(BODY), app_sending(b"small"), app_sending(b"", status=304)])
+def test_negotiable_responses_vary_on_accept_encoding(app, accept):
+    headers, _ = call(app, accept)
+    assert headers["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.parametrize("accept", ["gzip", "identity"])
+@pytest.mark.parametrize("app", [
+    app_sending(BODY, headers=[(b"content-type", b"image/png")]),
+    app_sending(BODY, headers=[(b"content-encoding", b"br")]),
+    app_sending(b"", status=204),
+])
+def test_responses_never_compressed_do_not_vary(app, accept):
+    headers, _ = call(app, accept)
+    assert "vary" not in headers
@@ -0,0 +1,46 @@
+from app.utils.conditional import body_etag, http_date, is_not_modified, not_modified, version_etag
+from datetime import datetime, timedelta
+from starlette.requests import Request
+
+UPDATED_AT = datetime(2024, 5, 1, 12, 0, 0, 500000)
+
+
+def request(**headers) -> Request:
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def test_etags():
+    assert version_etag("books", 7) == 'W/"books-7"'
+    assert body_etag(b"x") == body_etag(b"x") != body_etag(b"y")
+
+
+def test_if_none_match_uses_weak_comparison():
+    etag = version_etag("books", 7)
+    assert is_not_modified(request(if_none_match='"books-7"'), etag)
+    assert is_not_modified(request(if_none_match='W/"books-6", W/"books-7"'), etag)
+    assert is_not_modified(request(if_none_match="*"), etag)
+    assert not is_not_modified(request(if_none_match='W/"books-6"'), etag)
+
+
+def test_if_modified_since_is_ignored_when_if_none_match_is_present():
+    etag = version_etag("books", 7)
+    since = http_date(UPDATED_AT + timedelta(days=1))
+    assert not is_not_modified(request(if_none_match='W/"books-6"', if_modified_since=since), etag, UPDATED_AT)
+
+
+def test_if_modified_since():
+    etag = version_etag("books", 7)
+    assert is_not_modified(request(if_modified_since=http_date(UPDATED_AT)), etag, UPDATED_AT)
+    earlier = http_date(UPDATED_AT - timedelta(seconds=1))
+    assert not is_not_modified(request(if_modified_since=earlier), etag, UPDATED_AT)
+    assert not is_not_modified(request(if_modified_since="yesterday"), etag, UPDATED_AT)
+    assert not is_not_modified(request(), etag, UPDATED_AT)
+
+
+def test_not_modified_carries_the_validators():
+    response = not_modified('W/"books-7"', UPDATED_AT, "private, no-cache")
+    assert response.status_code == 304
+    assert response.headers["etag"] == 'W/"books-7"'
+    assert response.headers["last-modified"] == "Wed, 01 May 2024 12:00:00 GMT"
+    assert response.headers["cache-control"] == "private, no-cache"
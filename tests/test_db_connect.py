@@ -0,0 +1,37 @@
+from app.database import db_connect
+from mysql.connector import aio
+from mysql.connector.constants import ClientFlag
+import asyncio
+
+
+def test_connection_config_is_accepted_by_the_aio_connector():
+    async def build():
+        # The constructor applies client_flags without contacting the server
+        return aio.MySQLConnection(autocommit=True, **db_connect.get_connection_config())
+
+    connection = asyncio.run(build())
+    assert connection.isset_client_flag(ClientFlag.FOUND_ROWS)
+    assert connection.isset_client_flag(ClientFlag.PROTOCOL_41)  # The driver defaults are kept
+
+
+def test_aio_connection_opens_with_the_pool_config(mysql_config):
+    async def scenario():
+        connection = await aio.connect(autocommit=True, **db_connect.get_connection_config())
+        try:
+            cursor = await connection.cursor()
+            await cursor.execute("SELECT 1")
+            assert await cursor.fetchall() == [(1,)]
+            await cursor.close()
+        finally:
+            await connection.close()
+
+    asyncio.run(scenario())
+
+
+def test_update_rowcount_counts_matched_rows(database):
+    async def scenario():
+        async with database.transaction() as tx:
+            await tx.execute("UPDATE catalog_versions SET version = version WHERE name = 'books'")
+            return tx.rowcount
+
+    assert asyncio.run(scenario()) == 1
@@ -0,0 +1,103 @@
+from app.database import explain_check
+from app.database.explain_check import QUERIES
+from datetime import datetime, timedelta
+import asyncio
+import mysql.connector
+import os
+import pytest
+
+# Rows seeded into each table, so that a full scan is estimated well above MIN_ROWS
+SEED_ROWS = int(os.getenv("EXPLAIN_SEED_ROWS", "2000"))
+# Scans of tables estimated below this size are ignored, as with the CLI's --min-rows
+MIN_ROWS = int(os.getenv("EXPLAIN_MIN_ROWS", "100"))
+SEED = "explain-seed-"
+
+SEED_CLEANUP = [
+    f"DELETE FROM cart WHERE barcode LIKE '{SEED}%'",
+    f"DELETE FROM orders WHERE transaction_id LIKE '{SEED}%'",
+    f"DELETE FROM books WHERE barcode LIKE '{SEED}%'",
+    f"DELETE FROM users WHERE username LIKE '{SEED}%'",
+]
+
+
+@pytest.fixture(scope="module")
+def seeded(mysql_config):
+    """SEED_ROWS varied rows in users, books, orders and cart, with fresh index statistics."""
+    from app.database import db_connect, migrations
+
+    asyncio.run(migrations.migrate())
+    asyncio.run(db_connect.close_async_pool())
+    connection = mysql.connector.connect(**mysql_config)
+    cursor = connection.cursor()
+    try:
+        for statement in SEED_CLEANUP:
+            cursor.execute(statement)
+        cursor.executemany(
+            "INSERT INTO users (username, password, firstname, lastname, address, phone, mailid, usertype) "
+            "VALUES (%s, 'x', %s, %s, 'address', 'phone', %s, %s)",
+            [
+                (f"{SEED}{i}", f"first{i % 97}", f"last{i % 89}", f"{SEED}{i}@example.com",
+                 ("user", "seller", "admin")[i % 3])
+                for i in range(SEED_ROWS)
+            ]
+        )
+        cursor.execute(f"SELECT id FROM users WHERE username LIKE '{SEED}%' ORDER BY id")
+        user_ids = [row[0] for row in cursor.fetchall()]
+        cursor.executemany(
+            "INSERT INTO books (barcode, name, author, price, quantity, added_by) VALUES (%s, %s, %s, %s, %s, %s)",
+            [
+                (f"{SEED}{i}", f"{'Harry ' if i % 50 == 0 else ''}Book {i}", f"Author {i % 113}",
+                 i % 200, i % 30, f"{SEED}{i % 40}")
+                for i in range(SEED_ROWS)
+            ]
+        )
+        start = datetime(2023, 1, 1)
+        cursor.executemany(
+            "INSERT INTO orders (user_id, barcode, order_date, transaction_id, total_amount, status, quantity) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            [
+                (user_ids[i % 50], f"{SEED}{i}", start + timedelta(hours=i), f"{SEED}{i}", i % 500,
+                 ("Order Placed", "In Transit", "Order Delivered", "Order Canceled")[i % 4], 1 + i % 5)
+                for i in range(SEED_ROWS)
+            ]
+        )
+        cursor.executemany(
+            "INSERT INTO cart (user_id, barcode, quantity) VALUES (%s, %s, %s)",
+            [(user_ids[i], f"{SEED}{i}", 1 + i % 5) for i in range(SEED_ROWS)]
+        )
+        connection.commit()
+        for table in ("users", "books", "orders", "cart"):
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+        yield
+    finally:
+        for statement in SEED_CLEANUP:
+            cursor.execute(statement)
+        connection.commit()
+        cursor.close()
+        connection.close()
+
+
+def test_query_names_are_unique():
+    names = [checked.name for checked in QUERIES]
+    assert len(names) == len(set(names))
+
+
+def test_every_sortable_column_is_checked():
+    names = {checked.name for checked in QUERIES}
+    for table, schema in explain_check.TABLES.items():
+        for column in schema["sortable"]:
+            assert f"search: {table} sorted by {column}" in names
+
+
+@pytest.mark.parametrize("checked", QUERIES, ids=[checked.name for checked in QUERIES])
+def test_query_uses_an_index(database, seeded, checked):
+    async def run():
+        try:
+            return await explain_check.explain(checked)
+        finally:
+            await database.close_async_pool()
+
+    plan = asyncio.run(run())
+    scans = [row for row in plan if row.get("type") == "ALL" and (row.get("rows") or 0) >= MIN_ROWS]
+    assert checked.full_scan_ok or not scans, plan
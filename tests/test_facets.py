@@ -0,0 +1,30 @@
+from app.books.facets import facet_delta, price_bucket, stock_bucket, stock_delta
+from collections import Counter
+
+
+def test_buckets():
+    assert [price_bucket(price) for price in (None, 0, 9, 10, 99, 100)] == [
+        "0-10", "0-10", "0-10", "10-25", "50-100", "100+"
+    ]
+    assert (stock_bucket(None), stock_bucket(0), stock_bucket(3)) == ("out_of_stock", "out_of_stock", "in_stock")
+
+
+def test_facet_delta():
+    assert facet_delta(new=("Austen", 12, 3)) == Counter({
+        ("author", "Austen"): 1, ("price", "10-25"): 1, ("stock", "in_stock"): 1
+    })
+    assert +facet_delta(("Austen", 12, 3), ("Austen", 12, 3)) == Counter()
+
+    moved = facet_delta(("Austen", 12, 3), ("Brontë", 30, 0))
+    assert {key: change for key, change in moved.items() if change} == {
+        ("author", "Austen"): -1, ("author", "Brontë"): 1,
+        ("price", "10-25"): -1, ("price", "25-50"): 1,
+        ("stock", "in_stock"): -1, ("stock", "out_of_stock"): 1,
+    }
+    assert facet_delta(old=(None, None, None))[("author", "")] == -1
+
+
+def test_stock_delta_only_moves_between_buckets():
+    assert stock_delta(5, 2) == Counter()
+    assert stock_delta(1, 0) == Counter({("stock", "in_stock"): -1, ("stock", "out_of_stock"): 1})
+    assert stock_delta(0, 4) == Counter({("stock", "out_of_stock"): -1, ("stock", "in_stock"): 1})
@@ -0,0 +1,16 @@
+from app.search import fulltext
+
+
+def test_tokenize_drops_short_words_stopwords_and_duplicates():
+    assert fulltext.tokenize("The Lord of the RINGS, lord") == ["lord", "rings"]
+    assert fulltext.tokenize("a an it") == []
+
+
+def test_tokenize_caps_the_number_of_terms():
+    text = " ".join(f"word{n}" for n in range(fulltext.MAX_TERMS + 5))
+    assert len(fulltext.tokenize(text)) == fulltext.MAX_TERMS
+
+
+def test_boolean_query_requires_every_prefix():
+    assert fulltext.boolean_query("tolk lord") == "+tolk* +lord*"
+    assert fulltext.boolean_query("+x* of") == ""
@@ -0,0 +1,39 @@
+from app.database import migrations
+from mysql.connector import errors
+import asyncio
+import pytest
+
+
+class FakeSession:
+    """Records statements; fails the first one containing `fail_on`, as a crash mid-migration would."""
+
+    def __init__(self, fail_on=None):
+        self.statements = []
+        self.fail_on = fail_on
+
+    async def execute(self, query, params=None):
+        statement = " ".join(query.split())
+        if self.fail_on and self.fail_on in statement:
+            self.fail_on = None
+            raise errors.OperationalError("Lost connection to MySQL server during query")
+        self.statements.append(statement)
+        return {"data": []}
+
+
+def cart_migration():
+    return next(migration for migration in migrations.MIGRATIONS if migration.version == 7)
+
+
+def test_cart_merge_and_delete_commit_together():
+    session = FakeSession()
+    asyncio.run(migrations.apply_migration(session, cart_migration()))
+    kinds = [statement.split()[0] for statement in session.statements]
+    assert kinds == ["START", "UPDATE", "DELETE", "COMMIT", "ALTER", "INSERT"]
+
+
+def test_a_failure_between_merge_and_delete_rolls_the_merge_back():
+    session = FakeSession(fail_on="DELETE c FROM cart")
+    with pytest.raises(errors.OperationalError):
+        asyncio.run(migrations.apply_migration(session, cart_migration()))
+    kinds = [statement.split()[0] for statement in session.statements]
+    assert kinds == ["START", "UPDATE", "ROLLBACK"]
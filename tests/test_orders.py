@@ -0,0 +1,80 @@
+from app.books import catalog_cache as catalog_module
+from app.database import db_connect
+from app.orders import ordermanagement
+from app.schemas.schemas import OrderRequest
+from fastapi import HTTPException
+from tests.fakes import FakeAsyncConnection, fake_transactions
+from collections import Counter
+import asyncio
+import os
+import time
+import uuid
+
+# Orders fired at once by the concurrency test, and the copies they compete for
+PARALLEL_ORDERS = int(os.getenv("ORDER_TEST_PARALLEL_ORDERS", "300"))
+PARALLEL_STOCK = int(os.getenv("ORDER_TEST_STOCK", "25"))
+
+USER = {"id": 1, "username": "user1", "usertype": "user", "token_version": 0}
+
+
+async def bump_version(changes):
+    return 1
+
+
+def test_order_binds_the_barcode_as_text(monkeypatch):
+    connection = FakeAsyncConnection(results={
+        "SELECT quantity FROM books WHERE barcode = %s": (["quantity"], [(4,)]),
+    })
+    monkeypatch.setattr(db_connect, "transaction", fake_transactions(connection))
+    monkeypatch.setattr(catalog_module, "bump_catalog_version", bump_version)
+
+    asyncio.run(ordermanagement.order_book(OrderRequest(barcode=123, quantity=1), USER))
+
+    bound = [params for query, params in zip(connection.statements, connection.params) if "barcode = %s" in query]
+    assert bound and all("123" in params and 123 not in params for params in bound)
+
+
+def test_hundreds_of_parallel_orders_sell_exactly_the_stock(database, record_property):
+    barcode = str(uuid.uuid4().int % 10 ** 12)
+    username = f"order-test-{barcode}"
+
+    async def setup():
+        await database.execute_query_async(
+            "INSERT INTO users (username, password, usertype) VALUES (%s, '', 'user')", (username,)
+        )
+        await database.execute_query_async(
+            "INSERT INTO books (barcode, name, author, price, quantity, added_by) VALUES (%s, 'Few copies', 'A', 10, %s, %s)",
+            (barcode, PARALLEL_STOCK, username),
+        )
+        result = await database.execute_query_async("SELECT id FROM users WHERE username = %s", (username,))
+        return {"id": result["data"][0][0], "username": username, "usertype": "user", "token_version": 0}
+
+    async def place(user):
+        try:
+            await ordermanagement.order_book(OrderRequest(barcode=int(barcode), quantity=1), user)
+            return 200
+        except HTTPException as e:
+            return e.status_code
+
+    async def scenario():
+        user = await setup()
+        try:
+            started = time.perf_counter()
+            outcomes = await asyncio.gather(*(place(user) for _ in range(PARALLEL_ORDERS)))
+            elapsed = time.perf_counter() - started
+            stock = await database.execute_query_async("SELECT quantity FROM books WHERE barcode = %s", (barcode,))
+            orders = await database.execute_query_async("SELECT COUNT(*) FROM orders WHERE barcode = %s", (barcode,))
+            return Counter(outcomes), stock["data"][0][0], orders["data"][0][0], elapsed
+        finally:
+            await database.execute_query_async("DELETE FROM orders WHERE barcode = %s", (barcode,))
+            await database.execute_query_async("DELETE FROM books WHERE barcode = %s", (barcode,))
+            await database.execute_query_async("DELETE FROM users WHERE username = %s", (username,))
+            await database.close_async_pool()
+
+    outcomes, stock, orders, elapsed = asyncio.run(scenario())
+    rate = PARALLEL_ORDERS / elapsed
+    record_property("orders_per_second", round(rate))
+    print(f"{PARALLEL_ORDERS} parallel orders for {PARALLEL_STOCK} copies: {rate:.0f} orders/s")
+
+    assert outcomes == {200: PARALLEL_STOCK, 400: PARALLEL_ORDERS - PARALLEL_STOCK}
+    assert stock == 0 and orders == PARALLEL_STOCK
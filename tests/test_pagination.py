@@ -0,0 +1,63 @@
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_predicate, page_clause, split_page
+from datetime import datetime
+from fastapi import HTTPException
+import pytest
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([datetime(2024, 5, 1, 12, 30), 42])
+    assert "=" not in cursor
+    assert decode_cursor(cursor, 2) == ["2024-05-01 12:30:00", 42]
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", encode_cursor([1, 2]), "bnVsbA"])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(cursor, 1)
+    assert raised.value.status_code == 400
+
+
+def test_keyset_predicate_expands_the_row_comparison():
+    predicate, params = keyset_predicate(["order_date", "order_id"], ["2024-01-01", 7])
+    assert predicate == "((order_date > %s) OR (order_date = %s AND order_id > %s))"
+    assert params == ["2024-01-01", "2024-01-01", 7]
+
+    predicate, _ = keyset_predicate(["id"], [3], descending=True)
+    assert predicate == "((id < %s))"
+
+
+def test_page_clause():
+    predicate, params, order_and_limit, limit_params = page_clause(["id"], None, 10)
+    assert (predicate, params) == (None, [])
+    assert (order_and_limit, limit_params) == (" ORDER BY id ASC LIMIT %s", [11])
+
+    predicate, params, order_and_limit, limit_params = page_clause(["name", "id"], encode_cursor(["b", 2]), 5, descending=True)
+    assert predicate == "((name < %s) OR (name = %s AND id < %s))"
+    assert params == ["b", "b", 2]
+    assert (order_and_limit, limit_params) == (" ORDER BY name DESC, id DESC LIMIT %s", [6])
+
+
+def test_page_sizes_share_one_statement_text():
+    first = page_clause(["id"], None, 10)
+    assert page_clause(["id"], None, 500)[2] == first[2]
+
+
+def test_split_page():
+    rows = [(1,), (2,), (3,)]
+    assert split_page(rows, 3, key=lambda row: row) == (rows, None)
+    page, cursor = split_page(rows, 2, key=lambda row: row)
+    assert page == [(1,), (2,)]
+    assert decode_cursor(cursor, 1) == [2]
+
+
+def test_keyset_predicate_with_null_cursor_values():
+    keys = ["name", "barcode"]
+    assert keyset_predicate(keys, [None, "b2"], nullable=["name"]) == (
+        "((name IS NOT NULL) OR (name IS NULL AND barcode > %s))", ["b2"]
+    )
+    assert keyset_predicate(keys, [None, "b2"], descending=True, nullable=["name"]) == (
+        "((name IS NULL AND barcode < %s))", ["b2"]
+    )
+    assert keyset_predicate(keys, ["Emma", "b1"], descending=True, nullable=["name"]) == (
+        "(((name < %s OR name IS NULL)) OR (name = %s AND barcode < %s))", ["Emma", "Emma", "b1"]
+    )
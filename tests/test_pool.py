@@ -0,0 +1,162 @@
+from app.database import pool as pool_module
+from app.database.pool import AsyncConnectionPool, StatementCursor
+from mysql.connector import errors
+from tests.fakes import FakeAsyncConnection
+import asyncio
+import pytest
+
+
+class HangingPingConnection(FakeAsyncConnection):
+    """A connection whose ping never answers, as over a dead network link."""
+
+    async def is_connected(self):
+        await asyncio.Event().wait()
+
+
+def test_replacement_keeps_the_discarded_connections_slot(monkeypatch):
+    async def connect(**config):
+        return FakeAsyncConnection()
+
+    monkeypatch.setattr(pool_module.aio, "connect", connect)
+
+    async def run():
+        pool = AsyncConnectionPool(size=1, max_overflow=1, timeout=1.0)
+        regular = await pool.acquire()
+        overflow = await pool.acquire()
+        assert (regular.overflow, overflow.overflow) == (False, True)
+
+        waiting = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0)
+        # Losing the regular connection while the overflow one is out must not turn its
+        # replacement into an overflow connection
+        await pool.release(regular, discard=True)
+        replacement = await waiting
+        assert regular.connection.closed
+        assert not replacement.overflow
+        assert pool.snapshot()["overflow_in_use"] == 1
+
+        await pool.release(overflow)
+        await pool.release(replacement)
+        snapshot = pool.snapshot()
+        assert (snapshot["opened"], snapshot["idle"], snapshot["overflow_in_use"]) == (1, 1, 0)
+
+    asyncio.run(run())
+
+
+def test_replacement_for_an_overflow_connection_stays_overflow(monkeypatch):
+    async def connect(**config):
+        return FakeAsyncConnection()
+
+    monkeypatch.setattr(pool_module.aio, "connect", connect)
+
+    async def run():
+        pool = AsyncConnectionPool(size=1, max_overflow=1, timeout=1.0)
+        regular = await pool.acquire()
+        overflow = await pool.acquire()
+
+        waiting = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0)
+        await pool.release(overflow, discard=True)
+        replacement = await waiting
+        assert replacement.overflow
+
+        await pool.release(replacement)
+        await pool.release(regular)
+        snapshot = pool.snapshot()
+        assert (snapshot["opened"], snapshot["idle"], snapshot["overflow_in_use"]) == (1, 1, 0)
+
+    asyncio.run(run())
+
+
+def test_a_checkout_cancelled_during_the_ping_does_not_leak_the_connection(monkeypatch):
+    connections = []
+
+    async def connect(**config):
+        connections.append(HangingPingConnection())
+        return connections[-1]
+
+    monkeypatch.setattr(pool_module.aio, "connect", connect)
+
+    async def run():
+        pool = AsyncConnectionPool(size=1, timeout=0.1, ping_interval=0)
+        pooled = await pool.acquire()
+        await pool.release(pooled)
+        pooled.last_used -= 1  # Idle long enough to be pinged
+
+        checkout = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0)
+        checkout.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await checkout
+
+        assert connections[0].closed
+        snapshot = pool.snapshot()
+        assert (snapshot["opened"], snapshot["idle"], snapshot["in_use"]) == (0, 0, 0)
+        # The slot is free again, so the next checkout opens a fresh connection
+        assert (await pool.acquire()).connection is connections[1]
+
+    asyncio.run(run())
+
+
+def test_close_fails_waiters_and_closes_checked_out_connections(monkeypatch):
+    async def connect(**config):
+        return FakeAsyncConnection()
+
+    monkeypatch.setattr(pool_module.aio, "connect", connect)
+
+    async def run():
+        pool = AsyncConnectionPool(size=1, timeout=1.0)
+        pooled = await pool.acquire()
+        waiting = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0)
+
+        await pool.close()
+        with pytest.raises(errors.PoolError):
+            await waiting
+        await pool.release(pooled)
+        assert pooled.connection.closed
+        assert pool.snapshot()["opened"] == 0
+        with pytest.raises(errors.PoolError):
+            await pool.acquire()
+
+    asyncio.run(run())
+
+
+class FakeProtocolConnection:
+    """Records the prepared-statement commands a cursor sends."""
+
+    charset = "utf8mb4"
+    get_warnings = False
+    unread_result = False
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.commands = []
+
+    def add_cursor(self, cursor):
+        pass
+
+    async def cmd_stmt_prepare(self, sql):
+        self.commands.append("prepare")
+        return {"statement_id": 1, "parameters": [None], "columns": []}
+
+    async def cmd_stmt_reset(self, statement_id):
+        self.commands.append("reset")
+
+    async def cmd_stmt_execute(self, statement_id, data=(), parameters=()):
+        self.commands.append("execute")
+        return {"affected_rows": 1, "insert_id": 0, "warning_count": 0, "status_flag": 0}
+
+
+def test_statement_cursor_reexecutes_in_one_round_trip():
+    async def run():
+        connection = FakeProtocolConnection()
+        cursor = StatementCursor(connection)
+        sql = "UPDATE books SET quantity = quantity - 1 WHERE barcode = %s"
+        await cursor.execute(sql, ("1",))
+        await cursor.execute(sql, ("2",))
+        await cursor.execute(sql, ("3",))
+        assert cursor.rowcount == 1
+        return connection.commands
+
+    assert asyncio.run(run()) == ["prepare", "reset", "execute", "execute", "execute"]
@@ -0,0 +1,70 @@
+from app.users import user_routes
+import asyncio
+import json
+
+
+def track_concurrency(monkeypatch, results):
+    """Replace the profile fetches with ones recording how many run at the same time."""
+    state = {"running": 0, "peak": 0}
+
+    def fake(name):
+        async def fetch(*args):
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+            await asyncio.sleep(0.01)
+            state["running"] -= 1
+            return results[name]
+        return fetch
+
+    for name in results:
+        monkeypatch.setattr(user_routes, name, fake(name))
+    return state
+
+
+def profile(user):
+    response = asyncio.run(user_routes.get_profile(user=user, recent=10))
+    return json.loads(response.body)
+
+
+def test_admin_profile_queries_are_bounded(monkeypatch):
+    monkeypatch.setattr(user_routes, "PROFILE_QUERY_CONCURRENCY", 2)
+    state = track_concurrency(monkeypatch, {
+        "fetch_profile_user": {"id": 1},
+        "fetch_own_cart": ([], None),
+        "fetch_recent_orders": [],
+        "fetch_order_totals": {},
+        "fetch_catalog_totals": {},
+        "fetch_table_counts": {"users": 1, "carts": 0, "cart_items": 0},
+    })
+    body = profile({"id": 1, "usertype": "admin"})
+    assert state["peak"] == 2
+    assert body["cart_next_cursor"] is None
+
+
+def test_admin_profile_queries_all_run_at_once_by_default(monkeypatch):
+    state = track_concurrency(monkeypatch, {
+        "fetch_profile_user": {"id": 1},
+        "fetch_own_cart": ([], None),
+        "fetch_recent_orders": [],
+        "fetch_order_totals": {},
+        "fetch_catalog_totals": {},
+        "fetch_table_counts": {"users": 1, "carts": 0, "cart_items": 0},
+    })
+    profile({"id": 1, "usertype": "admin"})
+    assert state["peak"] == 6
+
+
+def test_own_cart_returns_its_cursor(monkeypatch):
+    async def load_cart(user, username, limit, cursor):
+        assert user["usertype"] == "user"
+        return [tuple(range(len(user_routes.CART_FIELDS)))], "next-page"
+
+    monkeypatch.setattr(user_routes, "load_cart", load_cart)
+    track_concurrency(monkeypatch, {
+        "fetch_profile_user": {"id": 7},
+        "fetch_own_orders": [],
+        "fetch_own_books": [],
+    })
+    body = profile({"id": 7, "usertype": "user"})
+    assert len(body["cart_items"]) == 1
+    assert body["cart_next_cursor"] == "next-page"
@@ -0,0 +1,93 @@
+from app.database import db_connect
+from app.utils import export
+from app.utils.export import ndjson_chunks
+from app.utils.responses import dumps, format_rows
+from datetime import date, datetime
+from decimal import Decimal
+import asyncio
+import orjson
+import pytest
+
+COLUMNS = ["id", "title", "price", "added", "note", "100%"]
+ROWS = [
+    (1, 'He said "a","b"', Decimal("9.50"), datetime(2024, 5, 1, 12, 30), None, True),
+    (2, "Ünïcode, commas\\", 12.25, date(2024, 1, 2), "set", False),
+    (3, "", None, None, b"raw, bytes", None),
+]
+
+
+def as_dicts(rows):
+    return [dict(zip(COLUMNS, row)) for row in rows]
+
+
+def test_records_match_encoding_dicts():
+    encoded = dumps({"rows": format_rows(COLUMNS, ROWS)})
+    assert orjson.loads(encoded)["rows"] == orjson.loads(dumps(as_dicts(ROWS)))
+
+
+def test_single_row_and_uniform_columns():
+    rows = [("a,b", 1)]
+    assert orjson.loads(dumps(format_rows(["x", "y"], rows))) == [{"x": "a,b", "y": 1}]
+
+
+def test_empty_records_are_falsy():
+    assert format_rows(COLUMNS, []) == []
+    assert format_rows(COLUMNS, [], "columnar") == {"columns": COLUMNS, "rows": []}
+
+
+def test_ndjson_export_writes_one_object_per_line():
+    async def stream():
+        yield COLUMNS, ROWS[:2]
+        yield COLUMNS, []
+        yield COLUMNS, ROWS[2:]
+
+    async def collect():
+        return b"".join([chunk async for chunk in ndjson_chunks(stream())])
+
+    lines = asyncio.run(collect()).split(b"\n")
+    assert lines[-1] == b""
+    assert [orjson.loads(line) for line in lines[:-1]] == orjson.loads(dumps(as_dicts(ROWS)))
+
+
+def test_keyset_chunks_page_by_key_without_holding_a_connection(monkeypatch):
+    table = [(i, f"book {i}") for i in range(1, 6)]
+    queries = []
+
+    async def execute_query_async(query, params):
+        queries.append((query, params))
+        after = params[1] if len(params) == 3 else 0
+        rows = [row for row in table if row[0] > after and row[1] != "hidden"][:params[-1]]
+        return {"columns": ["id", "title"], "data": rows}
+
+    monkeypatch.setattr(db_connect, "execute_query_async", execute_query_async)
+
+    async def collect():
+        return [chunk async for chunk in export.keyset_chunks(
+            "SELECT id, title FROM books", ["title <> %s"], ["hidden"], ["id"], chunk_size=2
+        )]
+
+    chunks = asyncio.run(collect())
+    assert [rows for _, rows in chunks] == [table[:2], table[2:4], table[4:]]
+    assert queries[0] == ("SELECT id, title FROM books WHERE title <> %s ORDER BY id LIMIT %s", ("hidden", 2))
+    assert queries[1] == ("SELECT id, title FROM books WHERE title <> %s AND ((id > %s)) ORDER BY id LIMIT %s",
+                          ("hidden", 2, 2))
+    assert len(queries) == 3
+
+
+def test_exports_beyond_the_limit_are_refused_until_one_finishes(monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_MAX_CONCURRENT", 1)
+
+    async def stream():
+        yield COLUMNS, ROWS
+
+    async def run():
+        response = export.export_response(stream(), "ndjson", "books")
+        with pytest.raises(export.ExportBusyError):
+            export.export_response(stream(), "ndjson", "books")
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        assert body.count(b"\n") == len(ROWS)
+        response = export.export_response(stream(), "ndjson", "books")
+        assert [chunk async for chunk in response.body_iterator]
+        assert export.active_exports == 0
+
+    asyncio.run(run())
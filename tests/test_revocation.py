@@ -0,0 +1,96 @@
+from app.auth import revocation
+from app.auth.revocation import (
+    MemoryRevocationStore, RevocationStore, SQLiteRevocationStore, create_revocation_store, token_key
+)
+import asyncio
+import pytest
+import threading
+import time
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryRevocationStore()
+    return SQLiteRevocationStore(str(tmp_path / "revoked.sqlite3"), purge_interval=0)
+
+
+def test_revoked_until_expiry(store, monkeypatch):
+    now = time.time()
+    asyncio.run(store.revoke("live", now + 60))
+    asyncio.run(store.revoke("expired", now - 1))
+    assert asyncio.run(store.is_revoked("live"))
+    assert not asyncio.run(store.is_revoked("expired"))
+    assert not asyncio.run(store.is_revoked("unknown"))
+
+    monkeypatch.setattr(revocation.time, "time", lambda: now + 120)
+    assert not asyncio.run(store.is_revoked("live"))
+    assert asyncio.run(store.stats())["revoked"] == 0
+
+
+def test_memory_store_keeps_the_latest_expiry(monkeypatch):
+    store = MemoryRevocationStore()
+    now = time.time()
+    asyncio.run(store.revoke("jti", now + 10))
+    asyncio.run(store.revoke("jti", now + 100))
+    monkeypatch.setattr(revocation.time, "time", lambda: now + 50)
+    assert asyncio.run(store.is_revoked("jti"))
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "revoked.sqlite3")
+    asyncio.run(SQLiteRevocationStore(path).revoke("jti", time.time() + 60))
+    assert asyncio.run(SQLiteRevocationStore(path).is_revoked("jti"))
+
+
+def test_sqlite_store_queries_off_the_event_loop_thread(tmp_path, monkeypatch):
+    store = SQLiteRevocationStore(str(tmp_path / "revoked.sqlite3"))
+    lookup, threads = store._is_revoked, []
+
+    def recording_lookup(jti):
+        threads.append(threading.get_ident())
+        return lookup(jti)
+
+    monkeypatch.setattr(store, "_is_revoked", recording_lookup)
+    assert not asyncio.run(store.is_revoked("jti"))
+    assert threads and threads[0] != threading.get_ident()
+
+
+def test_store_interface_is_abstract():
+    with pytest.raises(TypeError):
+        RevocationStore()
+
+    class Partial(RevocationStore):
+        async def revoke(self, jti, expires_at):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_token_key():
+    assert token_key({"jti": "abc"}, "token") == "abc"
+    assert token_key({}, "token") == token_key({}, "token") != token_key({}, "other")
+
+
+def test_create_revocation_store(monkeypatch, tmp_path):
+    monkeypatch.setenv("REVOCATION_BACKEND", "sqlite")
+    monkeypatch.setenv("REVOCATION_DB_PATH", str(tmp_path / "revoked.sqlite3"))
+    assert isinstance(create_revocation_store(), SQLiteRevocationStore)
+    monkeypatch.setenv("REVOCATION_BACKEND", "redis")
+    with pytest.raises(ValueError):
+        create_revocation_store()
+
+
+def test_self_contained_tokens_share_revocations_between_workers(monkeypatch, tmp_path):
+    monkeypatch.delenv("REVOCATION_BACKEND", raising=False)
+    monkeypatch.setenv("REVOCATION_DB_PATH", str(tmp_path / "revoked.sqlite3"))
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert isinstance(create_revocation_store(), MemoryRevocationStore)
+    assert isinstance(create_revocation_store(self_contained_tokens=True), SQLiteRevocationStore)
+
+    monkeypatch.setenv("REVOCATION_BACKEND", "memory")
+    with pytest.raises(ValueError):
+        create_revocation_store(self_contained_tokens=True)
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    assert isinstance(create_revocation_store(self_contained_tokens=True), MemoryRevocationStore)
@@ -0,0 +1,48 @@
+from app.search.schema_registry import compile_keyword, select_fields, with_keys
+from datetime import datetime
+from decimal import Decimal
+from fastapi import HTTPException
+import pytest
+
+
+@pytest.mark.parametrize("table, keyword, expected", [
+    ("books", "barcode:123", ("barcode = %s", ["123"])),
+    ("books", "name:harry", ("name LIKE %s", ["%harry%"])),
+    ("books", "name:har_ry*", ("name LIKE %s", ["har\\_ry%"])),
+    ("books", "name:100%", ("name LIKE %s", ["%100\\%%"])),
+    ("books", "price>=20", ("price >= %s", [20])),
+    ("books", "quantity:0", ("quantity = %s", [0])),
+    ("orders", "status:Order Placed", ("status = %s", ["Order Placed"])),
+    ("orders", "total_amount<9.5", ("total_amount < %s", [Decimal("9.5")])),
+    ("orders", "order_date>2024-01-02", ("order_date > %s", [datetime(2024, 1, 2)])),
+])
+def test_compile_keyword(table, keyword, expected):
+    assert compile_keyword(table, keyword) == expected
+
+
+@pytest.mark.parametrize("table, keyword", [
+    ("books", "no separator"),
+    ("books", "color:red"),
+    ("users", "password:secret"),
+    ("books", "name>=a"),
+    ("books", "price:cheap"),
+    ("orders", "order_date:yesterday"),
+])
+def test_invalid_keywords_are_rejected(table, keyword):
+    with pytest.raises(HTTPException) as raised:
+        compile_keyword(table, keyword)
+    assert raised.value.status_code == 400
+
+
+def test_select_fields():
+    assert select_fields("books", None) == ["barcode", "name", "author", "price", "quantity", "added_by"]
+    assert select_fields("books", " price, name ,price") == ["price", "name"]
+    assert "password" not in select_fields("users", "")
+    for fields in ("password", "nope", " , "):
+        with pytest.raises(HTTPException):
+            select_fields("users", fields)
+
+
+def test_with_keys_appends_missing_sort_keys():
+    assert with_keys(["name"], ["price", "barcode"]) == ["name", "price", "barcode"]
+    assert with_keys(["barcode", "name"], ["barcode"]) == ["barcode", "name"]
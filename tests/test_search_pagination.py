@@ -0,0 +1,43 @@
+from app.search.searchcontroller import build_search_query
+from app.utils.pagination import split_page
+import pytest
+import sqlite3
+
+# SQLite orders NULLs like MySQL (first ascending, last descending), so it can run the generated pages
+BOOKS = [
+    ("b1", "Emma", 10), ("b2", None, 5), ("b3", "Dune", None), ("b4", None, None),
+    ("b5", "Emma", None), ("b6", "Ulysses", 10), ("b7", None, 5), ("b8", "Dune", 20),
+]
+
+
+@pytest.fixture(scope="module")
+def connection():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE books (barcode TEXT PRIMARY KEY, name TEXT, price INT)")
+    connection.executemany("INSERT INTO books VALUES (?, ?, ?)", BOOKS)
+    return connection
+
+
+def pages(connection, order_by, descending, limit):
+    sort_keys = [order_by, "barcode"]
+    cursor, seen = None, []
+    while True:
+        query, params, _ = build_search_query(
+            "books", ["barcode", order_by], [], [], sort_keys, cursor, limit, descending
+        )
+        rows = connection.execute(query.replace("%s", "?"), params).fetchall()
+        page, cursor = split_page(rows, limit, key=lambda row: (row[1], row[0]))
+        seen.extend(row[0] for row in page)
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize("order_by", ["name", "price"])
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("limit", [1, 2, 3])
+def test_pages_cover_every_row_once_with_null_sort_values(connection, order_by, descending, limit):
+    direction = "DESC" if descending else "ASC"
+    expected = [row[0] for row in connection.execute(
+        f"SELECT barcode FROM books ORDER BY {order_by} {direction}, barcode {direction}"
+    )]
+    assert pages(connection, order_by, descending, limit) == expected
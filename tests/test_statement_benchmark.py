@@ -0,0 +1,52 @@
+from app.auth.auth_routes import USER_BY_ID_QUERY
+from app.database.pool import StatementCursor
+from mysql.connector import aio
+import asyncio
+import os
+import time
+
+# Executions per protocol; raise it for steadier figures
+ROUNDS = int(os.getenv("STATEMENT_BENCH_ROUNDS", "2000"))
+
+
+async def executions_per_second(connection, sql, cursor_options) -> float:
+    cursor = await connection.cursor(**cursor_options)
+    try:
+        await cursor.execute(sql, (1,))  # Prepares the statement on the prepared cursors
+        await cursor.fetchall()
+        started = time.perf_counter()
+        for _ in range(ROUNDS):
+            await cursor.execute(sql, (1,))
+            await cursor.fetchall()
+        return ROUNDS / (time.perf_counter() - started)
+    finally:
+        await cursor.close()
+
+
+def test_cached_prepared_lookups_beat_the_text_protocol(database, mysql_config, record_property):
+    """
+    A single-row lookup by primary key, run on one connection as text, through the driver's
+    prepared cursor and through the pool's StatementCursor. The hot lookups are declared with
+    read()/write() only while the cached prepared path is at least as fast as plain text.
+    """
+    async def run():
+        connection = await aio.connect(autocommit=True, **mysql_config)
+        try:
+            sql = USER_BY_ID_QUERY.sql
+            return {
+                "text": await executions_per_second(connection, sql, {}),
+                "driver_prepared": await executions_per_second(connection, sql, {"prepared": True}),
+                "statement_cursor": await executions_per_second(connection, sql, {"cursor_class": StatementCursor}),
+            }
+        finally:
+            await connection.close()
+
+    rates = asyncio.run(run())
+    for name, rate in rates.items():
+        record_property(f"{name}_per_second", round(rate))
+    print(", ".join(f"{name}: {rate:.0f}/s" for name, rate in rates.items()))
+
+    # The driver's prepared cursor pays an extra COM_STMT_RESET round trip per execution
+    assert rates["statement_cursor"] > rates["driver_prepared"]
+    # 10% leeway for timing noise on a shared test server
+    assert rates["statement_cursor"] >= 0.9 * rates["text"], rates
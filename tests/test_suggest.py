@@ -0,0 +1,133 @@
+from app.books import suggest as suggest_module
+from app.books.suggest import IndexState, SuggestIndex
+from app.database import db_connect
+import asyncio
+import random
+import pytest
+
+BOOKS = [
+    ("1", "The Lord of the Rings", "J.R.R. Tolkien", 3),
+    ("2", "The Hobbit", "J.R.R. Tolkien", 9),
+    ("3", "Lords and Ladies", "Terry Pratchett", 5),
+    ("4", "Dune", "Frank Herbert", 1),
+]
+
+
+@pytest.fixture
+def index():
+    index = SuggestIndex()
+    index.load(BOOKS)
+    return index
+
+
+def barcodes(suggestions):
+    return [suggestion["barcode"] for suggestion in suggestions]
+
+
+def test_matches_word_prefixes_in_name_and_author(index):
+    assert barcodes(index.suggest("lord")) == ["3", "1"]
+    assert barcodes(index.suggest("tolk")) == ["2", "1"]
+    assert barcodes(index.suggest("Lord RI")) == ["1"]
+    assert index.suggest("ring")[0]["matched"] == "name"
+    assert index.suggest("tolk")[0]["matched"] == "author"
+    assert index.suggest("hobbit tolkien")[0]["matched"] == "both"
+    assert index.suggest("zzz") == []
+    assert index.suggest("  ...  ") == []
+
+
+def test_ranks_every_match_by_stock(monkeypatch):
+    rows = [(str(n), f"Title {n}", "Someone", n) for n in range(500)]
+    index = SuggestIndex()
+    index.load(rows)
+    assert barcodes(index.suggest("title", 3)) == ["499", "498", "497"]
+    assert barcodes(index.suggest("ti", 3)) == ["499", "498", "497"]
+
+
+def test_short_prefixes_see_writes_made_after_the_build(monkeypatch):
+    monkeypatch.setattr(suggest_module, "TOP_DEPTH", 5)
+    rows = [(str(n), f"Title {n}", "Someone", n) for n in range(50)]
+    index = SuggestIndex()
+    index.load(rows)
+    assert barcodes(index.suggest("ti", 2)) == ["49", "48"]
+
+    index.set_quantity("3", 100)
+    index.upsert("new", "Tiny", "Someone", 60)
+    index.remove("49")
+    assert barcodes(index.suggest("ti", 3)) == ["3", "new", "48"]
+
+    # Emptying the precomputed ranking falls back to scanning every match
+    for n in range(45, 49):
+        index.set_quantity(str(n), 0)
+    index.set_quantity("3", 0)
+    index.remove("new")
+    assert barcodes(index.suggest("ti", 2)) == ["44", "43"]
+
+
+def test_upsert_many_and_remove(index):
+    index.upsert_many([("5", "Lord Foul's Bane", "Stephen Donaldson", 7), (2, "The Hobbit", "Tolkien", 0)])
+    assert barcodes(index.suggest("lord")) == ["5", "3", "1"]
+    assert barcodes(index.suggest("tolk")) == ["1", "2"]
+    index.remove(5)
+    assert barcodes(index.suggest("lord")) == ["3", "1"]
+    assert len(index) == 4
+
+
+def test_set_quantity_reorders_results(index):
+    index.set_quantity(1, 10)
+    assert barcodes(index.suggest("lord")) == ["1", "3"]
+
+
+def test_changes_during_a_rebuild_are_replayed(monkeypatch, index):
+    async def stream_query(query, params=None, chunk_size=1000):
+        # Writes land while the rows are being read
+        index.upsert("5", "Lord Foul's Bane", "Stephen Donaldson", 7)
+        index.remove("3")
+        yield ["barcode", "name", "author", "quantity"], list(BOOKS)
+
+    monkeypatch.setattr(db_connect, "stream_query", stream_query)
+    monkeypatch.setattr(suggest_module, "suggest_index", index)
+    asyncio.run(suggest_module.rebuild_suggest_index())
+    assert barcodes(index.suggest("lord")) == ["5", "1"]
+
+
+def test_vocabulary_stays_sorted_after_large_batches(monkeypatch):
+    monkeypatch.setattr(suggest_module, "MERGE_THRESHOLD", 2)
+    state = IndexState.build(BOOKS)
+    index = SuggestIndex()
+    index.install(state)
+    index.upsert_many([(str(n), f"Word{n} extra{n}", "Author", 1) for n in range(10)])
+    assert state.vocabulary == sorted(state.vocabulary)
+    assert barcodes(index.suggest("word7")) == ["7"]
+
+
+def test_writes_keep_short_prefix_rankings_bounded_and_exact(monkeypatch):
+    monkeypatch.setattr(suggest_module, "TOP_DEPTH", 8)
+    rng = random.Random(15)
+    names = ["Tide", "Tiger", "Time", "Atlas", "Tin", "Axe"]
+    rows = [(str(n), f"{rng.choice(names)} {n}", "Someone", rng.randrange(20)) for n in range(300)]
+    index = SuggestIndex()
+    index.load(rows)
+
+    books = {barcode: (name, quantity) for barcode, name, _, quantity in rows}
+    for step in range(2000):
+        barcode = str(rng.randrange(400))
+        action = rng.random()
+        if action < 0.5 and barcode in books:
+            books[barcode] = (books[barcode][0], rng.randrange(20))
+            index.set_quantity(barcode, books[barcode][1])
+        elif action < 0.8:
+            books[barcode] = (f"{rng.choice(names)} {barcode}", rng.randrange(20))
+            index.upsert(barcode, books[barcode][0], "Someone", books[barcode][1])
+        elif barcode in books:
+            del books[barcode]
+            index.remove(barcode)
+
+        if step % 50 == 0:
+            for query in ("t", "ti", "a"):
+                expected = sorted(
+                    (barcode for barcode, (name, _) in books.items() if name.casefold().startswith(query)),
+                    key=lambda barcode: (-books[barcode][1], books[barcode][0], barcode),
+                )[:5]
+                assert barcodes(index.suggest(query, 5)) == expected
+
+    assert max(len(top) for top in index._state.tops.values()) <= 8
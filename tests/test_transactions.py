@@ -0,0 +1,88 @@
+from app.database import db_connect
+from app.books import bookscontroller
+from app.books.bulk_import import ImportReport
+from tests.fakes import FakeAsyncConnection, FakeSyncConnection, FakeSyncPool, data_error
+import asyncio
+import pytest
+
+
+def test_savepoint_rolls_back_only_its_own_statements():
+    connection = FakeAsyncConnection(failures={"bad": data_error()})
+    tx = db_connect.AsyncTransaction(connection)
+
+    async def scenario():
+        await tx.execute("UPDATE a SET x = 1")
+        with pytest.raises(Exception):
+            async with tx.savepoint("sp"):
+                await tx.execute("UPDATE b SET x = 1")
+                await tx.execute("UPDATE bad SET x = 1")
+        async with tx.savepoint("sp"):
+            await tx.execute("UPDATE c SET x = 1")
+
+    asyncio.run(scenario())
+    assert connection.statements == [
+        "UPDATE a SET x = 1",
+        "SAVEPOINT sp", "UPDATE b SET x = 1", "UPDATE bad SET x = 1", "ROLLBACK TO SAVEPOINT sp",
+        "SAVEPOINT sp", "UPDATE c SET x = 1", "RELEASE SAVEPOINT sp",
+    ]
+    # The rolled back write is not counted, and savepoint statements never are
+    assert tx.rows_affected == 2
+    assert tx.rowcount == 1
+
+
+def test_savepoint_name_must_be_an_identifier():
+    tx = db_connect.AsyncTransaction(FakeAsyncConnection())
+
+    async def scenario():
+        async with tx.savepoint("x; DROP TABLE books"):
+            pass
+
+    with pytest.raises(ValueError):
+        asyncio.run(scenario())
+
+
+def test_sync_transaction_commits_once(monkeypatch):
+    connection = FakeSyncConnection(results={"SELECT 1": (["1"], [(1,)])})
+    monkeypatch.setattr(db_connect, "get_sync_pool", lambda: FakeSyncPool(connection))
+
+    with db_connect.sync_transaction() as tx:
+        assert tx.execute("SELECT 1")["data"] == [(1,)]
+        tx.execute("UPDATE a SET x = 1")
+        with tx.savepoint("sp"):
+            tx.executemany("INSERT INTO a VALUES (%s)", [(1,), (2,)])
+
+    assert connection.committed and not connection.rolled_back and connection.closed
+    assert tx.rows_affected == 3
+
+
+def test_sync_transaction_rolls_back_on_error(monkeypatch):
+    connection = FakeSyncConnection(failures={"bad": data_error()})
+    monkeypatch.setattr(db_connect, "get_sync_pool", lambda: FakeSyncPool(connection))
+
+    with pytest.raises(Exception):
+        with db_connect.sync_transaction() as tx:
+            tx.execute("UPDATE a SET x = 1")
+            tx.execute("UPDATE bad SET x = 1")
+
+    assert connection.rolled_back and not connection.committed and connection.closed
+
+
+def test_sync_pool_is_not_opened_at_import():
+    assert db_connect.pool is None
+
+
+def test_import_retries_a_rejected_batch_row_by_row():
+    good = ("1", "Good", "Author", 10, 1, "user1")
+    bad = ("2", "x" * 500, "Author", 10, 1, "user1")
+    connection = FakeAsyncConnection(rejected=[bad])
+    tx = db_connect.AsyncTransaction(connection)
+    report, reported = ImportReport(), set()
+
+    written = asyncio.run(bookscontroller.upsert_import_rows(tx, [(2, good), (3, bad)], report, reported))
+
+    assert written == [(2, good)]
+    assert report.failed == 1 and report.errors[0]["line"] == 3
+    assert reported == {3}
+    assert "ROLLBACK TO SAVEPOINT import_batch" in connection.statements
+    assert connection.statements.count("RELEASE SAVEPOINT import_row") == 1
+    assert connection.statements.count("ROLLBACK TO SAVEPOINT import_row") == 1